@@ -2,26 +2,20 @@ import os
 import sys
 from flask import Flask, Response
 
-# Add parent directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Make the backend package importable
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.insert(0, BACKEND_DIR)
 
 try:
     # Set environment for production
     os.environ.setdefault('FLASK_ENV', 'production')
     
-    # Import the Flask app
-    from backend.app import app
-    
-    # Initialize database tables if needed
-    with app.app_context():
-        from core.models import db
-        try:
-            db.create_all()
-        except Exception as e:
-            print(f"Database initialization warning: {e}")
+    # Build the Flask app; databases and AI clients connect on first use,
+    # so a cold start only pays for the imports
+    from adapters.flask_app import create_app
     
     # Export the app for Vercel (this is what Vercel will call)
-    application = app
+    application = create_app()
     
 except Exception as e:
     import traceback
@@ -0,0 +1,262 @@
+"""
+Signed, stateless access tokens
+
+/login returns a short-lived access token and a longer-lived refresh token,
+both signed with the app's URLSafeTimedSerializer (SECRET_KEY). An access
+token carries the user's id, role and client_id, so authenticating a request
+is a signature check plus a lookup in an in-memory revocation set, with no
+database round trip. Only /api/auth/refresh, which rotates the pair, reads
+the user again, so role changes take effect within ACCESS_TOKEN_TTL.
+
+Revocations (logout, user deleted or demoted) are written to
+MongoRevokedToken and every process pulls new entries at most every
+TOKEN_REVOCATION_SYNC seconds. Entries expire with the tokens they cover,
+which keeps the set small.
+
+Clients send `Authorization: Bearer <access_token>`. Until every frontend
+call does, tokens are optional: a valid token sets g.auth, an invalid or
+revoked one is rejected, and with ACCESS_TOKENS_REQUIRED=1 /api/* routes
+(except PUBLIC_PATHS) reject requests without one.
+
+    ACCESS_TOKEN_TTL=900           # seconds
+    REFRESH_TOKEN_TTL=604800       # seconds
+    TOKEN_REVOCATION_SYNC=15       # seconds between revocation list syncs
+    ACCESS_TOKENS_REQUIRED=0
+"""
+import functools
+import os
+import secrets
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import Blueprint, g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired
+
+from app_logging import get_logger
+from mongo_db import MongoRevokedToken, MongoUser
+
+log = get_logger('auth.tokens')
+
+ACCESS_TOKEN_TTL = int(os.getenv('ACCESS_TOKEN_TTL', '900'))
+REFRESH_TOKEN_TTL = int(os.getenv('REFRESH_TOKEN_TTL', str(7 * 24 * 3600)))
+REVOCATION_SYNC = float(os.getenv('TOKEN_REVOCATION_SYNC', '15'))
+REQUIRED = os.getenv('ACCESS_TOKENS_REQUIRED', '').lower() in ('1', 'true', 'yes')
+# /api routes reachable without a token even when tokens are required
+PUBLIC_PATHS = ('/api/auth/refresh',)
+
+# Separate salts keep a refresh token from being accepted as an access token
+ACCESS_SALT = 'access-token'
+REFRESH_SALT = 'refresh-token'
+
+AuthUser = namedtuple('AuthUser', 'id role client_id jti issued_at')
+
+auth_bp = Blueprint('auth_tokens', __name__)
+_serializer = None
+
+
+class InvalidToken(Exception):
+    """A token that is malformed, tampered with, expired or revoked"""
+
+
+# ─── Revocations ──────────────────────────────────────────────────────────────
+
+class RevocationList:
+    """In-memory mirror of MongoRevokedToken, synced every `sync_interval` seconds"""
+
+    def __init__(self, sync_interval):
+        self.sync_interval = sync_interval
+        self._jtis = {}         # jti -> expires_at
+        self._not_before = {}   # user id -> (not_before, expires_at)
+        self._synced_at = None  # wall clock of the last sync query
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def is_revoked(self, user):
+        self._maybe_sync()
+        if user.jti in self._jtis:
+            return True
+        entry = self._not_before.get(user.id)
+        return entry is not None and user.issued_at < entry[0]
+
+    def revoke_token(self, jti, expires_at):
+        self._jtis[jti] = expires_at
+        MongoRevokedToken.revoke_token(jti, expires_at)
+
+    def revoke_user(self, user_id, not_before, expires_at):
+        self._not_before[str(user_id)] = (not_before, expires_at)
+        MongoRevokedToken.revoke_user(user_id, not_before, expires_at)
+
+    def _maybe_sync(self):
+        if time.monotonic() < self._next_sync or not self._lock.acquire(blocking=False):
+            # Fresh enough, or another thread is already syncing
+            return
+        try:
+            started = datetime.utcnow()
+            # Re-read a little history so entries committed out of order are not missed
+            since = self._synced_at - timedelta(seconds=5) if self._synced_at else None
+            for entry in MongoRevokedToken.changed_since(since):
+                if entry.get('jti'):
+                    self._jtis[entry['jti']] = entry['expires_at']
+                elif entry.get('user_id'):
+                    self._not_before[entry['user_id']] = (entry['not_before'], entry['expires_at'])
+            now = datetime.utcnow()
+            # list() snapshots atomically, so concurrent revoke_* calls cannot break the iteration
+            self._jtis = {jti: exp for jti, exp in list(self._jtis.items()) if exp > now}
+            self._not_before = {uid: entry for uid, entry in list(self._not_before.items()) if entry[1] > now}
+            self._synced_at = started
+        except Exception as e:
+            # Keep serving from the last known set; a short TTL bounds the staleness
+            log.warning("Revocation sync failed: %s", e)
+        finally:
+            self._next_sync = time.monotonic() + self.sync_interval
+            self._lock.release()
+
+
+revocations = RevocationList(REVOCATION_SYNC)
+
+
+# ─── Issue and verify ─────────────────────────────────────────────────────────
+
+def _claims(user_doc):
+    return {
+        'u': str(user_doc['_id']),
+        'r': user_doc.get('user_type') or user_doc.get('role') or 'user',
+        'c': str(user_doc['client_id']) if user_doc.get('client_id') else None,
+        'j': secrets.token_urlsafe(9),
+    }
+
+
+def issue_tokens(user_doc):
+    """{'access_token', 'refresh_token', 'token_type', 'expires_in'} for a Mongo user document"""
+    return {
+        'access_token': _serializer.dumps(_claims(user_doc), salt=ACCESS_SALT),
+        'refresh_token': _serializer.dumps(_claims(user_doc), salt=REFRESH_SALT),
+        'token_type': 'Bearer',
+        'expires_in': ACCESS_TOKEN_TTL,
+    }
+
+
+def verify(token, refresh=False):
+    """AuthUser for a valid, unrevoked token; raises InvalidToken otherwise"""
+    salt, max_age = (REFRESH_SALT, REFRESH_TOKEN_TTL) if refresh else (ACCESS_SALT, ACCESS_TOKEN_TTL)
+    try:
+        claims, signed_at = _serializer.loads(token, salt=salt, max_age=max_age, return_timestamp=True)
+    except SignatureExpired:
+        raise InvalidToken("Token expired")
+    except BadSignature:
+        raise InvalidToken("Invalid token")
+    # itsdangerous returns an aware UTC datetime; revocation times are naive UTC
+    user = AuthUser(claims['u'], claims['r'], claims['c'], claims['j'], signed_at.replace(tzinfo=None))
+    if revocations.is_revoked(user):
+        raise InvalidToken("Token revoked")
+    return user
+
+
+def revoke(user, refresh=False):
+    """Revoke one token (an AuthUser from verify)"""
+    ttl = REFRESH_TOKEN_TTL if refresh else ACCESS_TOKEN_TTL
+    revocations.revoke_token(user.jti, user.issued_at + timedelta(seconds=ttl))
+
+
+def revoke_user(user_id):
+    """Revoke every token issued to `user_id` so far, e.g. after a role change or deletion"""
+    now = datetime.utcnow()
+    # Tokens carry whole-second timestamps, so everything signed during this second is covered too
+    not_before = now.replace(microsecond=0) + timedelta(seconds=1)
+    revocations.revoke_user(user_id, not_before, not_before + timedelta(seconds=REFRESH_TOKEN_TTL))
+
+
+def _bearer_token():
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+def current_user():
+    """AuthUser of the request's access token, or None"""
+    return g.get('auth')
+
+
+# ─── Decorators ───────────────────────────────────────────────────────────────
+
+def require_auth(f):
+    """Decorator to require a valid access token"""
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        if current_user() is None:
+            return jsonify({'error': 'Authentication required'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def require_employee(f):
+    """Decorator to require an access token of a non-client user"""
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        user = current_user()
+        if user is None:
+            return jsonify({'error': 'Authentication required'}), 401
+        if user.role == 'client':
+            return jsonify({'error': 'Employee access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# ─── Routes ───────────────────────────────────────────────────────────────────
+
+@auth_bp.route('/api/auth/refresh', methods=['POST'])
+def refresh_tokens():
+    """Trade a refresh token for a new token pair; the old refresh token is revoked"""
+    token = (request.get_json(silent=True) or {}).get('refresh_token')
+    if not token:
+        return jsonify({'error': 'refresh_token is required'}), 400
+    try:
+        previous = verify(token, refresh=True)
+    except InvalidToken as e:
+        return jsonify({'error': str(e)}), 401
+    # The one lookup in the token lifecycle: picks up role and client changes
+    user_doc = MongoUser.find_by_id(previous.id)
+    if not user_doc:
+        return jsonify({'error': 'User not found'}), 401
+    revoke(previous, refresh=True)
+    return jsonify(issue_tokens(user_doc))
+
+
+@auth_bp.route('/api/auth/logout', methods=['POST'])
+def logout():
+    """Revoke the request's access token and, if given, its refresh token"""
+    user = current_user()
+    if user is not None:
+        revoke(user)
+    token = (request.get_json(silent=True) or {}).get('refresh_token')
+    if token:
+        try:
+            revoke(verify(token, refresh=True), refresh=True)
+        except InvalidToken:
+            pass
+    return jsonify({'message': 'Logged out'})
+
+
+def init_app(app, serializer):
+    """Authenticate bearer tokens on every request and serve /api/auth/*"""
+    global _serializer
+    _serializer = serializer
+
+    @app.before_request
+    def _authenticate():
+        g.auth = None
+        token = _bearer_token()
+        if token is None:
+            if REQUIRED and request.path.startswith('/api/') and request.path not in PUBLIC_PATHS \
+                    and request.method != 'OPTIONS':
+                return jsonify({'error': 'Authentication required'}), 401
+            return None
+        try:
+            g.auth = verify(token)
+        except InvalidToken as e:
+            return jsonify({'error': str(e)}), 401
+        return None
+
+    app.register_blueprint(auth_bp)
@@ -1,44 +1,28 @@
 # Flask app adapter for the backend
-# All Flask-specific setup and route registration should be here
+# Entry points (Vercel's api/index.py, WSGI servers) get the app from here
 
-from flask import Flask
-from flask_cors import CORS
-from flask_bcrypt import Bcrypt
-from flask_sqlalchemy import SQLAlchemy
-from flask_socketio import SocketIO
-from flask_migrate import Migrate
 import os
+import sys
+
 from dotenv import load_dotenv
 
-from core.models import db
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 
 # --- App Factory ---
 def create_app():
-    load_dotenv()
-    app = Flask(__name__)
-    CORS(app)
-    bcrypt = Bcrypt(app)
-    app.config['UPLOAD_FOLDER'] = 'uploads'
-    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-    
-    # Handle different environments for Vercel deployment
-    if os.environ.get('VERCEL_REGION'):
-        # Use SQLite for Vercel
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/vercel.db'
-        app.config['ENV'] = 'production'
-        app.config['DEBUG'] = False
-        app.config['TESTING'] = False
-    else:
-        # Use regular database for local development
-        app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-    
-    db.init_app(app)
-    migrate = Migrate(app, db)
-    socketio = SocketIO(app, cors_allowed_origins="*")
-    return app, socketio, bcrypt
+    """The configured Flask app.
 
-# --- Route registration ---
-def register_routes(app, socketio, bcrypt):
-    # Import all route functions from the main app.py (to be moved here)
-    # For now, this is a placeholder to show where to register routes
-    pass
+    Importing the app is kept cheap for cold starts: MongoDB connects on the
+    first query and the OpenAI, LangChain and MySQL clients are created on
+    first use, so nothing here waits on the network. Run
+    `python import_time_report.py` to check what the import costs.
+    """
+    load_dotenv(os.path.join(BACKEND_DIR, '.env'))
+    if os.environ.get('VERCEL_REGION'):
+        os.environ.setdefault('FLASK_ENV', 'production')
+    # app.py and its modules import each other flat, relative to backend/
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import app as app_module
+    return app_module.app
@@ -2,12 +2,11 @@
 # All reusable business logic should be in /core/business_logic.py or /core/models.py.
 # All plugin logic should be in /backend/plugins.
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
 from dotenv import load_dotenv
 import os
-import openai
+import json
 import smtplib
 from email.mime.text import MIMEText
 import traceback
@@ -20,29 +19,49 @@ import socket
 import uuid
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
+from bson import ObjectId
 
 # MongoDB imports
-from mongo_db import mongo, MongoUser, MongoClientModel, MongoProject, MongoTask, MongoChannel, MongoMessage, MongoMeeting, MongoContentCalendar
-
-from plugins.openai.openai_plugin import OpenAIPlugin
+from mongo_db import mongo, MongoUser, MongoClientModel, MongoProject, MongoTask, MongoChannel, MongoMessage, MongoChannelRead, MongoMeeting, MongoContentCalendar
+
+from plugins.openai.openai_plugin import shared_plugin
+from socketio_backplane import socketio_options
+import chat_write_behind
+import access_tokens
+import chunked_uploads
+import llm_client
+import password_hashing
+import response_cache
+import retrieval_service
+import embedding_sync
+from chat_routes import chat_bp
+from app_logging import configure_logging, get_logger, Sampler
+import metrics
 # from plugins.pinecone.pinecone_plugin import initialize_pinecone
 # from plugins.revive.revive_plugin import get_revive_stats, create_campaign, create_banner
 
 # ─── Load env & set keys ───────────────────────────────────────────────────────
 load_dotenv()  # must come before os.getenv
-openai.api_key = os.getenv("OPENAI_API_KEY")
+configure_logging()
+chat_log = get_logger('chat')
+auth_log = get_logger('auth')
+meetings_log = get_logger('meetings')
+upload_log = get_logger('uploads')
+ai_log = get_logger('ai')
+# Socket connects are too frequent to log one by one
+socket_sampler = Sampler(every=int(os.getenv('LOG_SOCKET_SAMPLE_EVERY', '100')))
 
 # MongoDB setup
 mongodb_uri = os.getenv('MONGODB_URI')
 use_mongodb = True  # Force MongoDB usage
 
+# Command timings for /metrics; the listener must exist before the client does
+metrics.install_mongo_listener()
+
 if mongodb_uri:
-    try:
-        mongo.connect(mongodb_uri)
-        print("[DATABASE] Using MongoDB as primary database")
-    except Exception as e:
-        print(f"[DATABASE] MongoDB connection failed: {e}")
-        exit(1)  # Exit if MongoDB connection fails
+    # Connects on the first query, so importing the app (e.g. a cold start) does no I/O
+    mongo.configure(mongodb_uri)
+    print("[DATABASE] Using MongoDB as primary database")
 else:
     print("[DATABASE] MONGODB_URI not found in environment variables")
     exit(1)
@@ -50,11 +69,12 @@ else:
 # ─── Embedding helper ──────────────────────────────────────────────────────────
 def get_embedding(text: str) -> list[float]:
     """Call OpenAI to turn `text` into a 1536-dim vector."""
-    response = openai.Embedding.create(
-        model="text-embedding-ada-002",
-        input=text
-    )
-    return response['data'][0]['embedding']
+    return llm_client.embed([text])[0]
+
+
+def get_embeddings(texts: list[str]) -> list[list[float]]:
+    """Batched get_embedding for bulk indexing; see OpenAIPlugin.get_embeddings."""
+    return shared_plugin().get_embeddings(texts)
 
 def find_available_port(start_port=5000, max_port=9000):
     """Find an available port starting from start_port."""
@@ -70,7 +90,8 @@ def find_available_port(start_port=5000, max_port=9000):
 # ─── Flask setup ───────────────────────────────────────────────────────────────
 app = Flask(__name__)
 CORS(app)
-bcrypt = Bcrypt(app)
+metrics.init_app(app)
+app.register_blueprint(chat_bp)
 
 # File upload configuration
 UPLOAD_FOLDER = 'uploads'
@@ -86,9 +107,16 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Chat history paging
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Files over MAX_CONTENT_LENGTH (e.g. video) upload in chunks through /api/uploads
+chunked_uploads.init_app(app, allowed_file)
+
 # ─── Pinecone setup ────────────────────────────────────────────────────────────
 # try:
 #     pinecone_index = initialize_pinecone()
@@ -103,64 +131,71 @@ if not os.environ.get('SECRET_KEY'):
 
 SECRET_KEY = os.environ.get('SECRET_KEY')
 serializer = URLSafeTimedSerializer(SECRET_KEY)
+# Bearer access tokens signed with `serializer` (see access_tokens.py)
+access_tokens.init_app(app, serializer)
 
-# Initialize SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+# Initialize SocketIO (async mode and the optional multi-worker message queue
+# come from the environment, see socketio_backplane.py)
+socketio = SocketIO(app, cors_allowed_origins="*", **socketio_options())
 
 # ─── Socket Event Handlers ─────────────────────────────────────────────────
 
 @socketio.on('connect')
 def handle_connect():
-    print(f"🔌 DEBUG: Client connected - Session ID: {request.sid}")
+    count = socket_sampler.hit('connect')
+    if count:
+        chat_log.info("Client connected sid=%s (%d connects so far)", request.sid, count)
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f"🔌 DEBUG: Client disconnected - Session ID: {request.sid}")
+    chat_log.debug("Client disconnected sid=%s", request.sid)
 
 @socketio.on('join')
 def handle_join(data):
-    print(f"🏠 DEBUG: Received join event with data: {data}")
     channel_id = data.get('channel_id')
     if channel_id:
         join_room(f'channel_{channel_id}')
-        print(f"🏠 DEBUG: User joined room channel_{channel_id}")
+        chat_log.debug("sid=%s joined room channel_%s", request.sid, channel_id)
     else:
-        print(f"❌ DEBUG: No channel_id provided in join event")
+        chat_log.warning("join event without channel_id from sid=%s", request.sid)
 
 @socketio.on('leave')
 def handle_leave(data):
-    print(f"🚪 DEBUG: Received leave event with data: {data}")
     channel_id = data.get('channel_id')
     if channel_id:
         leave_room(f'channel_{channel_id}')
-        print(f"🚪 DEBUG: User left room channel_{channel_id}")
+        chat_log.debug("sid=%s left room channel_%s", request.sid, channel_id)
     else:
-        print(f"❌ DEBUG: No channel_id provided in leave event")
+        chat_log.warning("leave event without channel_id from sid=%s", request.sid)
 
 @socketio.on('send_message')
 def handle_send_message(data):
-    print(f"📨 DEBUG: Received send_message event with data: {data}")
     channel_id = data.get('channel_id')
     user_id = data.get('user_id')
     content = data.get('content')
     parent_message_id = data.get('parent_message_id')
     name = data.get('name')
-    
-    print(f"📨 DEBUG: Parsed - channel_id: {channel_id}, user_id: {user_id}, content: {content}")
-    
+    # Optional id chosen by the sender to match its optimistic render and acks
+    client_msg_id = data.get('client_msg_id')
+
     if not channel_id or not user_id or not content:
-        print(f"❌ DEBUG: Missing required fields - channel_id: {channel_id}, user_id: {user_id}, content: {content}")
+        chat_log.warning("send_message missing fields: channel_id=%s user_id=%s has_content=%s",
+                         channel_id, user_id, bool(content))
         return
     
     try:
-        # Save message to MongoDB
-        print(f"💾 DEBUG: Saving message to MongoDB...")
-        msg = MongoMessage.create_message(channel_id, user_id, content, parent_message_id, name)
-        print(f"💾 DEBUG: Message saved with ID: {msg['_id']}")
+        if message_writer:
+            # Write-behind: broadcast now, persist in the next group commit
+            msg = MongoMessage.build_message(channel_id, user_id, content, parent_message_id, name)
+            message_writer.submit(msg, {'sid': request.sid, 'client_msg_id': client_msg_id})
+        else:
+            # Save message to MongoDB
+            msg = MongoMessage.create_message(channel_id, user_id, content, parent_message_id, name)
         
         # Prepare message dict for broadcast
         msg_dict = {
             'id': str(msg['_id']),
+            'client_msg_id': client_msg_id,
             'channel_id': channel_id,
             'user_id': user_id,
             'content': content,
@@ -169,15 +204,34 @@ def handle_send_message(data):
             'name': name
         }
         
-        print(f"📤 DEBUG: Broadcasting message to room channel_{channel_id}: {msg_dict}")
         # Broadcast to channel
         emit('receive_message', msg_dict, room=f'channel_{channel_id}')
-        print(f"✅ DEBUG: Message broadcasted successfully")
-        
-    except Exception as e:
-        print(f"❌ DEBUG: Error in handle_send_message: {e}")
-        import traceback
-        traceback.print_exc()
+        chat_log.debug("Broadcast message %s to room channel_%s", msg_dict['id'], channel_id)
+
+    except Exception:
+        chat_log.exception("Error in handle_send_message for channel %s", channel_id)
+
+def _ack_persisted_messages(entries):
+    """Tell each sender which of their write-behind messages are now durable"""
+    for msg, context in entries:
+        socketio.emit('message_persisted', {
+            'id': str(msg['_id']),
+            'client_msg_id': context['client_msg_id'],
+            'channel_id': msg['channel_id']
+        }, to=context['sid'])
+
+def _report_failed_messages(entries, error):
+    """Tell each sender which of their write-behind messages were lost"""
+    for msg, context in entries:
+        socketio.emit('message_failed', {
+            'id': str(msg['_id']),
+            'client_msg_id': context['client_msg_id'],
+            'channel_id': msg['channel_id'],
+            'error': 'Message could not be saved'
+        }, to=context['sid'])
+
+# Optional write-behind persistence for chat messages (CHAT_WRITE_BEHIND=1)
+message_writer = chat_write_behind.from_env(on_commit=_ack_persisted_messages, on_error=_report_failed_messages)
 
 # ─── Database Helper Functions ─────────────────────────────────────────────────
 def get_all_users():
@@ -269,11 +323,6 @@ def authenticate_user(email, password):
 def create_admin_user(name, email, password):
     """Create admin user in MongoDB"""
     return MongoUser.create_user(name, email, password, role='admin', is_admin=True)
-
-def ensure_sample_data():
-    """Ensure sample data exists in MongoDB"""
-    MongoClientModel.create_sample_data()
-    MongoUser.ensure_sample_users()
 # ─── Background Tasks ──────────────────────────────────────────────────────────
 import threading
 import time
@@ -293,16 +342,8 @@ import time
 # Start background thread after app and socketio are ready
 # threading.Thread(target=emit_revive_stats_periodically, daemon=True).start()
 
-# Initialize database and create sample data
-with app.app_context():
-    # Create sample data in MongoDB
-    try:
-        ensure_sample_data()
-        print("[DATABASE] Sample data ensured in MongoDB")
-    except Exception as e:
-        print(f"[DATABASE] Sample data creation failed: {e}")
-        
-    print(f"[DATABASE] Database initialization complete. Using MongoDB exclusively.")
+# Sample clients and login users are seeded explicitly (python seed.py), not on every start
+print(f"[DATABASE] Database initialization complete. Using MongoDB exclusively.")
 
 # ─── Routes ────────────────────────────────────────────────────────────────────
 @app.route('/api/access-requests', methods=['GET'])
@@ -390,6 +431,9 @@ def add_user():
         }), 201
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except password_hashing.PasswordHashBusy as e:
+        body, status, headers = password_hashing.error_response(e)
+        return jsonify(body), status, headers
     except Exception as e:
         print(f"Add user error: {e}")
         return jsonify({'error': 'Failed to create user'}), 500
@@ -483,6 +527,10 @@ def update_user(user_id):
         if update_data:
             update_data['updated_at'] = datetime.utcnow()
             collection.update_one({'_id': ObjectId(user_id)}, {'$set': update_data})
+            MongoUser.invalidate_profile(user_id)
+            if any(user.get(field) != update_data[field] for field in ('role', 'user_type', 'is_admin') if field in update_data):
+                # Outstanding tokens still carry the old role
+                access_tokens.revoke_user(user_id)
         
         return jsonify({'message': 'User updated successfully'})
         
@@ -499,7 +547,10 @@ def delete_user(user_id):
         # Find and delete user by ID
         from bson import ObjectId
         result = collection.delete_one({'_id': ObjectId(user_id)})
-        
+        MongoUser.invalidate_profile(user_id)
+        if result.deleted_count:
+            access_tokens.revoke_user(user_id)
+
         if result.deleted_count == 0:
             return jsonify({'error': 'User not found'}), 404
         
@@ -527,7 +578,7 @@ def login():
         email = data.get('email')
         password = data.get('password')
 
-        print(f"[DEBUG] Login attempt for email: {email}")
+        auth_log.debug("Login attempt for %s", email)
 
         # Validate input
         if not email or not password:
@@ -536,9 +587,10 @@ def login():
         # Authenticate user using MongoDB
         user = MongoUser.find_by_email(email)
         if user and MongoUser.verify_password(user, password):
-            print(f"[INFO] Successful login for user: {email}")
+            auth_log.info("Successful login for %s", email)
             return jsonify({
                 'message': 'Login successful',
+                **access_tokens.issue_tokens(user),
                 'is_admin': user.get('is_admin', False),
                 'user': {
                     'id': str(user['_id']),
@@ -549,13 +601,13 @@ def login():
                     'is_admin': user.get('is_admin', False)
                 }
             })
-        print(f"[WARNING] Failed login attempt for: {email}")
+        auth_log.warning("Failed login attempt for %s", email)
         return jsonify({'error': 'Invalid credentials'}), 401
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"[ERROR] Login error: {str(e)}")
-        print(f"[ERROR] Full traceback: {error_details}")
+    except password_hashing.PasswordHashBusy as e:
+        body, status, headers = password_hashing.error_response(e)
+        return jsonify(body), status, headers
+    except Exception:
+        auth_log.exception("Login error")
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/create-admin')
@@ -962,6 +1014,9 @@ def delete_content_calendar_entry(entry_id):
         import traceback; traceback.print_exc()
         return jsonify({'error': 'Failed to delete content calendar entry'}), 500
 
+# Content plans are deterministic in the brief, so repeats are served from cache
+content_plan_cache = response_cache.from_env('generate_content:gpt-4')
+
 @app.route('/api/ai/generate-content', methods=['POST'])
 def generate_content():
     data = request.json
@@ -992,71 +1047,126 @@ def generate_content():
         "Be creative, relevant, and concise."
     )
 
-    openai.api_key = os.getenv('OPENAI_API_KEY')
+    # Plans are cached per client: a client user's own client, else the client the
+    # brief is for. Near-duplicate matching compares only the answers, since the
+    # fixed questions would otherwise dominate the similarity.
+    auth = access_tokens.current_user()
+    client_id = auth.client_id if auth and auth.role == 'client' else data.get('client_id')
     try:
-        print(f"=== AI Content Generation Debug ===")
-        print(f"API Key present: {bool(openai.api_key)}")
-        print(f"Received {len(answers)} answers")
-        
-        # Use the newer OpenAI client syntax
-        from openai import OpenAI
-        client = OpenAI(api_key=openai.api_key)
-        
-        print("Making OpenAI API call...")
-        response = client.chat.completions.create(
+        # Identical (or, with AI_CACHE_SEMANTIC, near-identical) briefs reuse the plan
+        cached_plan, tier, probe = content_plan_cache.lookup(
+            prompt,
+            scope=str(client_id) if client_id else None,
+            similarity_text='\n'.join(str(answer) for answer in answers)
+        )
+        if cached_plan is not None:
+            ai_log.info("Content plan served from %s cache", tier)
+            return jsonify({"content_plan": cached_plan, "cached": True})
+
+        ai_log.debug("Generating content plan from %d answers", len(answers))
+        response = llm_client.chat_completion(
+            [{"role": "system", "content": prompt}],
             model="gpt-4",
-            messages=[{"role": "system", "content": prompt}],
             max_tokens=2000,
             temperature=0.7
         )
         content_plan = response.choices[0].message.content
-        print(f"Generated content plan successfully!")
+        ai_log.info("Generated content plan (%d chars)", len(content_plan or ''))
+        if content_plan:
+            content_plan_cache.store(probe, content_plan)
         return jsonify({"content_plan": content_plan})
     except Exception as e:
-        print(f"[FULL ERROR] {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        failure = llm_client.error_response(e)
+        if failure:
+            body, status, headers = failure
+            return jsonify(body), status, headers
+        ai_log.exception("Content plan generation failed")
         return jsonify({"error": f"Generation failed: {str(e)}"}), 500
 
+# Keeps the /api/ai/ask index in step with clients, calendar and chat (EMBEDDING_SYNC=1)
+embedding_sync_worker = embedding_sync.from_env()
+
+@app.route('/api/ai/ask', methods=['POST'])
+@access_tokens.require_auth
+def ask_question():
+    """Answer a question from the agency's indexed clients, calendar and chat history.
+
+    Scope comes from the access token, never the body: chat history is the
+    caller's own, and client-role users only see their own client's data.
+    """
+    user = access_tokens.current_user()
+    data = request.json or {}
+    question = (data.get('question') or '').strip()
+    if not question:
+        return jsonify({"error": "question is required"}), 400
+    sources = data.get('sources') or list(retrieval_service.SOURCES)
+    unknown = [source for source in sources if source not in retrieval_service.SOURCES]
+    if unknown:
+        return jsonify({"error": f"Unknown sources: {', '.join(map(str, unknown))}"}), 400
+    try:
+        top_k = int(data['top_k']) if data.get('top_k') else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "top_k must be an integer"}), 400
+    if top_k is not None and not 1 <= top_k <= 20:
+        return jsonify({"error": "top_k must be between 1 and 20"}), 400
+
+    client_id = None
+    if user.role == 'client':
+        if not user.client_id:
+            # A client user without a client sees nothing shared, only their own chat
+            sources = [source for source in sources if source == 'chat']
+        client_id = user.client_id
+
+    try:
+        result = retrieval_service.get_service().ask(
+            question, sources=sources, user_id=user.id, client_id=client_id, top_k=top_k
+        )
+        ai_log.info("Answered question from %d source document(s)", len(result['sources']))
+        return jsonify(result)
+    except Exception as e:
+        failure = llm_client.error_response(e)
+        if failure:
+            body, status, headers = failure
+            return jsonify(body), status, headers
+        ai_log.exception("Question answering failed")
+        return jsonify({"error": f"Question answering failed: {str(e)}"}), 500
+
 @app.route('/api/upload-file', methods=['POST'])
 def upload_file():
     """Upload a file and return file info"""
     try:
         if 'file' not in request.files:
-            print('No file part in request.files')
-            print('Request.files:', request.files)
+            upload_log.info("Upload rejected: no file part")
             return jsonify({'error': 'No file part'}), 400
         file = request.files['file']
         if file.filename == '':
-            print('No file selected')
+            upload_log.info("Upload rejected: no file selected")
             return jsonify({'error': 'No file selected'}), 400
         if not allowed_file(file.filename):
-            print(f"File type not allowed: {file.filename}")
+            upload_log.info("Upload rejected: file type not allowed for %s", file.filename)
             return jsonify({'error': f'File type not allowed: {file.filename}'}), 400
         # Ensure upload directory exists and is writable
         upload_dir = app.config['UPLOAD_FOLDER']
         if not os.path.exists(upload_dir):
             try:
                 os.makedirs(upload_dir, exist_ok=True)
-                print(f"Created upload directory: {upload_dir}")
-            except Exception as e:
-                print(f"Failed to create upload directory: {e}")
+                upload_log.info("Created upload directory %s", upload_dir)
+            except Exception:
+                upload_log.exception("Failed to create upload directory %s", upload_dir)
                 return jsonify({'error': 'Failed to create upload directory'}), 500
         if not os.access(upload_dir, os.W_OK):
-            print(f"Upload directory not writable: {upload_dir}")
+            upload_log.error("Upload directory not writable: %s", upload_dir)
             return jsonify({'error': 'Upload directory not writable'}), 500
         # Generate unique filename
         file_ext = file.filename.rsplit('.', 1)[1].lower()
         unique_filename = f"{uuid.uuid4()}.{file_ext}"
         file_path = os.path.join(upload_dir, unique_filename)
-        print(f"Saving file to: {file_path}")
         try:
             file.save(file_path)
         except Exception as e:
-            print(f"File save error: {e}")
-            import traceback; traceback.print_exc()
+            upload_log.exception("File save error for %s", file_path)
             return jsonify({'error': f'File save error: {str(e)}'}), 500
-        print(f"File saved: {file_path}")
+        upload_log.debug("Saved %s as %s", file.filename, file_path)
         return jsonify({
             'filename': unique_filename,
             'original_filename': file.filename,
@@ -1065,8 +1175,7 @@ def upload_file():
             'mime_type': file.content_type
         }), 200
     except Exception as e:
-        print(f"File upload error: {e}")
-        import traceback; traceback.print_exc()
+        upload_log.exception("File upload error")
         return jsonify({'error': f'Failed to upload file: {str(e)}'}), 500
 
 @app.route('/api/files/<filename>')
@@ -1083,17 +1192,18 @@ def get_channels():
     user_id = request.args.get('user_id')
     if not user_id:
         return jsonify({'error': 'user_id required'}), 400
-    channels = MongoChannel.find_by_user(user_id)
+    channels = MongoChannel.backfill_last_messages(MongoChannel.find_by_user(user_id))
+    unread = MongoChannelRead.unread_counts(user_id, channels)
     result = []
     for c in channels:
-        last_msg = MongoMessage.find_by_channel(str(c['_id']))
-        last_message_time = last_msg[-1]['created_at'].isoformat() if last_msg else None
+        last_message_at = c.get('last_message_at')
         result.append({
             'id': str(c['_id']),
             'name': c.get('name'),
             'is_dm': c.get('is_dm', False),
-            'unread_count': 0,
-            'last_message': last_message_time
+            'unread_count': unread.get(str(c['_id']), 0),
+            'last_message': last_message_at.isoformat() if last_message_at else None,
+            'last_message_preview': c.get('last_message_preview')
         })
     return jsonify(result)
 
@@ -1117,42 +1227,68 @@ def create_or_get_channel():
 
 @app.route('/api/channels/<channel_id>/messages', methods=['GET'])
 def get_channel_messages(channel_id):
-    messages = MongoMessage.find_by_channel(channel_id)
-    result = []
-    for m in messages:
-        result.append({
-            'id': str(m['_id']),
-            'channel_id': m['channel_id'],
-            'user_id': m['user_id'],
-            'content': m['content'],
-            'parent_message_id': m.get('parent_message_id'),
-            'created_at': m['created_at'].isoformat() if hasattr(m['created_at'], 'isoformat') else str(m['created_at']),
-            'name': m.get('name', 'Unknown')
-        })
-    return jsonify(result)
+    """Return one page of a channel's messages, oldest first.
+
+    Query params: `before` / `after` (cursors) and `limit`. With no cursor the
+    most recent page is returned. Cursors for the neighbouring pages are sent in
+    the X-Before-Cursor / X-After-Cursor headers, and X-Has-More tells whether
+    paging further in the requested direction will return anything.
+    """
+    try:
+        limit = min(int(request.args.get('limit', MESSAGE_PAGE_SIZE)), MAX_MESSAGE_PAGE_SIZE)
+        messages, has_more = MongoMessage.find_page(
+            channel_id,
+            before=request.args.get('before'),
+            after=request.args.get('after'),
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        # Serialize message by message instead of building the whole body in memory
+        yield '['
+        for i, m in enumerate(messages):
+            if i:
+                yield ','
+            yield json.dumps({
+                'id': str(m['_id']),
+                'channel_id': m['channel_id'],
+                'user_id': m['user_id'],
+                'content': m['content'],
+                'parent_message_id': m.get('parent_message_id'),
+                'created_at': m['created_at'].isoformat() if hasattr(m['created_at'], 'isoformat') else str(m['created_at']),
+                'name': m.get('name', 'Unknown')
+            })
+        yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    if messages:
+        response.headers['X-Before-Cursor'] = MongoMessage.encode_cursor(messages[0])
+        response.headers['X-After-Cursor'] = MongoMessage.encode_cursor(messages[-1])
+    response.headers['X-Has-More'] = 'true' if has_more else 'false'
+    response.headers['Access-Control-Expose-Headers'] = 'X-Before-Cursor, X-After-Cursor, X-Has-More'
+    return response
 
 @app.route('/api/channels/<string:channel_id>/members', methods=['GET'])
 def get_channel_members(channel_id):
     """Return members of a channel (for chat UI)"""
     try:
-        collection = mongo.get_collection('channels')
-        channel = collection.find_one({'_id': channel_id})
+        channel = MongoChannel.find_by_id(channel_id) if ObjectId.is_valid(channel_id) else None
         if not channel:
             return jsonify({'error': 'Channel not found'}), 404
-        members = channel.get('members', [])
-        # If members are user IDs, fetch user info
-        user_collection = mongo.get_collection('users')
-        member_objs = []
-        for m in members:
-            user = user_collection.find_one({'_id': m}) if isinstance(m, str) else user_collection.find_one({'_id': str(m)})
-            if user:
-                member_objs.append({
-                    'id': str(user['_id']),
-                    'name': user.get('name', ''),
-                    'email': user.get('email', ''),
-                    'user_type': user.get('user_type', 'employee'),
-                    'department': user.get('department', ''),
-                })
+        # Channels store member_ids; 'members' is kept for documents written by older code
+        member_ids = channel.get('member_ids') or channel.get('members', [])
+        member_objs = [
+            {
+                'id': str(user['_id']),
+                'name': user.get('name', ''),
+                'email': user.get('email', ''),
+                'user_type': user.get('user_type', 'employee'),
+                'department': user.get('department', ''),
+            }
+            for user in MongoUser.find_profiles(member_ids)
+        ]
         return jsonify(member_objs)
     except Exception as e:
         print(f"Error in get_channel_members: {e}")
@@ -1166,7 +1302,7 @@ def handle_meetings():
         if request.method == 'GET':
             # Fetch all meetings from MongoDB
             meetings = MongoMeeting.find_all()
-            print(f"Meetings fetched: {meetings}")
+            meetings_log.debug("Fetched %d meetings", len(meetings))
             return jsonify([
                 {
                     'id': str(meeting['_id']),
@@ -1236,27 +1372,41 @@ def handle_meetings():
                     'participants': meeting_doc.get("invitee_ids", [])
                 }
             }), 201
-    except Exception as e:
-        print(f"Meeting error: {e}")
+    except Exception:
+        meetings_log.exception("Meeting error")
         return jsonify({'error': 'Failed to handle meetings'}), 500
 
 @app.route("/api/channels/<channel_id>/read", methods=["POST", "OPTIONS"])
 def mark_channel_read(channel_id):
     """Mark a channel as read for the current user"""
-    print(f"DEBUG: mark_channel_read called with channel_id={channel_id}")
     if request.method == "OPTIONS":
         return "", 200
     try:
-        user_id = request.args.get("user_id")
+        data = request.get_json(silent=True) or {}
+        # The token's user when there is one; the body / query param until every client sends tokens
+        auth = access_tokens.current_user()
+        user_id = auth.id if auth else (data.get("user_id") or request.args.get("user_id"))
         if not user_id:
             return jsonify({"error": "user_id is required"}), 400
-        
-        # For now, just return success since we do not have a read status tracking system
-        # In a full implementation, this would update the user read status for the channel
+
+        # Optional newest message the client has displayed, as a page cursor or a
+        # message id; without one the channel is read up to now
+        read_at = None
+        if data.get("cursor"):
+            try:
+                read_at, _ = MongoMessage.decode_cursor(data["cursor"])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        elif data.get("message_id"):
+            message = MongoMessage.find_in_channel(channel_id, data["message_id"])
+            # A message still in the write-behind buffer is not stored yet; it is
+            # the newest one, so reading up to now covers it
+            if message:
+                read_at = message["created_at"]
+        MongoChannelRead.mark_read(user_id, channel_id, read_at)
         return jsonify({"success": True})
-    except Exception as e:
-        print(f"Error in mark_channel_read: {e}")
-        import traceback; traceback.print_exc()
+    except Exception:
+        chat_log.exception("Error in mark_channel_read for channel %s", channel_id)
         return jsonify({"error": "Failed to mark channel as read"}), 500
 
 # Move business logic to core/business_logic.py and keep only Flask app/adapters here.
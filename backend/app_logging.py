@@ -0,0 +1,87 @@
+"""
+Logging setup for the backend
+
+Every subsystem logs through get_logger('<subsystem>'), a child of the
+'genius' logger. Configuration comes from the environment:
+
+    LOG_LEVEL=INFO      # DEBUG, INFO, WARNING, ...
+    LOG_FORMAT=text     # or json, one JSON object per line
+
+Pass values as logger arguments (logger.debug("saved %s", msg_id)) rather
+than f-strings so nothing is formatted when the level is disabled, and guard
+anything expensive to build with logger.isEnabledFor(logging.DEBUG).
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+
+ROOT_LOGGER = 'genius'
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class Sampler:
+    """Lets through the first of every `every` events per key.
+
+    For events too frequent to log individually (socket connects, messages);
+    the running count is passed along so the sampled line still says how many
+    events it stands for.
+    """
+
+    def __init__(self, every=100):
+        self.every = every
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def hit(self, key=None):
+        """Count an event; returns the running total when this one should be logged, else 0"""
+        with self._lock:
+            self._counts[key] += 1
+            count = self._counts[key]
+        return count if (count - 1) % self.every == 0 else 0
+
+
+_configured = False
+
+
+def configure_logging():
+    """Install the handler on the 'genius' logger once per process"""
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler()
+    if os.getenv('LOG_FORMAT', 'text').lower() == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+    root = logging.getLogger(ROOT_LOGGER)
+    root.addHandler(handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(subsystem):
+    return logging.getLogger(f'{ROOT_LOGGER}.{subsystem}')
@@ -0,0 +1,123 @@
+"""
+Token-budgeted prompt history for AI chat conversations
+
+build_prompt(conversation, user_message) returns the messages to send for a
+new turn: the system prompt, a rolling summary of older turns when the
+thread no longer fits, the most recent turns verbatim, and the new message,
+all within CHAT_HISTORY_TOKENS.
+
+The summary is stored on the conversation document as
+{'text', 'upto', 'updated_at'}, where `upto` is the seq of the first message
+it does not cover; only messages from `upto` on are loaded. It is rebuilt
+once the verbatim window slides past `upto`, and then runs SUMMARY_STEP
+messages ahead so the next few turns reuse it.
+
+Token counts come from llm_client.estimate_tokens.
+"""
+import os
+
+from app_logging import get_logger
+from mongo_db import MongoChatConversation
+import llm_client
+from llm_client import estimate_tokens
+
+log = get_logger('chat.history')
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+SUMMARY_MODEL = "gpt-3.5-turbo"
+
+# Prompt tokens for everything but the reply; gpt-3.5-turbo has 4k in total
+HISTORY_TOKEN_BUDGET = int(os.getenv('CHAT_HISTORY_TOKENS', '3000'))
+SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_TOKENS', '300'))
+# Turns kept verbatim even if they alone overrun the budget
+MIN_RECENT_MESSAGES = 2
+# Messages the summary runs ahead of the window each time it is rebuilt
+SUMMARY_STEP = 10
+# Per-message cap on what the summarizer gets to read
+SUMMARY_INPUT_CHARS = 2000
+# Role and separator tokens the API adds around each message
+MESSAGE_OVERHEAD = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+def message_tokens(message):
+    return estimate_tokens(message['content']) + MESSAGE_OVERHEAD
+
+
+def _recent_window_start(history, budget):
+    """Index of the oldest message that still fits, walking back from the newest"""
+    start = len(history)
+    used = 0
+    while start > 0:
+        cost = message_tokens(history[start - 1])
+        if used + cost > budget and len(history) - start >= MIN_RECENT_MESSAGES:
+            break
+        used += cost
+        start -= 1
+    return start
+
+
+def _summarize(previous_summary, messages):
+    """Fold `messages` into `previous_summary` with one completion"""
+    transcript = '\n'.join(
+        f"{msg['role']}: {msg['content'][:SUMMARY_INPUT_CHARS]}" for msg in messages
+    )
+    prompt = (
+        "Update the running summary of a conversation between a user and an assistant. "
+        "Keep names, facts, decisions, preferences and open questions; drop pleasantries. "
+        f"Answer with the summary only, in at most {SUMMARY_MAX_TOKENS * 3 // 4} words.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    response = llm_client.chat_completion(
+        [{"role": "user", "content": prompt}],
+        model=SUMMARY_MODEL,
+        max_tokens=SUMMARY_MAX_TOKENS,
+        temperature=0.2
+    )
+    return response.choices[0].message.content.strip()
+
+
+def build_prompt(conversation, user_message, history=None):
+    """Messages for the next completion of `conversation`.
+
+    `history` defaults to the stored messages the summary does not cover yet
+    (seq >= summary.upto), oldest first, and must not include `user_message`.
+    """
+    summary = conversation.get('summary') or {}
+    summary_text = summary.get('text')
+    upto = summary.get('upto', 0)
+    if history is None:
+        history = MongoChatConversation.get_messages_since(conversation['_id'], upto)
+    system = {"role": "system", "content": SYSTEM_PROMPT}
+    new_turn = {"role": "user", "content": user_message}
+    budget = HISTORY_TOKEN_BUDGET - message_tokens(system) - message_tokens(new_turn)
+
+    # Nothing summarized yet and the whole thread fits
+    if not summary_text and _recent_window_start(history, budget) == 0:
+        return [system] + [_prompt_message(msg) for msg in history] + [new_turn]
+
+    summary_cost = SUMMARY_MAX_TOKENS + message_tokens({"content": SUMMARY_PREFIX})
+    start = _recent_window_start(history, budget - summary_cost)
+    if start > 0:
+        # The window slid past the summary: fold in what fell out, plus a few more
+        cut = max(start, min(start + SUMMARY_STEP, len(history) - MIN_RECENT_MESSAGES))
+        try:
+            summary_text = _summarize(summary_text, history[:cut])
+            upto = history[cut - 1]['seq'] + 1
+            MongoChatConversation.save_summary(conversation['_id'], summary_text, upto)
+            log.debug("Summarized %s up to message %d", conversation['_id'], upto)
+            start = cut
+        except Exception as e:
+            # Still answer: the stale summary (if any) plus the window that fits
+            log.warning("Could not refresh summary of %s: %s", conversation['_id'], e)
+
+    messages = [system]
+    if summary_text:
+        messages.append({"role": "system", "content": SUMMARY_PREFIX + summary_text})
+    messages.extend(_prompt_message(msg) for msg in history[start:])
+    messages.append(new_turn)
+    return messages
+
+
+def _prompt_message(msg):
+    return {"role": msg['role'], "content": msg['content']}
@@ -1,8 +1,110 @@
 # ─── OpenAI Chat Endpoints ─────────────────────────────────────────────────
 
-import os
+import json
+import traceback
 
-@app.route('/api/chat/conversations', methods=['POST'])
+from flask import Blueprint, Response, request, jsonify
+
+from app_logging import get_logger
+from mongo_db import MongoChatConversation
+import chat_history
+import llm_client
+
+log = get_logger('ai.chat')
+
+chat_bp = Blueprint('chat', __name__)
+
+CHAT_MODEL = "gpt-3.5-turbo"
+CHAT_MAX_TOKENS = 1000
+CHAT_TEMPERATURE = 0.7
+
+# Message history paging
+CHAT_PAGE_SIZE = 50
+MAX_CHAT_PAGE_SIZE = 200
+
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _conversation_summary(conv):
+    """Sidebar view of a conversation: constant size however long the thread is"""
+    last = conv.get('last_message')
+    return {
+        'id': str(conv['_id']),
+        'user_id': conv['user_id'],
+        'title': conv['title'],
+        'message_count': conv.get('message_count', 0),
+        'last_message': {
+            'role': last['role'],
+            'preview': last['preview'],
+            'timestamp': _isoformat(last.get('timestamp'))
+        } if last else None,
+        'created_at': conv['created_at'].isoformat(),
+        'updated_at': conv['updated_at'].isoformat()
+    }
+
+
+def _chat_message(msg):
+    return {
+        'seq': msg['seq'],
+        'role': msg['role'],
+        'content': msg['content'],
+        'timestamp': _isoformat(msg.get('timestamp'))
+    }
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _stream_reply(conversation_id, messages):
+    """Relay the completion as server-sent events, storing the reply once it ends.
+
+    Events are `token` ({"delta": ...}) for each chunk, then `done` with the
+    stored reply, or `error` if the completion breaks off. A reply cut short
+    by an error or a disconnecting client is stored as far as it got.
+    """
+    stream = llm_client.stream_chat_completion(
+        messages,
+        model=CHAT_MODEL,
+        max_tokens=CHAT_MAX_TOKENS,
+        temperature=CHAT_TEMPERATURE
+    )
+
+    def events():
+        parts = []
+        finished = False
+        updated_conversation = None
+        try:
+            for delta in stream:
+                parts.append(delta)
+                yield _sse('token', {'delta': delta})
+            finished = True
+        except Exception:
+            log.exception("Stream chat message error")
+            yield _sse('error', {'error': 'Response was interrupted'})
+        finally:
+            assistant_message = ''.join(parts)
+            if assistant_message:
+                updated_conversation = MongoChatConversation.add_message(
+                    conversation_id, 'assistant', assistant_message
+                )
+        if finished:
+            yield _sse('done', {
+                'assistant_message': assistant_message,
+                'updated_at': updated_conversation['updated_at'].isoformat() if updated_conversation else None
+            })
+
+    response = Response(events(), mimetype='text/event-stream')
+    # Frees the LLM slot even if the client leaves before the first chunk
+    response.call_on_close(stream.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the whole reply
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@chat_bp.route('/api/chat/conversations', methods=['POST'])
 def create_chat_conversation():
     """Create a new chat conversation"""
     try:
@@ -14,39 +116,34 @@ def create_chat_conversation():
             return jsonify({'error': 'User ID is required'}), 400
         
         conversation = MongoChatConversation.create_conversation(user_id, title)
-        return jsonify({
-            'id': str(conversation['_id']),
-            'user_id': conversation['user_id'],
-            'title': conversation['title'],
-            'messages': conversation['messages'],
-            'created_at': conversation['created_at'].isoformat(),
-            'updated_at': conversation['updated_at'].isoformat()
-        })
+        return jsonify({**_conversation_summary(conversation), 'messages': []})
     except Exception as e:
         print(f"Create chat conversation error: {e}")
         return jsonify({'error': 'Failed to create conversation'}), 500
 
-@app.route('/api/chat/conversations/<string:conversation_id>', methods=['GET'])
+@chat_bp.route('/api/chat/conversations/<string:conversation_id>', methods=['GET'])
 def get_chat_conversation(conversation_id):
-    """Get a specific chat conversation"""
+    """Get a conversation with its most recent page of messages.
+
+    `has_more` tells whether older messages exist; fetch them from
+    GET .../messages?before=<seq of the first message>.
+    """
     try:
-        conversation = MongoChatConversation.get_conversation(conversation_id)
+        conversation = MongoChatConversation.get_summary(conversation_id)
         if not conversation:
             return jsonify({'error': 'Conversation not found'}), 404
         
+        messages, has_more, _ = MongoChatConversation.get_messages_page(conversation_id, limit=CHAT_PAGE_SIZE)
         return jsonify({
-            'id': str(conversation['_id']),
-            'user_id': conversation['user_id'],
-            'title': conversation['title'],
-            'messages': conversation['messages'],
-            'created_at': conversation['created_at'].isoformat(),
-            'updated_at': conversation['updated_at'].isoformat()
+            **_conversation_summary(conversation),
+            'messages': [_chat_message(m) for m in messages],
+            'has_more': has_more
         })
     except Exception as e:
         print(f"Get chat conversation error: {e}")
         return jsonify({'error': 'Failed to get conversation'}), 500
 
-@app.route('/api/chat/conversations', methods=['GET'])
+@chat_bp.route('/api/chat/conversations', methods=['GET'])
 def get_user_conversations():
     """Get all conversations for a user"""
     try:
@@ -55,30 +152,43 @@ def get_user_conversations():
             return jsonify({'error': 'User ID is required'}), 400
         
         conversations = MongoChatConversation.get_user_conversations(user_id)
-        return jsonify([{
-            'id': str(conv['_id']),
-            'user_id': conv['user_id'],
-            'title': conv['title'],
-            'messages': conv['messages'],
-            'created_at': conv['created_at'].isoformat(),
-            'updated_at': conv['updated_at'].isoformat()
-        } for conv in conversations])
+        return jsonify([_conversation_summary(conv) for conv in conversations])
     except Exception as e:
         print(f"Get user conversations error: {e}")
         return jsonify({'error': 'Failed to get conversations'}), 500
 
-@app.route('/api/chat/conversations/<string:conversation_id>/messages', methods=['POST'])
-def send_chat_message(conversation_id):
-    """Send a message and get OpenAI response"""
+@chat_bp.route('/api/chat/conversations/<string:conversation_id>/messages', methods=['GET'])
+def get_chat_messages(conversation_id):
+    """Return one page of a conversation's messages, oldest first.
+
+    Query params: `before` (a message seq; default: after the newest message)
+    and `limit`. X-Has-More tells whether older messages remain.
+    """
     try:
-        from openai import OpenAI
-        
-        # Initialize OpenAI client with API key from environment
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise Exception("OPENAI_API_KEY environment variable not set")
-        client = OpenAI(api_key=api_key)
+        limit = min(int(request.args.get('limit', CHAT_PAGE_SIZE)), MAX_CHAT_PAGE_SIZE)
+        before = request.args.get('before')
+        before = int(before) if before is not None else None
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'before and limit must be positive integers'}), 400
+    try:
+        messages, has_more, found = MongoChatConversation.get_messages_page(conversation_id, before=before, limit=limit)
+        if not found:
+            return jsonify({'error': 'Conversation not found'}), 404
         
+        response = jsonify([_chat_message(m) for m in messages])
+        response.headers['X-Has-More'] = 'true' if has_more else 'false'
+        response.headers['Access-Control-Expose-Headers'] = 'X-Has-More'
+        return response
+    except Exception as e:
+        print(f"Get chat messages error: {e}")
+        return jsonify({'error': 'Failed to get messages'}), 500
+
+@chat_bp.route('/api/chat/conversations/<string:conversation_id>/messages', methods=['POST'])
+def send_chat_message(conversation_id):
+    """Send a message and get OpenAI response (as an event stream with {"stream": true})"""
+    try:
         data = request.get_json()
         user_message = data.get('message')
         
@@ -90,31 +200,22 @@ def send_chat_message(conversation_id):
         if not conversation:
             return jsonify({'error': 'Conversation not found'}), 404
         
+        # Recent turns verbatim, older ones folded into the stored summary
+        messages = chat_history.build_prompt(conversation, user_message)
+        
         # Add user message to conversation
         MongoChatConversation.add_message(conversation_id, 'user', user_message)
         
-        # Prepare messages for OpenAI API
-        messages = [{"role": "system", "content": "You are a helpful assistant."}]
-        
-        # Add conversation history
-        for msg in conversation['messages']:
-            messages.append({
-                "role": msg['role'],
-                "content": msg['content']
-            })
-        
-        # Add the new user message
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        # Stream tokens back as they arrive when the client asks for it
+        if data.get('stream') or request.accept_mimetypes.best == 'text/event-stream':
+            return _stream_reply(conversation_id, messages)
         
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=1000,
-            temperature=0.7
+        # Call OpenAI API through the shared client; waits for a free slot
+        response = llm_client.chat_completion(
+            messages,
+            model=CHAT_MODEL,
+            max_tokens=CHAT_MAX_TOKENS,
+            temperature=CHAT_TEMPERATURE
         )
         
         assistant_message = response.choices[0].message.content
@@ -125,22 +226,19 @@ def send_chat_message(conversation_id):
         return jsonify({
             'user_message': user_message,
             'assistant_message': assistant_message,
-            'conversation': {
-                'id': str(updated_conversation['_id']),
-                'user_id': updated_conversation['user_id'],
-                'title': updated_conversation['title'],
-                'messages': updated_conversation['messages'],
-                'created_at': updated_conversation['created_at'].isoformat(),
-                'updated_at': updated_conversation['updated_at'].isoformat()
-            }
+            'updated_at': updated_conversation['updated_at'].isoformat()
         })
         
     except Exception as e:
+        failure = llm_client.error_response(e)
+        if failure:
+            body, status, headers = failure
+            return jsonify(body), status, headers
         print(f"Send chat message error: {e}")
         print(f"Traceback: {traceback.format_exc()}")
         return jsonify({'error': 'Failed to send message'}), 500
 
-@app.route('/api/chat/conversations/<string:conversation_id>', methods=['DELETE'])
+@chat_bp.route('/api/chat/conversations/<string:conversation_id>', methods=['DELETE'])
 def delete_chat_conversation(conversation_id):
     """Delete a chat conversation"""
     try:
@@ -153,7 +251,7 @@ def delete_chat_conversation(conversation_id):
         print(f"Delete chat conversation error: {e}")
         return jsonify({'error': 'Failed to delete conversation'}), 500
 
-@app.route('/api/chat/conversations/<string:conversation_id>/title', methods=['PUT'])
+@chat_bp.route('/api/chat/conversations/<string:conversation_id>/title', methods=['PUT'])
 def update_conversation_title(conversation_id):
     """Update conversation title"""
     try:
@@ -167,14 +265,7 @@ def update_conversation_title(conversation_id):
         if not conversation:
             return jsonify({'error': 'Conversation not found'}), 404
         
-        return jsonify({
-            'id': str(conversation['_id']),
-            'user_id': conversation['user_id'],
-            'title': conversation['title'],
-            'messages': conversation['messages'],
-            'created_at': conversation['created_at'].isoformat(),
-            'updated_at': conversation['updated_at'].isoformat()
-        })
+        return jsonify(_conversation_summary(conversation))
     except Exception as e:
         print(f"Update conversation title error: {e}")
         return jsonify({'error': 'Failed to update title'}), 500
@@ -0,0 +1,138 @@
+"""
+Write-behind queue for chat message persistence
+
+With CHAT_WRITE_BEHIND=1, handle_send_message broadcasts a message as soon as
+its document is built and hands the document to this queue. A background
+thread group-commits pending messages with one insert_many whenever
+CHAT_WRITE_BEHIND_BATCH messages are waiting or CHAT_WRITE_BEHIND_INTERVAL_MS
+has passed since the oldest one arrived, then reports each message as
+persisted (or failed) through the callbacks.
+
+A message is only durable once its commit callback has run; the queue is
+flushed at interpreter shutdown, but a killed process loses what is pending.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from app_logging import get_logger
+from mongo_db import MongoMessage
+
+log = get_logger('chat.write_behind')
+
+
+class MessageWriteBehind:
+    """Batches message inserts off the request thread.
+
+    on_commit(entries) and on_error(entries, exc) receive the list of
+    (msg_doc, context) pairs of each batch, where context is whatever the
+    caller passed to submit (e.g. the sender's sid for the acknowledgement).
+    """
+
+    def __init__(self, on_commit=None, on_error=None, interval=0.005, max_batch=100, max_retries=3):
+        self.on_commit = on_commit
+        self.on_error = on_error
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def submit(self, msg_doc, context=None):
+        """Queue a document from MongoMessage.build_message for insertion"""
+        if self._stopping.is_set():
+            raise RuntimeError("Write-behind queue is shut down")
+        self._queue.put((msg_doc, context))
+
+    def flush(self, timeout=None):
+        """Block until everything submitted before this call is committed or failed"""
+        done = threading.Event()
+        self._queue.put((None, done))
+        return done.wait(timeout)
+
+    def stop(self, timeout=10):
+        """Flush pending messages and stop the writer thread"""
+        if self._thread is None or self._stopping.is_set():
+            return
+        self.flush(timeout)
+        self._stopping.set()
+        self._queue.put((None, None))
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch, markers = self._collect()
+            if batch:
+                self._commit(batch)
+            for marker in markers:
+                marker.set()
+
+    def _collect(self):
+        """Wait for one entry, then gather more until the batch is full or interval elapses"""
+        batch, markers = [], []
+        msg_doc, context = self._queue.get()
+        deadline = time.monotonic() + self.interval
+        while True:
+            if msg_doc is not None:
+                batch.append((msg_doc, context))
+            elif context is not None:
+                # flush() marker: commit what we have now
+                markers.append(context)
+                break
+            else:
+                break
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                break
+            try:
+                msg_doc, context = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch, markers
+
+    def _commit(self, batch):
+        docs = [msg_doc for msg_doc, _ in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                MongoMessage.insert_batch(docs)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    log.error("Dropping batch of %d messages after %d attempts: %s", len(docs), attempt + 1, e)
+                    self._notify(self.on_error, batch, e)
+                    return
+                log.warning("Batch insert failed (attempt %d), retrying: %s", attempt + 1, e)
+                time.sleep(0.05 * 2 ** attempt)
+        log.debug("Committed %d messages", len(docs))
+        self._notify(self.on_commit, batch)
+
+    @staticmethod
+    def _notify(callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception:
+            log.exception("Write-behind callback failed")
+
+
+def from_env(on_commit=None, on_error=None):
+    """Started MessageWriteBehind if CHAT_WRITE_BEHIND is enabled, else None"""
+    if os.getenv('CHAT_WRITE_BEHIND', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    return MessageWriteBehind(
+        on_commit=on_commit,
+        on_error=on_error,
+        interval=int(os.getenv('CHAT_WRITE_BEHIND_INTERVAL_MS', '5')) / 1000,
+        max_batch=int(os.getenv('CHAT_WRITE_BEHIND_BATCH', '100')),
+    ).start()
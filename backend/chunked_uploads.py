@@ -0,0 +1,381 @@
+"""
+Resumable, chunked file uploads
+
+/api/upload-file takes the whole file in one multipart body, capped by
+MAX_CONTENT_LENGTH, which is too small for video. Large files go through
+an upload session instead:
+
+    POST   /api/uploads                 {filename, size, mime_type?, sha256?}
+                                        -> 201 {upload_id, offset, chunk_size, ...}
+    PUT    /api/uploads/<id>            raw bytes, Content-Range: bytes <start>-<end>/<size>
+                                        -> {offset}; 409 {offset} if start != offset
+    GET    /api/uploads/<id>            -> {offset, size, status, ...}
+    POST   /api/uploads/<id>/complete   {sha256?} -> the /api/upload-file response + sha256
+    DELETE /api/uploads/<id>            abandon the upload
+
+Each chunk is copied from the request stream straight into
+UPLOAD_FOLDER/.partial/<id>.part in small blocks, so a worker never holds
+more than one block in memory. The committed offset lives in
+MongoUploadSession; if the client disconnects mid-chunk, whatever arrived
+is kept and committed, and the client resumes from the offset GET reports.
+The SHA-256 is updated as the bytes are written. A process that did not
+see the earlier chunks (restart, another worker) re-reads the part file
+once to pick the hash up again.
+
+Chunks of one upload must be sent one at a time, in order.
+
+    UPLOAD_MAX_SIZE=5368709120      # bytes per file
+    UPLOAD_CHUNK_SIZE=8388608       # suggested chunk size; a chunk may be up to MAX_CONTENT_LENGTH
+    UPLOAD_SESSION_TTL=86400        # seconds an idle upload is kept
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.http import parse_content_range_header
+
+from access_tokens import current_user
+from app_logging import get_logger
+from cache_utils import TTLCache
+from mongo_db import MongoUploadSession
+
+log = get_logger('uploads')
+
+MAX_UPLOAD_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', str(5 * 1024 ** 3)))
+CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', str(24 * 3600)))
+# Bytes copied from the request to disk (and the hash) at a time
+BLOCK_SIZE = 1024 * 1024
+# Seconds between sweeps for part files of expired sessions
+SWEEP_INTERVAL = 3600
+PARTIAL_DIR = '.partial'
+
+uploads_bp = Blueprint('uploads', __name__)
+_allowed_file = None
+
+# upload id -> (offset, sha256 object) for the uploads this process is receiving
+_hashers = TTLCache(maxsize=256, ttl=SESSION_TTL)
+_locks = {}
+_locks_lock = threading.Lock()
+_next_sweep = 0.0
+
+
+# ─── Storage ──────────────────────────────────────────────────────────────────
+
+def _partial_path(upload_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_DIR, f"{upload_id}.part")
+
+
+def _stored_filename(session):
+    # Same shape as /api/upload-file's names; deterministic so a repeated finalize is harmless
+    return f"{uuid.UUID(session['_id'])}.{session['extension']}"
+
+
+def _lock_for(upload_id):
+    with _locks_lock:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _forget(upload_id):
+    _hashers.pop(upload_id)
+    with _locks_lock:
+        _locks.pop(upload_id, None)
+
+
+def _hash_file(path, length):
+    """sha256 object covering the first `length` bytes of `path`"""
+    hasher = hashlib.sha256()
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining:
+            block = f.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise IOError(f"{path} is shorter than {length} bytes")
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _hasher_at(upload_id, offset):
+    """sha256 object covering the first `offset` bytes of the part file"""
+    cached = _hashers.get(upload_id)
+    if cached is not None and cached[0] == offset:
+        return cached[1]
+    hasher = _hash_file(_partial_path(upload_id), offset)
+    log.info("Rebuilt hash state of upload %s from %d bytes on disk", upload_id, offset)
+    return hasher
+
+
+def _sweep_expired_parts():
+    """Delete part files untouched for longer than a session lives (their sessions are gone)"""
+    global _next_sweep
+    now = time.monotonic()
+    if now < _next_sweep:
+        return
+    _next_sweep = now + SWEEP_INTERVAL
+    directory = os.path.join(current_app.config['UPLOAD_FOLDER'], PARTIAL_DIR)
+    cutoff = time.time() - SESSION_TTL
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                log.info("Removed expired partial upload %s", entry.name)
+        except OSError:
+            log.warning("Could not remove expired partial upload %s", entry.name)
+
+
+def _expires_at():
+    return datetime.utcnow() + timedelta(seconds=SESSION_TTL)
+
+
+# ─── Sessions ─────────────────────────────────────────────────────────────────
+
+def _owned_session(upload_id):
+    """(session, None) or (None, error response) for the requester's upload"""
+    session = MongoUploadSession.find(upload_id)
+    user = current_user()
+    if session is None or (session.get('user_id') and (user is None or user.id != session['user_id'])):
+        return None, (jsonify({'error': 'Upload not found'}), 404)
+    return session, None
+
+
+def _status(session):
+    return {
+        'upload_id': session['_id'],
+        'original_filename': session['original_filename'],
+        'size': session['size'],
+        'offset': session['offset'],
+        'status': session['status'],
+        'chunk_size': CHUNK_SIZE,
+        'expires_at': session['expires_at'].isoformat(),
+    }
+
+
+def _file_info(session):
+    filename = session['filename']
+    return {
+        'filename': filename,
+        'original_filename': session['original_filename'],
+        'file_path': os.path.join(current_app.config['UPLOAD_FOLDER'], filename),
+        'file_size': session['size'],
+        'mime_type': session['mime_type'],
+        'sha256': session['sha256'],
+    }
+
+
+# ─── Routes ───────────────────────────────────────────────────────────────────
+
+@uploads_bp.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Open an upload session for a file of `size` bytes"""
+    data = request.get_json(silent=True) or {}
+    filename = (data.get('filename') or '').strip()
+    size = data.get('size')
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+    if not _allowed_file(filename):
+        log.info("Upload rejected: file type not allowed for %s", filename)
+        return jsonify({'error': f'File type not allowed: {filename}'}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        return jsonify({'error': 'size must be a non-negative integer'}), 400
+    if size > MAX_UPLOAD_SIZE:
+        return jsonify({'error': f'File too large (limit {MAX_UPLOAD_SIZE} bytes)'}), 413
+    sha256 = data.get('sha256')
+    if sha256 is not None and (not isinstance(sha256, str) or len(sha256) != 64):
+        return jsonify({'error': 'sha256 must be a hex digest'}), 400
+
+    _sweep_expired_parts()
+    upload_id = uuid.uuid4().hex
+    path = _partial_path(upload_id)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'wb').close()
+    except OSError:
+        log.exception("Could not create partial upload %s", path)
+        return jsonify({'error': 'Upload directory not writable'}), 500
+    user = current_user()
+    session = MongoUploadSession.create(
+        upload_id, user.id if user else None, filename, filename.rsplit('.', 1)[1].lower(),
+        data.get('mime_type') or 'application/octet-stream', size,
+        sha256.lower() if sha256 else None, _expires_at()
+    )
+    _hashers.set(upload_id, (0, hashlib.sha256()))
+    log.info("Upload %s opened for %s (%d bytes)", upload_id, filename, size)
+    return jsonify(_status(session)), 201
+
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Where to resume: the number of bytes already stored"""
+    session, error = _owned_session(upload_id)
+    if error:
+        return error
+    return jsonify(_status(session))
+
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_chunk(upload_id):
+    """Append the request body at the offset given by Content-Range"""
+    session, error = _owned_session(upload_id)
+    if error:
+        return error
+    if session['status'] != 'uploading':
+        return jsonify({'error': 'Upload already completed'}), 409
+    content_range = parse_content_range_header(request.headers.get('Content-Range'))
+    if content_range is None or content_range.units != 'bytes':
+        return jsonify({'error': 'Content-Range: bytes <start>-<end>/<size> is required'}), 400
+    if content_range.length is not None and content_range.length != session['size']:
+        return jsonify({'error': 'Content-Range size does not match the upload'}), 400
+    start, length = content_range.start, content_range.stop - content_range.start
+    if content_range.stop > session['size']:
+        return jsonify({'error': 'Chunk extends past the end of the file'}), 400
+    if length > current_app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'Chunk too large'}), 413
+    if request.content_length is not None and request.content_length != length:
+        return jsonify({'error': 'Content-Length does not match Content-Range'}), 400
+    if request.content_length is None and not request.environ.get('wsgi.input_terminated'):
+        return jsonify({'error': 'Content-Length is required'}), 411
+
+    lock = _lock_for(upload_id)
+    if not lock.acquire(blocking=False):
+        return jsonify({'error': 'Another chunk of this upload is in progress', 'offset': session['offset']}), 409
+    try:
+        # Re-read under the lock: a chunk that just finished may have moved the offset
+        session = MongoUploadSession.find(upload_id)
+        if session is None or session['status'] != 'uploading':
+            return jsonify({'error': 'Upload not found'}), 404
+        offset = session['offset']
+        if start != offset:
+            return jsonify({'error': 'Chunk does not start at the upload offset', 'offset': offset}), 409
+
+        # A copy, so the cached state still matches `offset` if this chunk fails
+        hasher = _hasher_at(upload_id, offset).copy()
+        # The raw input rather than request.stream, which discards a short final read
+        # as a disconnect; reads never go past this chunk's length
+        stream = request.environ['wsgi.input']
+        received = 0
+        with open(_partial_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            while received < length:
+                try:
+                    block = stream.read(min(BLOCK_SIZE, length - received))
+                except (ClientDisconnected, OSError):
+                    break
+                if not block:
+                    break
+                f.write(block)
+                hasher.update(block)
+                received += len(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Keep whatever arrived, even from a dropped connection, so the client resumes after it
+        new_offset = offset + received
+        if received and not MongoUploadSession.advance(upload_id, offset, new_offset, _expires_at()):
+            current = MongoUploadSession.find(upload_id)
+            return jsonify({'error': 'Upload offset changed concurrently',
+                            'offset': current['offset'] if current else None}), 409
+        _hashers.set(upload_id, (new_offset, hasher))
+    finally:
+        lock.release()
+
+    if received < length:
+        log.info("Upload %s: chunk cut short at %d of %d bytes", upload_id, received, length)
+        return jsonify({'error': 'Chunk incomplete', 'offset': new_offset}), 400
+    return jsonify({'upload_id': upload_id, 'offset': new_offset, 'size': session['size']})
+
+
+@uploads_bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Check the received file and move it next to the other uploads"""
+    session, error = _owned_session(upload_id)
+    if error:
+        return error
+    with _lock_for(upload_id):
+        session = MongoUploadSession.find(upload_id)
+        if session is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        if session['status'] == 'complete':
+            # The client lost the first response and asked again
+            return jsonify(_file_info(session))
+        if session['offset'] != session['size']:
+            return jsonify({'error': 'Upload is incomplete', 'offset': session['offset'],
+                            'size': session['size']}), 409
+
+        expected = (request.get_json(silent=True) or {}).get('sha256') or session.get('sha256')
+        path = _partial_path(upload_id)
+        filename = _stored_filename(session)
+        final_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+        # An earlier finalize may have moved the file and died before recording it
+        moved = not os.path.exists(path)
+        if moved:
+            if not os.path.exists(final_path) or os.path.getsize(final_path) != session['size']:
+                log.error("Upload %s has neither its part file nor a complete stored file", upload_id)
+                MongoUploadSession.delete(upload_id)
+                _forget(upload_id)
+                return jsonify({'error': 'Upload data is missing; upload the file again'}), 410
+            log.info("Upload %s was moved into place by an interrupted finalize", upload_id)
+            digest = _hash_file(final_path, session['size']).hexdigest()
+        else:
+            digest = _hasher_at(upload_id, session['offset']).hexdigest()
+        if expected and expected.lower() != digest:
+            log.warning("Upload %s failed its checksum", upload_id)
+            MongoUploadSession.delete(upload_id)
+            _forget(upload_id)
+            os.remove(final_path if moved else path)
+            return jsonify({'error': 'Checksum mismatch; upload the file again', 'sha256': digest}), 422
+
+        if not moved:
+            try:
+                # Bytes written past the committed offset (by a chunk that then failed) are dropped
+                with open(path, 'r+b') as f:
+                    f.truncate(session['size'])
+                os.replace(path, final_path)
+            except FileNotFoundError:
+                # Another worker finalized it first
+                session = MongoUploadSession.find(upload_id)
+                if session and session['status'] == 'complete':
+                    return jsonify(_file_info(session))
+                raise
+        # Kept for a while so a retried finalize gets the same answer
+        MongoUploadSession.complete(upload_id, filename, digest, _expires_at())
+        _forget(upload_id)
+
+    session = MongoUploadSession.find(upload_id)
+    log.info("Upload %s stored as %s (%d bytes)", upload_id, filename, session['size'])
+    return jsonify(_file_info(session))
+
+
+@uploads_bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Abandon an upload and delete what was received"""
+    session, error = _owned_session(upload_id)
+    if error:
+        return error
+    if session['status'] == 'complete':
+        return jsonify({'error': 'Upload already completed'}), 409
+    with _lock_for(upload_id):
+        MongoUploadSession.delete(upload_id)
+        try:
+            os.remove(_partial_path(upload_id))
+        except FileNotFoundError:
+            pass
+    _forget(upload_id)
+    log.info("Upload %s aborted", upload_id)
+    return jsonify({'message': 'Upload aborted'})
+
+
+def init_app(app, allowed_file):
+    """Serve /api/uploads; `allowed_file(filename)` decides which files are accepted"""
+    global _allowed_file
+    _allowed_file = allowed_file
+    app.register_blueprint(uploads_bp)
@@ -0,0 +1,34 @@
+"""
+Shared pytest setup: backend modules import flat from backend/, and MongoDB
+is mongomock's in-memory server
+
+The patch starts before test modules are collected, because mongo_db binds
+pymongo.MongoClient when it is first imported.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+MOCK_SERVER = ('mock-server', 27017)
+_patch = None
+
+
+def pytest_configure(config):
+    global _patch
+    os.environ['MONGODB_URI'] = 'mongodb://%s:%d/genius_test' % MOCK_SERVER
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ.setdefault('BCRYPT_ROUNDS', '4')
+    if mongomock is not None:
+        _patch = mongomock.patch(servers=(MOCK_SERVER,))
+        _patch.start()
+
+
+def pytest_unconfigure(config):
+    if _patch is not None:
+        _patch.stop()
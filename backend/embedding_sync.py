@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+Incremental embedding sync from MongoDB into the retrieval vector index
+
+Keeps the index behind retrieval_service (and /api/ai/ask) in step with the
+`clients`, `content_calendar` and `messages` collections without full
+reindexing. One watcher thread per source feeds changed documents to an
+indexer thread:
+
+- On a replica set each watcher tails a change stream, resuming from the
+  last processed token after a restart.
+- On a standalone server (no change streams) it polls every
+  EMBEDDING_SYNC_POLL_INTERVAL seconds for documents whose `updated_at`
+  (`created_at` for messages) has moved past the stored watermark.
+
+The indexer coalesces bursts: a document edited ten times while a batch is
+gathering is embedded once. A batch is processed once no change has arrived
+for EMBEDDING_SYNC_DEBOUNCE_MS, EMBEDDING_SYNC_MAX_DELAY_MS after its first
+change, or as soon as EMBEDDING_SYNC_BATCH documents are waiting. Documents
+whose text hashes the same as when last embedded are skipped; the rest are
+embedded in bulk (OpenAIPlugin.get_embeddings) and upserted in batches.
+Progress is kept in MongoEmbeddingSyncState, per vector index.
+
+Polling cannot see deletes; those are only applied in change stream mode.
+
+    EMBEDDING_SYNC=1    # run inside the web process (app.py)
+    python embedding_sync.py [--once] [--reset] [--sources clients,chat]
+
+A local vector index is a set of files owned by one process: run the sync
+in-process with a single web worker, or use VECTOR_BACKEND=pinecone and run
+this script as its own worker.
+"""
+import argparse
+import atexit
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app_logging import configure_logging, get_logger
+from cache_utils import TTLCache
+from mongo_db import mongo, MongoEmbeddingSyncState
+import retrieval_service
+
+log = get_logger('ai.embedding_sync')
+
+# Polls re-read this far behind the watermark to cover clock skew between
+# app servers and writes committed out of timestamp order; the content
+# hashes make the overlap free of re-embedding.
+POLL_OVERLAP = timedelta(seconds=5)
+POLL_PAGE_SIZE = 500
+# Characters of document text kept in the index metadata for prompts
+METADATA_TEXT_CHARS = 2000
+
+# document(doc) -> (title, text, scope); scope is the metadata retrieval filters access on:
+# the owning client_id for client data, the author's user_id for chat
+SyncSource = namedtuple('SyncSource', 'name collection clock_field document')
+
+
+def _join(*parts):
+    return '\n'.join(str(part).strip() for part in parts if part and str(part).strip())
+
+
+def _client_document(doc):
+    text = _join(
+        doc.get('name'),
+        f"Industry: {doc['industry']}" if doc.get('industry') else None,
+        doc.get('description'),
+        f"Website: {doc['website']}" if doc.get('website') else None,
+        f"Status: {doc['status']}" if doc.get('status') else None,
+    )
+    return doc.get('name') or 'Client', text, {'client_id': str(doc['_id'])}
+
+
+def _calendar_document(doc):
+    text = _join(
+        doc.get('title'),
+        ' · '.join(str(value) for value in (doc.get('platform'), doc.get('content_type'), doc.get('date'), doc.get('status')) if value),
+        doc.get('description'),
+        doc.get('text_copy'),
+        doc.get('hashtags'),
+        f"Client feedback: {doc['client_feedback']}" if doc.get('client_feedback') else None,
+    )
+    scope = {'client_id': str(doc['client_id'])} if doc.get('client_id') else {}
+    return doc.get('title') or 'Content calendar entry', text, scope
+
+
+def _message_document(doc):
+    author = doc.get('name') or 'a team member'
+    scope = {'user_id': str(doc['user_id'])} if doc.get('user_id') is not None else {}
+    return f"Message from {author}", _join(doc.get('content')), scope
+
+
+# Source names match retrieval_service.SOURCES; team chat messages are the 'chat' source
+SYNC_SOURCES = {
+    'clients': SyncSource('clients', 'clients', 'updated_at', _client_document),
+    'content_calendar': SyncSource('content_calendar', 'content_calendar', 'updated_at', _calendar_document),
+    'chat': SyncSource('chat', 'messages', 'created_at', _message_document),
+}
+
+
+def index_namespace():
+    """Identifies the configured vector index, so sync progress is tracked per index"""
+    if os.getenv('VECTOR_BACKEND', 'local').lower() == 'pinecone':
+        return f"pinecone:{os.getenv('PINECONE_INDEX_NAME', '')}"
+    return f"local:{os.path.abspath(os.getenv('VECTOR_INDEX_PATH', os.path.join('data', 'vector_index')))}"
+
+
+class EmbeddingSync:
+    """Watches sources for changes and keeps `index` up to date.
+
+    `embedder` is an OpenAIPlugin (or anything with get_embeddings).
+    on_indexed(count) runs after every batch that changed the index, e.g. to
+    drop cached retrieval results.
+    """
+
+    def __init__(self, index, embedder, namespace, sources=None, on_indexed=None,
+                 debounce=1.0, max_delay=5.0, batch_size=100, poll_interval=2.0):
+        self.index = index
+        self.embedder = embedder
+        self.namespace = namespace
+        self.sources = [SYNC_SOURCES[name] for name in (sources or SYNC_SOURCES)]
+        self.on_indexed = on_indexed
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        # (source name, doc id) -> (document or None for a delete, clock, resume token)
+        self._pending = {}
+        # (source name, doc id) -> clock of the version last enqueued
+        self._recent = TTLCache(maxsize=100_000, ttl=POLL_OVERLAP.total_seconds() * 4)
+        self._first_change = self._last_change = 0.0
+        self._changed = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    # ─── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self):
+        if not self._threads:
+            for source in self.sources:
+                self._spawn(self._watch, source, name=f'embedding-watch-{source.name}')
+            self._spawn(self._index_loop, name='embedding-indexer')
+            atexit.register(self.stop)
+            log.info("Embedding sync started for %s", ', '.join(source.name for source in self.sources))
+        return self
+
+    def stop(self, timeout=10):
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        with self._changed:
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _spawn(self, target, *args, name):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def run_once(self):
+        """Catch every source up by polling, synchronously; returns documents embedded"""
+        for source in self.sources:
+            self._poll(source, self._stored_watermark(source))
+        return self._drain()
+
+    def _stored_watermark(self, source):
+        return MongoEmbeddingSyncState.get_cursor(self.namespace, source.name).get('watermark')
+
+    # ─── Watchers ─────────────────────────────────────────────────────────────
+
+    def _watch(self, source):
+        while not self._stopping.is_set():
+            try:
+                self._tail(source)
+                return
+            except (OperationFailure, NotImplementedError) as e:
+                if isinstance(e, OperationFailure) and e.code == 286:
+                    # Resume token fell off the oplog: catch up by polling, then start a fresh stream
+                    log.warning("%s change stream history lost; catching up by polling", source.name)
+                    MongoEmbeddingSyncState.save_cursor(self.namespace, source.name, resume_token=None)
+                    continue
+                log.info("Change streams unavailable for %s (%s); polling every %ss",
+                         source.name, e, self.poll_interval)
+                self._poll_forever(source)
+                return
+            except PyMongoError as e:
+                log.warning("%s change stream interrupted, reopening: %s", source.name, e)
+                self._stopping.wait(self.poll_interval)
+
+    def _tail(self, source):
+        collection = mongo.get_collection(source.collection)
+        token = MongoEmbeddingSyncState.get_cursor(self.namespace, source.name).get('resume_token')
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}}]
+        with collection.watch(pipeline, full_document='updateLookup', resume_after=token,
+                              max_await_time_ms=1000) as stream:
+            if token is None:
+                # Stream is open, so nothing written from here on is missed; catch up on what came before
+                self._poll(source, self._stored_watermark(source))
+            while not self._stopping.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                doc_id = change['documentKey']['_id']
+                # An update whose document was deleted before the lookup has no fullDocument
+                doc = change.get('fullDocument') if change['operationType'] != 'delete' else None
+                self._enqueue(source, doc_id, doc, token=stream.resume_token)
+
+    def _poll_forever(self, source):
+        since = self._stored_watermark(source)
+        while not self._stopping.is_set():
+            try:
+                since = self._poll(source, since)
+            except PyMongoError as e:
+                log.warning("Polling %s failed: %s", source.name, e)
+            self._stopping.wait(self.poll_interval)
+
+    def _poll(self, source, watermark):
+        """Enqueue documents changed since `watermark`, paging on (clock, _id).
+
+        Returns the watermark for the next poll. The persisted one only moves
+        once the documents are indexed, so a restart re-reads anything pending.
+        """
+        collection = mongo.get_collection(source.collection)
+        started = datetime.utcnow()
+        if watermark is None:
+            # First run: walk the whole collection by _id, including documents without a clock
+            base, sort = {}, [('_id', 1)]
+        else:
+            base, sort = {source.clock_field: {'$gte': watermark - POLL_OVERLAP}}, [(source.clock_field, 1), ('_id', 1)]
+
+        last, found, newest = None, 0, watermark
+        while not self._stopping.is_set():
+            query = dict(base)
+            if last is not None:
+                if watermark is None:
+                    query['_id'] = {'$gt': last['_id']}
+                else:
+                    clock = last.get(source.clock_field)
+                    query = {'$and': [base, {'$or': [
+                        {source.clock_field: {'$gt': clock}},
+                        {source.clock_field: clock, '_id': {'$gt': last['_id']}},
+                    ]}]}
+            page = list(collection.find(query).sort(sort).limit(POLL_PAGE_SIZE))
+            for doc in page:
+                # Backfill pages are in _id order, so their clocks must not advance the watermark
+                self._enqueue(source, doc['_id'], doc, track_clock=watermark is not None)
+                if watermark is not None and doc.get(source.clock_field):
+                    newest = max(newest, doc[source.clock_field])
+            found += len(page)
+            if len(page) < POLL_PAGE_SIZE:
+                break
+            last = page[-1]
+        if found:
+            log.debug("Polled %d changed %s documents", found, source.name)
+        if watermark is None:
+            # Anything written while the backfill ran is newer than `started`, less the overlap
+            self._enqueue_watermark(source, started)
+            return started
+        return newest
+
+    def _enqueue_watermark(self, source, clock):
+        with self._changed:
+            self._pending[('watermark', source.name)] = (None, clock, None)
+            self._touch()
+
+    # ─── Indexer ──────────────────────────────────────────────────────────────
+
+    def _enqueue(self, source, doc_id, doc, token=None, track_clock=True):
+        stamp = doc.get(source.clock_field) if doc else None
+        clock = stamp if track_clock else None
+        key = (source.name, doc_id)
+        with self._changed:
+            # Overlapping polls see the same versions again; only new ones count as changes
+            if stamp is not None and self._recent.get(key) == stamp:
+                return
+            self._recent.set(key, stamp)
+            # Later changes replace earlier ones: only the newest state is embedded
+            self._pending[key] = (doc, clock, token)
+            self._touch()
+
+    def _touch(self):
+        now = time.monotonic()
+        if not self._first_change:
+            self._first_change = now
+        self._last_change = now
+        self._changed.notify_all()
+
+    def _index_loop(self):
+        while not self._stopping.is_set():
+            with self._changed:
+                while not self._pending and not self._stopping.is_set():
+                    self._changed.wait()
+                # Gather until quiet, the oldest change is due, or the batch is full
+                while not self._stopping.is_set() and len(self._pending) < self.batch_size:
+                    now = time.monotonic()
+                    due = min(self._last_change + self.debounce, self._first_change + self.max_delay)
+                    if now >= due:
+                        break
+                    self._changed.wait(due - now)
+            try:
+                self._drain()
+            except Exception:
+                log.exception("Embedding sync batch failed; retrying")
+                self._stopping.wait(self.poll_interval)
+
+    def _drain(self):
+        """Index everything pending in batches; failed batches go back on the queue"""
+        with self._changed:
+            pending, self._pending = self._pending, {}
+            self._first_change = self._last_change = 0.0
+        items = list(pending.items())
+        embedded = 0
+        indexed = []
+        # Indexes that support it write their metadata once per drain; sync
+        # state is only saved for batches whose vectors are on disk by then
+        bulk = getattr(self.index, 'bulk', None)
+        try:
+            try:
+                with bulk() if bulk else nullcontext():
+                    for start in range(0, len(items), self.batch_size):
+                        batch = items[start:start + self.batch_size]
+                        indexed.append((batch, self._process(batch)))
+            finally:
+                for batch, commit in indexed:
+                    embedded += commit()
+                    for key, _ in batch:
+                        pending.pop(key)
+        finally:
+            if pending:
+                with self._changed:
+                    # Keep newer changes that arrived meanwhile
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                    self._touch()
+        return embedded
+
+    def _process(self, batch):
+        """Embed and upsert one batch of changes.
+
+        Returns a callable that records them and advances the source cursors
+        (returning the number embedded), to call once the index has them.
+        """
+        upserts, deletes, cursors = {}, [], {}
+        for (source_name, doc_id), (doc, clock, token) in batch:
+            if source_name == 'watermark':
+                # End-of-backfill marker: doc_id names the source, clock is when the backfill began
+                source_name, doc_id = doc_id, None
+            cursor = cursors.setdefault(source_name, {})
+            if clock is not None and (cursor.get('watermark') is None or clock > cursor['watermark']):
+                cursor['watermark'] = clock
+            if token is not None:
+                cursor['resume_token'] = token
+            if doc_id is None:
+                continue
+            vector_id = f"{source_name}:{doc_id}"
+            title, text, scope = SYNC_SOURCES[source_name].document(doc) if doc else (None, None, {})
+            if not text:
+                deletes.append(vector_id)
+                continue
+            metadata = {'source': source_name, 'ref_id': str(doc_id), 'title': title, 'text': text[:METADATA_TEXT_CHARS]}
+            metadata.update(scope)
+            # Scope is part of the hash, so a document moved to another client is re-indexed
+            digest = hashlib.sha256(f"{title}\n{text}\n{sorted(scope.items())}".encode('utf-8')).hexdigest()
+            upserts[vector_id] = (text, metadata, digest)
+
+        known = MongoEmbeddingSyncState.get_hashes(self.namespace, list(upserts) + deletes)
+        changed = {vector_id: item for vector_id, item in upserts.items() if known.get(vector_id) != item[2]}
+        deletes = [vector_id for vector_id in deletes if vector_id in known]
+
+        if changed:
+            ids = list(changed)
+            vectors = self.embedder.get_embeddings([changed[vector_id][0] for vector_id in ids])
+            self.index.upsert([(vector_id, vector, changed[vector_id][1]) for vector_id, vector in zip(ids, vectors)])
+        if deletes:
+            self.index.delete(deletes)
+
+        def commit():
+            if changed:
+                MongoEmbeddingSyncState.save_hashes(self.namespace, {vector_id: item[2] for vector_id, item in changed.items()})
+            if deletes:
+                MongoEmbeddingSyncState.forget(self.namespace, deletes)
+            for source_name, cursor in cursors.items():
+                MongoEmbeddingSyncState.save_cursor(self.namespace, source_name, **cursor)
+            if changed or deletes:
+                log.info("Embedded %d documents, removed %d (%d unchanged skipped)",
+                         len(changed), len(deletes), len(upserts) - len(changed))
+                if self.on_indexed:
+                    try:
+                        self.on_indexed(len(changed) + len(deletes))
+                    except Exception:
+                        log.exception("on_indexed callback failed")
+            return len(changed)
+        return commit
+
+
+def build(sources=None):
+    """EmbeddingSync over retrieval_service's index and embedder, configured from the environment"""
+    service = retrieval_service.get_service()
+    return EmbeddingSync(
+        service.index,
+        service.embedder,
+        index_namespace(),
+        sources=sources,
+        # Fresh documents should show up in answers now, not after RAG_CONTEXT_TTL
+        on_indexed=lambda count: service.contexts.clear(),
+        debounce=int(os.getenv('EMBEDDING_SYNC_DEBOUNCE_MS', '1000')) / 1000,
+        max_delay=int(os.getenv('EMBEDDING_SYNC_MAX_DELAY_MS', '5000')) / 1000,
+        batch_size=int(os.getenv('EMBEDDING_SYNC_BATCH', '100')),
+        poll_interval=float(os.getenv('EMBEDDING_SYNC_POLL_INTERVAL', '2')),
+    )
+
+
+def from_env():
+    """Started EmbeddingSync if EMBEDDING_SYNC is enabled, else None"""
+    if os.getenv('EMBEDDING_SYNC', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    return build().start()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='catch up by polling, then exit')
+    parser.add_argument('--reset', action='store_true', help='forget sync progress and re-embed everything')
+    parser.add_argument('--sources', help=f"comma-separated subset of {', '.join(SYNC_SOURCES)}")
+    args = parser.parse_args(argv)
+
+    sources = args.sources.split(',') if args.sources else None
+    unknown = [name for name in sources or [] if name not in SYNC_SOURCES]
+    if unknown:
+        parser.error(f"unknown sources: {', '.join(unknown)}")
+
+    load_dotenv()
+    configure_logging()
+    if not mongo.connect(os.getenv('MONGODB_URI')):
+        return 2
+    if args.reset:
+        removed = MongoEmbeddingSyncState.reset(index_namespace())
+        print(f"Cleared {removed} sync state records for {index_namespace()}")
+
+    sync = build(sources)
+    if args.once:
+        print(f"Embedded {sync.run_once()} documents")
+        return 0
+    sync.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sync.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
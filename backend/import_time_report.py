@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the app (what a serverless cold start pays for)
+
+Usage:
+    python import_time_report.py [--module app] [--top 15] [--budget-ms 600]
+                                 [--baseline report.json] [--json]
+
+Imports MODULE in a fresh interpreter under `python -X importtime` and
+digests the trace: the total, the slowest top-level packages (all their
+submodules included) and the slowest individual modules. With
+--baseline, packages are compared against a report saved earlier with
+--json; with --budget-ms, the exit status is 1 when the total exceeds the
+budget, so CI can catch startup regressions.
+
+No services are contacted: the app connects to MongoDB and the AI APIs on
+first use, and placeholder settings are supplied where it requires them.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import namedtuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# "import time: self [us] | cumulative | imported package"
+TRACE_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+ImportTiming = namedtuple('ImportTiming', 'module self_us cumulative_us depth')
+
+# Settings app.py refuses to start without; never used to connect
+PLACEHOLDER_ENV = {
+    'MONGODB_URI': 'mongodb://localhost:27017/import_time_report',
+}
+
+
+def profile(module):
+    """ImportTiming for every module imported by `import <module>`, in trace order"""
+    env = dict(os.environ)
+    for key, value in PLACEHOLDER_ENV.items():
+        env.setdefault(key, value)
+    env.pop('PYTHONIMPORTTIME', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    timings = []
+    errors = []
+    for line in result.stderr.splitlines():
+        match = TRACE_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # The trace indents nested imports by two spaces per level
+            timings.append(ImportTiming(name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+        elif not line.startswith('import time:'):
+            errors.append(line)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n" + '\n'.join(errors[-20:]))
+    return timings
+
+
+def digest(timings, top=15):
+    """{'total_ms', 'modules', 'packages' (all, slowest first), 'slowest' (`top` modules)} of a trace"""
+    # Top-level entries are what the importing statement waited for
+    roots = [timing for timing in timings if timing.depth == 0]
+    # Self times add up without double counting, whoever imported the package first
+    packages = {}
+    for timing in timings:
+        package = timing.module.split('.')[0]
+        packages[package] = packages.get(package, 0) + timing.self_us
+    slowest = sorted(timings, key=lambda timing: timing.self_us, reverse=True)[:top]
+    return {
+        'total_ms': round(sum(timing.cumulative_us for timing in roots) / 1000, 1),
+        'modules': len(timings),
+        'packages': {
+            package: round(us / 1000, 1)
+            for package, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        },
+        'slowest': [
+            {'module': timing.module, 'self_ms': round(timing.self_us / 1000, 1)} for timing in slowest
+        ],
+    }
+
+
+def print_report(module, report, baseline=None, top=15):
+    print(f"import {module}: {report['total_ms']:.1f} ms, {report['modules']} modules")
+    if baseline:
+        delta = report['total_ms'] - baseline['total_ms']
+        print(f"  baseline {baseline['total_ms']:.1f} ms ({delta:+.1f} ms)")
+    print("\nSlowest packages (ms, submodules included):")
+    for package, ms in list(report['packages'].items())[:top]:
+        line = f"  {ms:9.1f}  {package}"
+        if baseline:
+            before = baseline['packages'].get(package)
+            line += f"  ({ms - before:+.1f})" if before is not None else "  (new)"
+        print(line)
+    print("\nSlowest modules (self ms):")
+    for entry in report['slowest']:
+        print(f"  {entry['self_ms']:9.1f}  {entry['module']}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app', help='module to import (default: app)')
+    parser.add_argument('--top', type=int, default=15, help='rows per table')
+    parser.add_argument('--budget-ms', type=float, help='exit with status 1 if the import takes longer')
+    parser.add_argument('--baseline', help='report saved with --json to compare against')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    try:
+        report = digest(profile(args.module), top=args.top)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(args.module, report, baseline, top=args.top)
+
+    if args.budget_ms is not None and report['total_ms'] > args.budget_ms:
+        print(f"\nOver budget: {report['total_ms']:.1f} ms > {args.budget_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Index coverage report for the queries issued by mongo_db.py
+
+Runs explain() on a representative instance of every model query and flags
+any whose winning plan falls back to a collection scan (COLLSCAN).
+
+Usage:
+    python index_report.py
+
+Declared indexes are applied by MongoDB.connect before the report runs.
+
+Exits with status 1 when at least one query is a COLLSCAN, so it can gate CI.
+"""
+import os
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from app_logging import configure_logging
+from mongo_db import (
+    mongo, MongoUser, MongoChannel, MongoMessage, MongoMeeting,
+    MongoContentCalendar, MongoChatConversation, MongoChatMessageBucket
+)
+
+SAMPLE_ID = str(ObjectId())
+
+# (label, model, filter, sort) - keep in step with the query shapes in mongo_db.py
+MODEL_QUERIES = [
+    ('MongoUser.find_by_email', MongoUser,
+     {'email': 'admin@example.com'}, None),
+    ('MongoChannel.find_by_user', MongoChannel,
+     {'member_ids': SAMPLE_ID}, None),
+    ('MongoChannel.find_by_members', MongoChannel,
+     {'name': 'dm', 'is_dm': True, 'member_ids': [SAMPLE_ID]}, None),
+    ('MongoMessage.find_by_channel', MongoMessage,
+     {'channel_id': SAMPLE_ID}, [('created_at', 1)]),
+    ('MongoMessage.find_page', MongoMessage,
+     {'channel_id': SAMPLE_ID, '$or': [
+         {'created_at': {'$lt': datetime.utcnow()}},
+         {'created_at': datetime.utcnow(), '_id': {'$lt': ObjectId()}}
+     ]}, [('created_at', -1), ('_id', -1)]),
+    ('MongoMeeting.find_by_user', MongoMeeting,
+     {'$or': [
+         {'organizer_id': SAMPLE_ID},
+         {'invitee_ids': {'$in': [SAMPLE_ID]}},
+         {'participants': {'$in': [SAMPLE_ID]}}
+     ]}, None),
+    ('MongoContentCalendar.find_by_client', MongoContentCalendar,
+     {'client_id': SAMPLE_ID}, None),
+    ('MongoChatConversation.get_user_conversations', MongoChatConversation,
+     {'user_id': SAMPLE_ID}, [('updated_at', -1)]),
+    ('MongoChatMessageBucket.find_range', MongoChatMessageBucket,
+     {'conversation_id': ObjectId(SAMPLE_ID), 'bucket': {'$gte': 0, '$lte': 1}}, [('bucket', 1)]),
+]
+
+
+def plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+def explain_query(model, query, sort):
+    collection = mongo.get_collection(model.COLLECTION)
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explanation = cursor.explain()
+    winning_plan = explanation.get('queryPlanner', {}).get('winningPlan', {})
+    return list(plan_stages(winning_plan))
+
+
+def main(argv):
+    load_dotenv()
+    configure_logging()
+    if not mongo.connect(os.getenv('MONGODB_URI')):
+        return 2
+
+    collscans = 0
+    for label, model, query, sort in MODEL_QUERIES:
+        stages = explain_query(model, query, sort)
+        flag = 'COLLSCAN' if 'COLLSCAN' in stages else 'ok'
+        if flag == 'COLLSCAN':
+            collscans += 1
+        print(f"{flag:<9} {label:<48} {' <- '.join(stages)}")
+
+    print(f"\n{len(MODEL_QUERIES)} queries checked, {collscans} collection scan(s)")
+    return 1 if collscans else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
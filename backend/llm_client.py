@@ -0,0 +1,237 @@
+"""
+Shared OpenAI client and admission control for LLM calls
+
+Every route that talks to OpenAI goes through chat_completion() or
+stream_chat_completion() (or takes a slot with llm_slot() and calls
+get_client() itself), so the process keeps one pooled HTTP client and at
+most LLM_MAX_CONCURRENCY completions in flight.
+A request that cannot get a slot within LLM_QUEUE_TIMEOUT seconds fails fast
+with LLMBusy, which routes turn into 503 + Retry-After, instead of parking yet
+another worker thread behind a 30-second completion.
+
+    OPENAI_API_KEY
+    LLM_MAX_CONCURRENCY=8      # completions in flight per process
+    LLM_QUEUE_TIMEOUT=2        # seconds to wait for a free slot
+    OPENAI_TIMEOUT=60          # seconds per attempt (connect timeout is 5)
+    OPENAI_MAX_RETRIES=2       # retries on connection errors, 429 and 5xx
+"""
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+from app_logging import get_logger
+
+log = get_logger('llm')
+
+MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '2'))
+REQUEST_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+CONNECT_TIMEOUT = 5.0
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+class LLMUnavailable(Exception):
+    """OpenAI is not configured in this process"""
+
+
+class LLMBusy(Exception):
+    """Every LLM slot is taken; the caller should retry later"""
+
+    retry_after = 5
+
+
+_client = None
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """The tiktoken encoding of the chat and embedding models (cl100k_base), or None.
+
+    None only when tiktoken is not installed or its vocabulary cannot be
+    loaded (it is downloaded once, then cached); that is logged once.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    # Imported here: loading the vocabulary takes a while
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding('cl100k_base')
+                except Exception as e:
+                    _encoding_failed = True
+                    log.warning("tiktoken unavailable (%s); estimating tokens as characters / 4, "
+                                "which undercounts code and CJK text", e)
+    return _encoding
+
+
+def estimate_tokens(text):
+    """Token count of `text` for the chat and embedding models.
+
+    Exact with tiktoken (a requirement); ~4 characters a token if it is unavailable.
+    """
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text, max_tokens):
+    """The longest start of `text` that is at most `max_tokens` tokens.
+
+    Cut on encoded tokens; without tiktoken, on UTF-8 bytes, since no token
+    is shorter than one byte.
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    data = text.encode('utf-8')
+    return text if len(data) <= max_tokens else data[:max_tokens].decode('utf-8', errors='ignore')
+
+
+def get_client():
+    """The process-wide OpenAI client, built on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv('OPENAI_API_KEY')
+                if not api_key:
+                    raise LLMUnavailable("OPENAI_API_KEY environment variable not set")
+                # Imported here: the SDK is about half of the app's import time
+                import httpx
+                from openai import OpenAI
+                # Keep-alive connections are reused across requests; the pool is
+                # sized to the slot count so nothing queues inside httpx
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONCURRENCY * 2,
+                        max_keepalive_connections=MAX_CONCURRENCY,
+                    ),
+                    timeout=_timeout(REQUEST_TIMEOUT),
+                )
+                _client = OpenAI(
+                    api_key=api_key,
+                    http_client=http_client,
+                    timeout=_timeout(REQUEST_TIMEOUT),
+                    max_retries=MAX_RETRIES,
+                )
+                log.info("OpenAI client ready (concurrency=%d, timeout=%ss, retries=%d)",
+                         MAX_CONCURRENCY, REQUEST_TIMEOUT, MAX_RETRIES)
+    return _client
+
+
+def _timeout(seconds):
+    import httpx
+    return httpx.Timeout(seconds, connect=CONNECT_TIMEOUT)
+
+
+def _acquire_slot(wait=None):
+    if not _slots.acquire(timeout=QUEUE_TIMEOUT if wait is None else wait):
+        log.warning("LLM slots exhausted (%d in flight), rejecting request", MAX_CONCURRENCY)
+        raise LLMBusy("Too many AI requests in progress")
+
+
+@contextmanager
+def llm_slot(wait=None):
+    """Hold one of the LLM_MAX_CONCURRENCY slots, or raise LLMBusy"""
+    _acquire_slot(wait)
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+def chat_completion(messages, model, timeout=None, **kwargs):
+    """Run one chat completion inside a slot and return the response"""
+    if timeout is not None:
+        # Passing timeout=None to the SDK would disable the client default
+        kwargs['timeout'] = _timeout(timeout)
+    with llm_slot():
+        return get_client().chat.completions.create(model=model, messages=messages, **kwargs)
+
+
+def embed(texts, model=EMBEDDING_MODEL, timeout=None, **kwargs):
+    """Embedding vectors for `texts`, in input order, from one request inside a slot"""
+    if timeout is not None:
+        kwargs['timeout'] = _timeout(timeout)
+    with llm_slot():
+        response = get_client().embeddings.create(model=model, input=list(texts), **kwargs)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class CompletionStream:
+    """Text deltas of a streamed completion that holds an LLM slot until closed.
+
+    Iterating yields each non-empty content delta; close() (called on
+    exhaustion, or by the caller when the client goes away) ends the HTTP
+    stream and frees the slot. Safe to close more than once.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self._stream.response.close()
+        finally:
+            _slots.release()
+
+
+def stream_chat_completion(messages, model, timeout=None, **kwargs):
+    """Start a streamed chat completion and return a CompletionStream.
+
+    The slot is taken and the request sent before this returns, so LLMBusy
+    and connection errors surface here, while the route can still answer
+    with a plain error status.
+    """
+    if timeout is not None:
+        kwargs['timeout'] = _timeout(timeout)
+    _acquire_slot()
+    try:
+        stream = get_client().chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    except BaseException:
+        _slots.release()
+        raise
+    return CompletionStream(stream)
+
+
+def error_response(e):
+    """(body, status, headers) for failures a route should pass on, else None"""
+    # Without the SDK loaded, e cannot be one of its errors
+    openai = sys.modules.get('openai')
+    if isinstance(e, LLMBusy):
+        return {'error': str(e)}, 503, {'Retry-After': str(e.retry_after)}
+    if isinstance(e, LLMUnavailable):
+        return {'error': 'AI service is not configured'}, 503, {}
+    if openai is not None and isinstance(e, openai.APITimeoutError):
+        return {'error': 'AI service timed out'}, 504, {}
+    if openai is not None and isinstance(e, openai.RateLimitError):
+        return {'error': 'AI service is rate limited, try again shortly'}, 503, {'Retry-After': '10'}
+    return None
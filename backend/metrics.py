@@ -0,0 +1,201 @@
+"""
+Request and MongoDB command metrics, exposed at /metrics in Prometheus text format
+
+    init_app(app)                 # per-route latency and Mongo-commands-per-request
+                                  # histograms, plus the /metrics route
+    install_mongo_listener()      # per-collection command counts and durations;
+                                  # must run before the MongoClient is created
+
+Metrics are kept per process; with several workers, scrape each one.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+from pymongo import monitoring
+
+# Seconds; Prometheus convention is cumulative `le` buckets plus +Inf
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+# Mongo commands issued by the request running on this thread (pymongo is synchronous)
+_request_state = threading.local()
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    ]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for label_values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, label_values, ("le", le))} {cumulative}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Flask request latency by route',
+    labels=('method', 'route', 'status')
+)
+http_request_mongo_commands = Histogram(
+    'http_request_mongo_commands', 'MongoDB commands issued per request; N+1 patterns show up here',
+    labels=('method', 'route'), buckets=COUNT_BUCKETS
+)
+mongo_command_duration = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency by collection',
+    labels=('collection', 'command')
+)
+mongo_command_failures = Counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands by collection',
+    labels=('collection', 'command')
+)
+ai_response_cache_lookups = Counter(
+    'ai_response_cache_lookups_total', 'AI response cache lookups by result (memory, mongo, similar, miss)',
+    labels=('namespace', 'result')
+)
+
+REGISTRY = [
+    http_request_duration, http_request_mongo_commands, mongo_command_duration, mongo_command_failures,
+    ai_response_cache_lookups,
+]
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records every command's duration, labelled by collection and command name"""
+
+    # Connection housekeeping that would only add noise
+    IGNORED_COMMANDS = {'ping', 'hello', 'ismaster', 'isMaster', 'endSessions', 'saslStart', 'saslContinue'}
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in self.IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore carries the cursor id there and names the collection separately
+            target = event.command.get('collection', '')
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = target or '-'
+        if getattr(_request_state, 'mongo_commands', None) is not None:
+            _request_state.mongo_commands += 1
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        if collection is not None:
+            mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        if collection is not None:
+            mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+            mongo_command_failures.inc(collection, event.command_name)
+
+
+_mongo_listener = None
+
+
+def install_mongo_listener():
+    """Register the command listener for every MongoClient created afterwards"""
+    global _mongo_listener
+    if _mongo_listener is None:
+        _mongo_listener = MongoCommandMetrics()
+        monitoring.register(_mongo_listener)
+    return _mongo_listener
+
+
+def init_app(app):
+    """Time every request and serve the registry at /metrics"""
+
+    @app.before_request
+    def _start_timer():
+        g.request_started_at = time.perf_counter()
+        _request_state.mongo_commands = 0
+
+    @app.after_request
+    def _record_request(response):
+        started_at = g.pop('request_started_at', None)
+        if started_at is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_request_duration.observe(
+                time.perf_counter() - started_at, request.method, route, str(response.status_code)
+            )
+            http_request_mongo_commands.observe(_request_state.mongo_commands, request.method, route)
+        _request_state.mongo_commands = None
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Move AI chat messages from the embedded chat_conversations.messages array
+into chat_message_buckets
+
+Usage:
+    python migrate_chat_buckets.py [--dry-run]
+
+Conversations are also migrated one by one the first time they are opened
+or written to, so running this is optional; it is idempotent and safe to
+run while the app is serving traffic.
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from app_logging import configure_logging
+from mongo_db import mongo, MongoChatConversation
+
+
+def main(argv):
+    load_dotenv()
+    configure_logging()
+    dry_run = '--dry-run' in argv
+    if not mongo.connect(os.getenv('MONGODB_URI')):
+        return 2
+
+    collection = mongo.get_collection('chat_conversations')
+    pending = collection.count_documents({'messages': {'$exists': True}})
+    print(f"{pending} conversation(s) still store their messages inline")
+    if dry_run or not pending:
+        return 0
+
+    migrated = messages = failed = 0
+    for conversation in collection.find({'messages': {'$exists': True}}):
+        try:
+            if MongoChatConversation.migrate_document(conversation):
+                migrated += 1
+                messages += len(conversation.get('messages') or [])
+        except Exception as e:
+            failed += 1
+            print(f"Failed to migrate conversation {conversation['_id']}: {e}")
+
+    print(f"Migrated {migrated} conversation(s), {messages} message(s); {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -175,10 +175,10 @@ def main():
     if not pg_conn:
         print("No PostgreSQL connection. Creating sample data in MongoDB only.")
         # Just ensure sample data in MongoDB
-        from mongo_db import mongo, MongoUser, MongoClientModel
+        from mongo_db import mongo
+        from seed import seed
         mongo.connect()
-        MongoUser.ensure_sample_users()
-        MongoClientModel.create_sample_data()
+        seed()
         print("Sample data created in MongoDB.")
         return
     
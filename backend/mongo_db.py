@@ -2,18 +2,45 @@
 MongoDB connection and utilities for The Genius Project
 """
 import os
-from pymongo import MongoClient
+import threading
+from pymongo import MongoClient, IndexModel, UpdateOne, ReturnDocument, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 from bson import ObjectId
-from datetime import datetime
-import bcrypt
+from datetime import datetime, timedelta
+from app_logging import get_logger
+from cache_utils import TTLCache
+import password_hashing
+
+mongo_log = get_logger('mongo')
+meetings_log = get_logger('meetings')
 
 class MongoDB:
     def __init__(self):
         self.client = None
         self.db = None
-        
+        self.uri = None
+        self._connect_lock = threading.Lock()
+
+    def configure(self, uri):
+        """Use `uri` for the lazy connection that get_collection opens on first use.
+
+        Nothing touches the network here, so importing the app stays cheap
+        (serverless cold starts); the client is created by the first query.
+        """
+        self.uri = uri
+
+    def _open(self, uri):
+        self.client = MongoClient(uri)
+        # Extract database name from URI or use default
+        if '/' in uri and '/' in uri.split('/')[-1] and uri.split('/')[-1].split('?')[0]:
+            db_name = uri.split('/')[-1].split('?')[0]
+        else:
+            db_name = 'genius_db'
+        self.db = self.client[db_name]
+        return db_name
+
     def connect(self, uri=None):
-        """Connect to MongoDB"""
+        """Connect to MongoDB now, verifying the connection and indexes (scripts, CLIs)"""
         if not uri:
             uri = os.getenv('MONGODB_URI')
         
@@ -21,26 +48,64 @@ class MongoDB:
             raise ValueError("MongoDB URI not provided")
             
         try:
-            self.client = MongoClient(uri)
-            # Extract database name from URI or use default
-            if '/' in uri and '/' in uri.split('/')[-1] and uri.split('/')[-1].split('?')[0]:
-                db_name = uri.split('/')[-1].split('?')[0]
-            else:
-                db_name = 'genius_db'
-            self.db = self.client[db_name]
-            
+            db_name = self._open(uri)
             # Test connection
             self.client.admin.command('ping')
-            print(f"[MongoDB] Connected successfully to {db_name}")
+            mongo_log.info("Connected successfully to %s", db_name)
+            self.ensure_indexes()
             return True
         except Exception as e:
-            print(f"[MongoDB] Connection failed: {e}")
+            mongo_log.error("Connection failed: %s", e)
             return False
+
+    def _connect_lazily(self):
+        with self._connect_lock:
+            if self.db is not None:
+                return
+            uri = self.uri or os.getenv('MONGODB_URI')
+            if not uri:
+                raise RuntimeError("Not connected to MongoDB")
+            # MongoClient connects in the background; the first query waits for it
+            db_name = self._open(uri)
+            mongo_log.info("Using MongoDB database %s", db_name)
+        # Index builds are idempotent and need not delay the request that got here first
+        threading.Thread(target=self._ensure_indexes_quietly, name='mongo-ensure-indexes', daemon=True).start()
+
+    def _ensure_indexes_quietly(self):
+        try:
+            self.ensure_indexes()
+        except Exception as e:
+            mongo_log.error("Ensuring indexes failed: %s", e)
     
+    def ensure_indexes(self):
+        """Create the indexes declared on every model in INDEXED_MODELS.
+
+        create_indexes is a no-op for indexes that already exist with the same
+        spec, so this is safe to run on every connect. An index whose declared
+        keys or options changed is dropped by name and rebuilt.
+        """
+        for model in INDEXED_MODELS:
+            collection = self.get_collection(model.COLLECTION)
+            for index in model.INDEXES:
+                name = index.document['name']
+                try:
+                    collection.create_indexes([index])
+                except OperationFailure as e:
+                    # 85 = IndexOptionsConflict, 86 = IndexKeySpecsConflict
+                    if e.code in (85, 86):
+                        try:
+                            collection.drop_index(name)
+                            collection.create_indexes([index])
+                            mongo_log.info("Rebuilt changed index %s.%s", model.COLLECTION, name)
+                            continue
+                        except OperationFailure as rebuild_error:
+                            e = rebuild_error
+                    mongo_log.error("Failed to create index %s.%s: %s", model.COLLECTION, name, e)
+
     def get_collection(self, name):
-        """Get a collection"""
+        """Get a collection, connecting on first use"""
         if self.db is None:
-            raise RuntimeError("Not connected to MongoDB")
+            self._connect_lazily()
         return self.db[name]
     
     def close(self):
@@ -53,6 +118,13 @@ mongo = MongoDB()
 
 class MongoUser:
     """MongoDB User model"""
+    COLLECTION = 'users'
+    INDEXES = [
+        IndexModel([('email', ASCENDING)], unique=True, name='email_unique'),
+    ]
+    # Fields returned by find_profiles, e.g. for chat member lists
+    PROFILE_FIELDS = {'name': 1, 'email': 1, 'user_type': 1, 'department': 1}
+    PROFILE_CACHE = TTLCache(maxsize=5000, ttl=60)
     
     @staticmethod
     def create_user(name, email, password, role='user', is_admin=False):
@@ -61,8 +133,8 @@ class MongoUser:
         # Check if user exists
         if collection.find_one({'email': email}):
             raise ValueError(f"User with email {email} already exists")
-        # Hash password (store as bytes, not string)
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        # Hash password (store as bytes, not string); runs in the hashing pool
+        password_hash = password_hashing.hash_password(password)
         user_doc = {
             'name': name,
             'email': email,
@@ -75,7 +147,11 @@ class MongoUser:
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
-        result = collection.insert_one(user_doc)
+        try:
+            result = collection.insert_one(user_doc)
+        except DuplicateKeyError:
+            # Lost a race with a concurrent signup; the email_unique index rejected it
+            raise ValueError(f"User with email {email} already exists")
         user_doc['_id'] = result.inserted_id
         return user_doc
 
@@ -85,38 +161,110 @@ class MongoUser:
         collection = mongo.get_collection('users')
         return collection.find_one({'email': email})
     
+    @staticmethod
+    def find_by_id(user_id):
+        """Find user by id; None for unknown or malformed ids"""
+        if not ObjectId.is_valid(str(user_id)):
+            return None
+        collection = mongo.get_collection('users')
+        return collection.find_one({'_id': ObjectId(str(user_id))})
+
     @staticmethod
     def find_all():
         """Get all users"""
         collection = mongo.get_collection('users')
         return list(collection.find({}))
+
+    @staticmethod
+    def find_profiles(user_ids):
+        """Resolve user ids to PROFILE_FIELDS documents, in input order.
+
+        Served from the per-process PROFILE_CACHE where possible; the misses are
+        fetched with a single $in query. Unknown or malformed ids are skipped.
+        """
+        user_ids = [str(uid) for uid in user_ids]
+        profiles = MongoUser.PROFILE_CACHE.get_many(user_ids)
+        missing = [uid for uid in user_ids if uid not in profiles and ObjectId.is_valid(uid)]
+        if missing:
+            collection = mongo.get_collection('users')
+            for user in collection.find(
+                {'_id': {'$in': [ObjectId(uid) for uid in missing]}},
+                MongoUser.PROFILE_FIELDS
+            ):
+                uid = str(user['_id'])
+                MongoUser.PROFILE_CACHE.set(uid, user)
+                profiles[uid] = user
+        return [profiles[uid] for uid in user_ids if uid in profiles]
+
+    @staticmethod
+    def invalidate_profile(user_id):
+        """Drop a user's cached profile after it changes in this process"""
+        MongoUser.PROFILE_CACHE.pop(str(user_id))
     
     @staticmethod
     def verify_password(user_doc, password):
-        """Verify user password"""
+        """Verify user password.
+
+        A correct password whose hash predates the current BCRYPT_ROUNDS is
+        rehashed in the background, so raising the cost needs no resets.
+        Raises password_hashing.PasswordHashBusy when the pool is saturated.
+        """
         if not user_doc or not user_doc.get('password_hash'):
             return False
         hash_val = user_doc['password_hash']
-        if isinstance(hash_val, str):
-            hash_val = hash_val.encode('utf-8')
-        return bcrypt.checkpw(password.encode('utf-8'), hash_val)
+        if not password_hashing.verify_password(password, hash_val):
+            return False
+        if password_hashing.needs_rehash(hash_val):
+            password_hashing.rehash_async(
+                password,
+                lambda new_hash: MongoUser.replace_password_hash(user_doc['_id'], hash_val, new_hash)
+            )
+        return True
 
     @staticmethod
-    def ensure_sample_users():
-        """Force recreate a default admin and test user for login"""
-        try:
-            collection = mongo.get_collection('users')
-            # Always delete and recreate to ensure login works
-            collection.delete_many({'email': {'$in': ['admin@example.com', 'testuser@example.com']}})
-            print("[MongoDB] Creating sample users...")
-            MongoUser.create_user('Admin', 'admin@example.com', 'admin123', role='admin', is_admin=True)
-            MongoUser.create_user('Test User', 'testuser@example.com', 'testpass', role='user', is_admin=False)
-            print("[MongoDB] Sample users created: admin@example.com / admin123, testuser@example.com / testpass")
-        except Exception as e:
-            print(f"[MongoDB] Error creating sample users: {e}")
+    def replace_password_hash(user_id, old_hash, new_hash):
+        """Swap in `new_hash` unless the password changed since `old_hash` was read"""
+        collection = mongo.get_collection('users')
+        result = collection.update_one(
+            {'_id': user_id, 'password_hash': old_hash},
+            {'$set': {'password_hash': new_hash, 'updated_at': datetime.utcnow()}}
+        )
+        if result.modified_count:
+            mongo_log.info("Upgraded password hash for user %s to %d rounds",
+                           user_id, password_hashing.hash_rounds(new_hash))
+        return result.modified_count == 1
+
+    @staticmethod
+    def ensure_user(name, email, password, role='user', is_admin=False, reset_password=False):
+        """Create the user if `email` is unknown; returns (user_doc, created).
+
+        Idempotent: an existing user is left as is, and its password is only
+        re-hashed with reset_password=True.
+        """
+        collection = mongo.get_collection('users')
+        existing = collection.find_one({'email': email})
+        if existing is None:
+            try:
+                return MongoUser.create_user(name, email, password, role=role, is_admin=is_admin), True
+            except ValueError:
+                # Created concurrently (e.g. two seed runs); fall through to the existing user
+                existing = collection.find_one({'email': email})
+        if reset_password:
+            password_hash = password_hashing.hash_password(password)
+            collection.update_one(
+                {'_id': existing['_id']},
+                {'$set': {'password_hash': password_hash, 'updated_at': datetime.utcnow()}}
+            )
+            existing['password_hash'] = password_hash
+        return existing, False
 
 class MongoClientModel:
     """MongoDB Client model"""
+    COLLECTION = 'clients'
+    INDEXES = [
+        # Change feed for embedding_sync's polling mode
+        IndexModel([('updated_at', ASCENDING), ('_id', ASCENDING)], name='updated_at'),
+    ]
     
     @staticmethod
     def find_all():
@@ -125,60 +273,22 @@ class MongoClientModel:
         return list(collection.find({}))
     
     @staticmethod
-    def create_sample_data():
-        """Create sample clients if none exist"""
-        try:
-            collection = mongo.get_collection('clients')
-            
-            if collection.count_documents({}) == 0:
-                sample_clients = [
-                    {
-                        'name': 'Action Labs',
-                        'email': 'contact@action-labs.ai',
-                        'phone': '+1-555-0123',
-                        'website': 'https://action-labs.ai',
-                        'industry': 'Technology',
-                        'contact': None,
-                        'description': 'AI-powered development agency',
-                        'status': 'active',
-                        'created_at': datetime.utcnow(),
-                        'updated_at': datetime.utcnow()
-                    },
-                    {
-                        'name': 'Sample Client',
-                        'email': 'client@example.com',
-                        'phone': '+1-555-0456',
-                        'website': 'https://example.com',
-                        'industry': 'Business',
-                        'contact': None,
-                        'description': 'Sample client for testing',
-                        'status': 'active',
-                        'created_at': datetime.utcnow(),
-                        'updated_at': datetime.utcnow()
-                    }
-                ]
-                collection.insert_many(sample_clients)
-                print("[MongoDB] Created sample client data")
-        except Exception as e:
-            print(f"[MongoDB] Error creating sample client data: {e}")
-
-    @staticmethod
-    def ensure_sample_users():
-        """Force recreate a default admin and test user for login"""
-        try:
-            collection = mongo.get_collection('users')
-            # Always delete and recreate to ensure login works
-            collection.delete_many({'email': {'$in': ['admin@example.com', 'testuser@example.com']}})
-            print("[MongoDB] Creating sample users...")
-            MongoUser.create_user('Admin', 'admin@example.com', 'admin123', role='admin', is_admin=True)
-            MongoUser.create_user('Test User', 'testuser@example.com', 'testpass', role='user', is_admin=False)
-            print("[MongoDB] Sample users created: admin@example.com / admin123, testuser@example.com / testpass")
-        except Exception as e:
-            print(f"[MongoDB] Error creating sample users: {e}")
+    def ensure_client(client_doc):
+        """Insert `client_doc` unless a client with its name exists; returns True if inserted"""
+        now = datetime.utcnow()
+        collection = mongo.get_collection('clients')
+        result = collection.update_one(
+            {'name': client_doc['name']},
+            {'$setOnInsert': dict(client_doc, created_at=now, updated_at=now)},
+            upsert=True
+        )
+        return result.upserted_id is not None
 
 # Additional MongoDB collections for the application
 class MongoProject:
     """MongoDB Project model"""
+    COLLECTION = 'projects'
+    INDEXES = []
     
     @staticmethod
     def create_project(name, description, client_id=None, user_id=None):
@@ -205,6 +315,8 @@ class MongoProject:
 
 class MongoTask:
     """MongoDB Task model"""
+    COLLECTION = 'tasks'
+    INDEXES = []
     
     @staticmethod
     def create_task(title, description, project_id=None, user_id=None, priority='medium'):
@@ -232,6 +344,12 @@ class MongoTask:
 
 class MongoChannel:
     """MongoDB Channel model"""
+    COLLECTION = 'channels'
+    INDEXES = [
+        # Multikey index: one entry per member, serves find_by_user and find_by_members
+        IndexModel([('member_ids', ASCENDING)], name='member_ids'),
+    ]
+
     @staticmethod
     def create_channel(name, is_dm, member_ids, created_by):
         collection = mongo.get_collection('channels')
@@ -240,6 +358,8 @@ class MongoChannel:
             'is_dm': is_dm,
             'member_ids': member_ids,  # list of user IDs (as strings)
             'created_by': created_by,
+            'last_message_at': None,
+            'last_message_preview': None,
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
@@ -263,12 +383,90 @@ class MongoChannel:
         collection = mongo.get_collection('channels')
         return collection.find_one({'_id': ObjectId(channel_id)})
 
+    @staticmethod
+    def _last_message_update(channel_id, created_at, preview):
+        """UpdateOne that denormalizes a message onto its channel, or None.
+
+        The created_at guard keeps an older message that is written late from
+        overwriting a newer one.
+        """
+        if not ObjectId.is_valid(channel_id):
+            return None
+        return UpdateOne(
+            {
+                '_id': ObjectId(channel_id),
+                '$or': [{'last_message_at': None}, {'last_message_at': {'$lt': created_at}}]
+            },
+            {'$set': {'last_message_at': created_at, 'last_message_preview': preview}}
+        )
+
+    @staticmethod
+    def record_last_message(channel_id, created_at, preview):
+        """Denormalize the newest message onto the channel document"""
+        MongoChannel.record_last_messages([(channel_id, created_at, preview)])
+
+    @staticmethod
+    def record_last_messages(entries):
+        """Batch form of record_last_message for (channel_id, created_at, preview) tuples"""
+        requests = [MongoChannel._last_message_update(*entry) for entry in entries]
+        requests = [r for r in requests if r is not None]
+        if requests:
+            mongo.get_collection('channels').bulk_write(requests, ordered=False)
+
+    @staticmethod
+    def backfill_last_messages(channels):
+        """Fill last_message_* on channels created before they were denormalized.
+
+        One aggregation covers every channel missing the fields; the result is
+        written back so later reads take the fast path.
+        """
+        missing = [str(c['_id']) for c in channels if 'last_message_at' not in c]
+        if not missing:
+            return channels
+        latest = MongoMessage.latest_by_channel(missing)
+        empty = []
+        for channel in channels:
+            channel_id = str(channel['_id'])
+            if channel_id in latest:
+                msg = latest[channel_id]
+                preview = MongoMessage.preview(msg.get('content'))
+                MongoChannel.record_last_message(channel_id, msg['created_at'], preview)
+                channel['last_message_at'] = msg['created_at']
+                channel['last_message_preview'] = preview
+            elif 'last_message_at' not in channel:
+                empty.append(channel['_id'])
+        if empty:
+            # Mark channels with no messages so they are not aggregated again
+            mongo.get_collection('channels').update_many(
+                {'_id': {'$in': empty}, 'last_message_at': {'$exists': False}},
+                {'$set': {'last_message_at': None, 'last_message_preview': None}}
+            )
+        return channels
+
 class MongoMessage:
     """MongoDB Message model"""
+    COLLECTION = 'messages'
+    INDEXES = [
+        # _id breaks created_at ties so find_page can seek on (created_at, _id)
+        IndexModel(
+            [('channel_id', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)],
+            name='channel_created_at'
+        ),
+        # Change feed for embedding_sync's polling mode
+        IndexModel([('created_at', ASCENDING), ('_id', ASCENDING)], name='created_at'),
+    ]
+    EPOCH = datetime(1970, 1, 1)
+    PREVIEW_LENGTH = 100
+
     @staticmethod
-    def create_message(channel_id, user_id, content, parent_message_id=None, name=None):
-        collection = mongo.get_collection('messages')
-        msg_doc = {
+    def build_message(channel_id, user_id, content, parent_message_id=None, name=None):
+        """Message document with its _id assigned up front, ready to insert.
+
+        Generating the ObjectId here lets callers hand out the final id before
+        the write happens (see chat_write_behind).
+        """
+        return {
+            '_id': ObjectId(),
             'channel_id': channel_id,
             'user_id': user_id,
             'content': content,
@@ -276,42 +474,216 @@ class MongoMessage:
             'name': name,
             'created_at': datetime.utcnow()
         }
-        result = collection.insert_one(msg_doc)
-        msg_doc['_id'] = result.inserted_id
+
+    @staticmethod
+    def create_message(channel_id, user_id, content, parent_message_id=None, name=None):
+        collection = mongo.get_collection('messages')
+        msg_doc = MongoMessage.build_message(channel_id, user_id, content, parent_message_id, name)
+        collection.insert_one(msg_doc)
+        MongoChannel.record_last_message(channel_id, msg_doc['created_at'], MongoMessage.preview(content))
         return msg_doc
 
+    @staticmethod
+    def insert_batch(msg_docs):
+        """Group-commit documents from build_message with one insert_many.
+
+        Safe to retry: documents that already made it in are reported as
+        duplicate keys and ignored. Every channel in the batch then gets its
+        newest message denormalized in a single bulk write.
+        """
+        collection = mongo.get_collection('messages')
+        try:
+            collection.insert_many(msg_docs, ordered=False)
+        except BulkWriteError as e:
+            if e.details.get('writeConcernErrors') or any(
+                err.get('code') != 11000 for err in e.details.get('writeErrors', [])
+            ):
+                raise
+        newest = {}
+        for msg in msg_docs:
+            current = newest.get(msg['channel_id'])
+            if current is None or msg['created_at'] >= current['created_at']:
+                newest[msg['channel_id']] = msg
+        MongoChannel.record_last_messages([
+            (channel_id, msg['created_at'], MongoMessage.preview(msg['content']))
+            for channel_id, msg in newest.items()
+        ])
+
+    @staticmethod
+    def preview(content):
+        """Short form of a message body for channel lists"""
+        content = content or ''
+        if len(content) <= MongoMessage.PREVIEW_LENGTH:
+            return content
+        return content[:MongoMessage.PREVIEW_LENGTH - 1] + '…'
+
+    @staticmethod
+    def latest_by_channel(channel_ids):
+        """Newest message of each channel in one aggregation, keyed by channel_id"""
+        collection = mongo.get_collection('messages')
+        pipeline = [
+            {'$match': {'channel_id': {'$in': list(channel_ids)}}},
+            # Reverse walk of the channel_created_at index; $first then needs no extra sort
+            {'$sort': {'channel_id': -1, 'created_at': -1, '_id': -1}},
+            {'$group': {
+                '_id': '$channel_id',
+                'created_at': {'$first': '$created_at'},
+                'content': {'$first': '$content'}
+            }}
+        ]
+        return {doc['_id']: doc for doc in collection.aggregate(pipeline)}
+
+    @staticmethod
+    def find_in_channel(channel_id, message_id):
+        """A channel's message by id; None for unknown or malformed ids"""
+        if not ObjectId.is_valid(str(message_id)):
+            return None
+        collection = mongo.get_collection('messages')
+        return collection.find_one({'_id': ObjectId(str(message_id)), 'channel_id': channel_id})
+
     @staticmethod
     def find_by_channel(channel_id):
         collection = mongo.get_collection('messages')
         return list(collection.find({'channel_id': channel_id}).sort('created_at', 1))
 
+    @staticmethod
+    def encode_cursor(msg_doc):
+        """Opaque page cursor for a message: '<created_at ms>_<ObjectId>'"""
+        millis = (msg_doc['created_at'] - MongoMessage.EPOCH) // timedelta(milliseconds=1)
+        return f"{millis}_{msg_doc['_id']}"
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+        millis, _, oid = cursor.partition('_')
+        if not ObjectId.is_valid(oid):
+            raise ValueError(f"Invalid message cursor: {cursor}")
+        return MongoMessage.EPOCH + timedelta(milliseconds=int(millis)), ObjectId(oid)
+
+    @staticmethod
+    def find_page(channel_id, before=None, after=None, limit=50):
+        """Keyset-paginate a channel's messages on (created_at, _id).
+
+        Returns (messages, has_more) with messages in ascending order. `before`
+        and `after` are cursors from encode_cursor; with neither, the most
+        recent page is returned. has_more reports whether further messages
+        exist beyond the page in the direction being paged.
+        """
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        query = {'channel_id': channel_id}
+        if after:
+            created_at, oid = MongoMessage.decode_cursor(after)
+            query['$or'] = [
+                {'created_at': {'$gt': created_at}},
+                {'created_at': created_at, '_id': {'$gt': oid}}
+            ]
+            direction = ASCENDING
+        else:
+            if before:
+                created_at, oid = MongoMessage.decode_cursor(before)
+                query['$or'] = [
+                    {'created_at': {'$lt': created_at}},
+                    {'created_at': created_at, '_id': {'$lt': oid}}
+                ]
+            direction = DESCENDING
+
+        collection = mongo.get_collection('messages')
+        # Fetch one extra document to learn whether another page exists
+        messages = list(
+            collection.find(query)
+            .sort([('created_at', direction), ('_id', direction)])
+            .limit(limit + 1)
+        )
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if direction == DESCENDING:
+            messages.reverse()
+        return messages, has_more
+
+class MongoChannelRead:
+    """Per-user read cursor for a channel, one small document per (user, channel)"""
+    COLLECTION = 'channel_reads'
+    INDEXES = [
+        IndexModel([('user_id', ASCENDING), ('channel_id', ASCENDING)], unique=True, name='user_channel'),
+    ]
+    # Sidebar badges stop counting here ("99+"), which bounds each count's index scan
+    UNREAD_CAP = 100
+
+    @staticmethod
+    def mark_read(user_id, channel_id, read_at=None):
+        """Advance the user's read cursor; $max keeps it from moving backwards"""
+        collection = mongo.get_collection('channel_reads')
+        collection.update_one(
+            {'user_id': str(user_id), 'channel_id': str(channel_id)},
+            {'$max': {'last_read_at': read_at or datetime.utcnow()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def find_for_user(user_id, channel_ids):
+        """Read cursors for the given channels, keyed by channel_id"""
+        collection = mongo.get_collection('channel_reads')
+        cursors = collection.find(
+            {'user_id': str(user_id), 'channel_id': {'$in': [str(c) for c in channel_ids]}},
+            {'channel_id': 1, 'last_read_at': 1, '_id': 0}
+        )
+        return {doc['channel_id']: doc['last_read_at'] for doc in cursors}
+
+    @staticmethod
+    def unread_counts(user_id, channels):
+        """Unread message count per channel, keyed by channel_id.
+
+        Channels whose denormalized last_message_at is not newer than the read
+        cursor are answered without touching messages; the rest get a capped
+        range count on the channel_created_at index.
+        """
+        user_id = str(user_id)
+        read_at = MongoChannelRead.find_for_user(user_id, [c['_id'] for c in channels])
+        messages = mongo.get_collection('messages')
+        counts = {}
+        for channel in channels:
+            channel_id = str(channel['_id'])
+            last_message_at = channel.get('last_message_at')
+            last_read_at = read_at.get(channel_id)
+            if not last_message_at or (last_read_at and last_message_at <= last_read_at):
+                counts[channel_id] = 0
+                continue
+            query = {'channel_id': channel_id, 'user_id': {'$ne': user_id}}
+            if last_read_at:
+                query['created_at'] = {'$gt': last_read_at}
+            counts[channel_id] = messages.count_documents(query, limit=MongoChannelRead.UNREAD_CAP)
+        return counts
+
 class MongoMeeting:
     """MongoDB Meeting model"""
+    COLLECTION = 'meetings'
+    INDEXES = [
+        # find_by_user is an $or over these three fields; each branch needs its own index
+        IndexModel([('organizer_id', ASCENDING)], name='organizer_id'),
+        IndexModel([('invitee_ids', ASCENDING)], name='invitee_ids'),
+        IndexModel([('participants', ASCENDING)], name='participants'),
+    ]
+
     @staticmethod
     def parse_iso_time(time_str):
         """Parse ISO format time string, handling 'Z' suffix"""
-        print(f"DEBUG: parse_iso_time called with: {time_str} (type: {type(time_str)})")
         if isinstance(time_str, str):
             # Replace 'Z' with '+00:00' for proper UTC handling
             if time_str.endswith('Z'):
                 time_str = time_str[:-1] + '+00:00'
             try:
-                parsed = datetime.fromisoformat(time_str)
-                print(f"DEBUG: Successfully parsed time: {parsed}")
-                return parsed
+                return datetime.fromisoformat(time_str)
             except ValueError as e:
-                print(f"DEBUG: Failed to parse time {time_str}: {e}")
+                meetings_log.debug("Failed to parse time %s: %s", time_str, e)
                 # If it fails, return as string
                 return time_str
-        print(f"DEBUG: Returning time_str as-is: {time_str}")
         return time_str
     
     @staticmethod
     def create_meeting(title, reason, date, start_time, end_time, organizer_id, invitee_ids):
         collection = mongo.get_collection('meetings')
-        
-        print(f"DEBUG: create_meeting called with start_time={start_time}, end_time={end_time}")
-        
+
         # Don't parse the times at all - just store them as strings
         # This will avoid the isoformat parsing error
         meeting_doc = {
@@ -326,7 +698,7 @@ class MongoMeeting:
         }
         result = collection.insert_one(meeting_doc)
         meeting_doc['_id'] = result.inserted_id
-        print(f"DEBUG: Meeting created successfully with ID: {result.inserted_id}")
+        meetings_log.debug("Meeting %s created", result.inserted_id)
         return meeting_doc
 
     @staticmethod
@@ -339,9 +711,8 @@ class MongoMeeting:
             {'invitee_ids': {'$in': [user_id_str]}},
             {'participants': {'$in': [user_id_str]}}
         ]}
-        print(f"DEBUG: MongoMeeting.find_by_user query: {query}")
         result = list(collection.find(query))
-        print(f"DEBUG: MongoMeeting.find_by_user result count: {len(result)}")
+        meetings_log.debug("find_by_user(%s) matched %d meetings", user_id_str, len(result))
         return result
 
     @staticmethod
@@ -351,6 +722,13 @@ class MongoMeeting:
 
 class MongoContentCalendar:
     """MongoDB Content Calendar model"""
+    COLLECTION = 'content_calendar'
+    INDEXES = [
+        IndexModel([('client_id', ASCENDING)], name='client_id'),
+        # Change feed for embedding_sync's polling mode
+        IndexModel([('updated_at', ASCENDING), ('_id', ASCENDING)], name='updated_at'),
+    ]
+
     @staticmethod
     def create_entry(client_id, title, description, content_type, platform, date, status, text_copy, hashtags, created_by, client_feedback, approval_status, files):
         collection = mongo.get_collection('content_calendar')
@@ -397,8 +775,120 @@ class MongoContentCalendar:
         return collection.find_one({'_id': ObjectId(entry_id)})
 
 
+class MongoChatMessageBucket:
+    """Chat messages stored in fixed-size buckets per conversation.
+
+    Message `seq` n of a conversation lives in bucket n // BUCKET_SIZE, so an
+    append touches one bounded document and a page of history reads at most
+    a couple of buckets, however long the conversation grows.
+    """
+    COLLECTION = 'chat_message_buckets'
+    BUCKET_SIZE = 50
+    INDEXES = [
+        IndexModel([('conversation_id', ASCENDING), ('bucket', ASCENDING)], unique=True, name='conversation_bucket'),
+    ]
+
+    @staticmethod
+    def append(conversation_id, seq, message):
+        """Store `message` as number `seq` of the conversation"""
+        bucket = seq // MongoChatMessageBucket.BUCKET_SIZE
+        collection = mongo.get_collection('chat_message_buckets')
+        query = {'conversation_id': ObjectId(conversation_id), 'bucket': bucket}
+        update = {
+            '$push': {'messages': dict(message, seq=seq)},
+            '$inc': {'count': 1},
+            '$setOnInsert': {'start_seq': bucket * MongoChatMessageBucket.BUCKET_SIZE, 'created_at': datetime.utcnow()}
+        }
+        try:
+            collection.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # Another append created the bucket first
+            collection.update_one(query, update)
+
+    @staticmethod
+    def insert_all(conversation_id, messages):
+        """Write `messages` as seq 0..n-1, skipping buckets that already exist"""
+        size = MongoChatMessageBucket.BUCKET_SIZE
+        now = datetime.utcnow()
+        operations = []
+        for start in range(0, len(messages), size):
+            chunk = [dict(msg, seq=start + offset) for offset, msg in enumerate(messages[start:start + size])]
+            query = {'conversation_id': ObjectId(conversation_id), 'bucket': start // size}
+            operations.append(UpdateOne(query, {'$setOnInsert': {
+                'start_seq': start,
+                'count': len(chunk),
+                'messages': chunk,
+                'created_at': now
+            }}, upsert=True))
+        if not operations:
+            return
+        collection = mongo.get_collection('chat_message_buckets')
+        try:
+            collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # A concurrent migration of the same conversation wrote the bucket
+            if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+
+    @staticmethod
+    def find_range(conversation_id, start, end=None):
+        """Messages with start <= seq < end (to the newest if end is None), in seq order"""
+        size = MongoChatMessageBucket.BUCKET_SIZE
+        bucket_range = {'$gte': start // size}
+        if end is not None:
+            if end <= start:
+                return []
+            bucket_range['$lte'] = (end - 1) // size
+        collection = mongo.get_collection('chat_message_buckets')
+        buckets = collection.find(
+            {'conversation_id': ObjectId(conversation_id), 'bucket': bucket_range},
+            {'messages': 1}
+        ).sort('bucket', ASCENDING)
+        messages = [
+            msg for bucket in buckets for msg in bucket.get('messages', [])
+            if msg['seq'] >= start and (end is None or msg['seq'] < end)
+        ]
+        # Concurrent appends can land in a bucket out of order
+        messages.sort(key=lambda msg: msg['seq'])
+        return messages
+
+    @staticmethod
+    def delete_for(conversation_id):
+        collection = mongo.get_collection('chat_message_buckets')
+        return collection.delete_many({'conversation_id': ObjectId(conversation_id)})
+
+
 class MongoChatConversation:
-    """Handle OpenAI chat conversations"""
+    """Handle OpenAI chat conversations.
+
+    Messages live in MongoChatMessageBucket; the conversation keeps
+    message_count (the next message's seq) and a last_message preview.
+    Conversations still in the old layout, with an embedded `messages`
+    array, are moved to buckets the first time they are opened or written
+    to, or all at once by migrate_chat_buckets.py.
+    """
+    COLLECTION = 'chat_conversations'
+    INDEXES = [
+        IndexModel([('user_id', ASCENDING), ('updated_at', DESCENDING)], name='user_updated_at'),
+    ]
+    
+    # List views; the fallbacks cover conversations not yet migrated
+    SUMMARY_STAGE = {'$project': {
+        'user_id': 1,
+        'title': 1,
+        'created_at': 1,
+        'updated_at': 1,
+        'message_count': {'$ifNull': ['$message_count', {'$size': {'$ifNull': ['$messages', []]}}]},
+        'last_message': {'$ifNull': ['$last_message', {'$arrayElemAt': [{'$ifNull': ['$messages', []]}, -1]}]},
+    }}
+    
+    @staticmethod
+    def _last_message(message):
+        return {
+            'role': message['role'],
+            'preview': MongoMessage.preview(message['content']),
+            'timestamp': message.get('timestamp')
+        }
     
     @staticmethod
     def create_conversation(user_id, title="New Chat"):
@@ -406,113 +896,132 @@ class MongoChatConversation:
         conversation_data = {
             'user_id': str(user_id),
             'title': title,
-            'messages': [],
+            'message_count': 0,
+            'last_message': None,
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
         collection = mongo.get_collection('chat_conversations')
-        result = collection.insert_one(conversation_data)
-        return collection.find_one({'_id': result.inserted_id})
+        collection.insert_one(conversation_data)
+        return conversation_data
     
     @staticmethod
     def get_conversation(conversation_id):
-        """Get a specific conversation"""
+        """Get a specific conversation, without its messages"""
         collection = mongo.get_collection('chat_conversations')
-        return collection.find_one({'_id': ObjectId(conversation_id)})
+        conversation = collection.find_one({'_id': ObjectId(conversation_id)})
+        if conversation is not None and 'messages' in conversation:
+            MongoChatConversation.migrate_document(conversation)
+            conversation = collection.find_one({'_id': ObjectId(conversation_id)})
+        return conversation
     
     @staticmethod
-    def get_user_conversations(user_id):
-        """Get all conversations for a user"""
-        collection = mongo.get_collection('chat_conversations')
-        return list(collection.find({'user_id': str(user_id)}).sort('updated_at', -1))
-    
-    @staticmethod
-    def add_message(conversation_id, role, content):
-        """Add a message to a conversation"""
-        message = {
-            'role': role,
-            'content': content,
-            'timestamp': datetime.utcnow()
-        }
+    def migrate_document(conversation):
+        """Move an embedded `messages` array into buckets; safe to repeat or race"""
+        messages = conversation.get('messages') or []
+        MongoChatMessageBucket.insert_all(conversation['_id'], messages)
         collection = mongo.get_collection('chat_conversations')
-        collection.update_one(
-            {'_id': ObjectId(conversation_id)},
+        return collection.update_one(
+            {'_id': conversation['_id'], 'messages': {'$exists': True}},
             {
-                '$push': {'messages': message},
-                '$set': {'updated_at': datetime.utcnow()}
+                '$set': {
+                    'message_count': len(messages),
+                    'last_message': MongoChatConversation._last_message(messages[-1]) if messages else None
+                },
+                '$unset': {'messages': ''}
             }
-        )
-        return collection.find_one({'_id': ObjectId(conversation_id)})
+        ).modified_count == 1
     
     @staticmethod
-    def delete_conversation(conversation_id):
-        """Delete a conversation"""
+    def _summaries(match):
         collection = mongo.get_collection('chat_conversations')
-        return collection.delete_one({'_id': ObjectId(conversation_id)})
+        summaries = list(collection.aggregate([
+            {'$match': match},
+            {'$sort': {'updated_at': -1}},
+            MongoChatConversation.SUMMARY_STAGE,
+        ]))
+        for summary in summaries:
+            last = summary.get('last_message')
+            if last and 'preview' not in last:
+                summary['last_message'] = MongoChatConversation._last_message(last)
+        return summaries
     
     @staticmethod
-    def update_title(conversation_id, title):
-        """Update conversation title"""
-        collection = mongo.get_collection('chat_conversations')
-        collection.update_one(
-            {'_id': ObjectId(conversation_id)},
-            {'$set': {'title': title, 'updated_at': datetime.utcnow()}}
-        )
-        return collection.find_one({'_id': ObjectId(conversation_id)})
-
-
-class MongoChatConversation:
-    """Handle OpenAI chat conversations"""
+    def get_summary(conversation_id):
+        """A conversation without its messages, as in get_user_conversations"""
+        summaries = MongoChatConversation._summaries({'_id': ObjectId(conversation_id)})
+        return summaries[0] if summaries else None
     
     @staticmethod
-    def create_conversation(user_id, title="New Chat"):
-        """Create a new chat conversation"""
-        conversation_data = {
-            'user_id': str(user_id),
-            'title': title,
-            'messages': [],
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
-        collection = mongo.get_collection('chat_conversations')
-        result = collection.insert_one(conversation_data)
-        return collection.find_one({'_id': result.inserted_id})
+    def get_user_conversations(user_id):
+        """Get all conversations for a user, newest first, without their messages"""
+        return MongoChatConversation._summaries({'user_id': str(user_id)})
     
     @staticmethod
-    def get_conversation(conversation_id):
-        """Get a specific conversation"""
-        collection = mongo.get_collection('chat_conversations')
-        return collection.find_one({'_id': ObjectId(conversation_id)})
+    def get_messages_page(conversation_id, before=None, limit=50):
+        """Up to `limit` messages preceding seq `before` (default: the newest).
+        
+        Returns (messages, has_more, found); each message carries its `seq`,
+        which is the cursor for the next page.
+        """
+        conversation = MongoChatConversation.get_conversation(conversation_id)
+        if conversation is None:
+            return [], False, False
+        total = conversation.get('message_count', 0)
+        end = total if before is None else min(before, total)
+        start = max(0, end - limit)
+        messages = MongoChatMessageBucket.find_range(conversation['_id'], start, end)
+        return messages, start > 0, True
     
     @staticmethod
-    def get_user_conversations(user_id):
-        """Get all conversations for a user"""
-        collection = mongo.get_collection('chat_conversations')
-        return list(collection.find({'user_id': str(user_id)}).sort('updated_at', -1))
+    def get_messages_since(conversation_id, seq):
+        """Every message from `seq` on, oldest first"""
+        return MongoChatMessageBucket.find_range(conversation_id, seq)
     
     @staticmethod
     def add_message(conversation_id, role, content):
-        """Add a message to a conversation"""
+        """Add a message to a conversation; returns the conversation without its messages"""
+        now = datetime.utcnow()
         message = {
             'role': role,
             'content': content,
-            'timestamp': datetime.utcnow()
+            'timestamp': now
         }
         collection = mongo.get_collection('chat_conversations')
-        collection.update_one(
-            {'_id': ObjectId(conversation_id)},
-            {
-                '$push': {'messages': message},
-                '$set': {'updated_at': datetime.utcnow()}
-            }
+        for _ in range(2):
+            # Reserve the next seq; the update only matches migrated conversations
+            conversation = collection.find_one_and_update(
+                {'_id': ObjectId(conversation_id), 'messages': {'$exists': False}},
+                {
+                    '$inc': {'message_count': 1},
+                    '$set': {'updated_at': now, 'last_message': MongoChatConversation._last_message(message)}
+                },
+                projection={'summary': 0},
+                return_document=ReturnDocument.AFTER
+            )
+            if conversation is not None:
+                MongoChatMessageBucket.append(conversation['_id'], conversation['message_count'] - 1, message)
+                return conversation
+            if MongoChatConversation.get_conversation(conversation_id) is None:
+                return None
+        return None
+    
+    @staticmethod
+    def save_summary(conversation_id, text, upto):
+        """Store the rolling summary of the first `upto` messages, unless a longer one is already stored"""
+        collection = mongo.get_collection('chat_conversations')
+        return collection.update_one(
+            {'_id': ObjectId(conversation_id), 'summary.upto': {'$not': {'$gte': upto}}},
+            {'$set': {'summary': {'text': text, 'upto': upto, 'updated_at': datetime.utcnow()}}}
         )
-        return collection.find_one({'_id': ObjectId(conversation_id)})
     
     @staticmethod
     def delete_conversation(conversation_id):
-        """Delete a conversation"""
+        """Delete a conversation and its messages"""
         collection = mongo.get_collection('chat_conversations')
-        return collection.delete_one({'_id': ObjectId(conversation_id)})
+        result = collection.delete_one({'_id': ObjectId(conversation_id)})
+        MongoChatMessageBucket.delete_for(conversation_id)
+        return result
     
     @staticmethod
     def update_title(conversation_id, title):
@@ -522,4 +1031,257 @@ class MongoChatConversation:
             {'_id': ObjectId(conversation_id)},
             {'$set': {'title': title, 'updated_at': datetime.utcnow()}}
         )
-        return collection.find_one({'_id': ObjectId(conversation_id)})
+        return MongoChatConversation.get_summary(conversation_id)
+
+
+class MongoResponseCache:
+    """Persistent tier of response_cache.ResponseCache.
+
+    Entries are keyed by prompt hash and removed by the TTL monitor once
+    `expires_at` passes (it runs about once a minute, so reads also filter
+    on it). Entries may carry the prompt's embedding for similarity lookups.
+    """
+    COLLECTION = 'ai_response_cache'
+    INDEXES = [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl'),
+        IndexModel([('namespace', ASCENDING), ('created_at', DESCENDING)], name='namespace_created_at'),
+    ]
+
+    @staticmethod
+    def get(key):
+        collection = mongo.get_collection('ai_response_cache')
+        return collection.find_one(
+            {'_id': key, 'expires_at': {'$gt': datetime.utcnow()}},
+            {'value': 1, 'expires_at': 1}
+        )
+
+    @staticmethod
+    def put(key, namespace, value, ttl, embedding=None):
+        now = datetime.utcnow()
+        entry = {
+            'namespace': namespace,
+            'value': value,
+            'created_at': now,
+            'expires_at': now + timedelta(seconds=ttl)
+        }
+        if embedding is not None:
+            entry['embedding'] = embedding
+        collection = mongo.get_collection('ai_response_cache')
+        return collection.replace_one({'_id': key}, entry, upsert=True)
+
+    @staticmethod
+    def recent_embeddings(namespace, limit):
+        """The newest live entries of `namespace` that have an embedding"""
+        collection = mongo.get_collection('ai_response_cache')
+        return list(collection.find(
+            {'namespace': namespace, 'expires_at': {'$gt': datetime.utcnow()}, 'embedding': {'$exists': True}},
+            {'embedding': 1, 'value': 1, 'expires_at': 1}
+        ).sort('created_at', DESCENDING).limit(limit))
+
+
+class MongoEmbeddingSyncState:
+    """Progress of embedding_sync, per vector index (`namespace`).
+
+    Holds one cursor per source (poll watermark and change stream resume
+    token) and the content hash last embedded for every indexed document,
+    so unchanged documents are never re-embedded.
+    """
+    COLLECTION = 'embedding_sync_state'
+    INDEXES = [
+        IndexModel([('namespace', ASCENDING), ('kind', ASCENDING)], name='namespace_kind'),
+    ]
+
+    @staticmethod
+    def get_cursor(namespace, source):
+        collection = mongo.get_collection('embedding_sync_state')
+        return collection.find_one({'_id': f"{namespace}|cursor|{source}"}) or {}
+
+    @staticmethod
+    def save_cursor(namespace, source, **fields):
+        collection = mongo.get_collection('embedding_sync_state')
+        collection.update_one(
+            {'_id': f"{namespace}|cursor|{source}"},
+            {'$set': dict(fields, namespace=namespace, kind='cursor', updated_at=datetime.utcnow())},
+            upsert=True
+        )
+
+    @staticmethod
+    def get_hashes(namespace, vector_ids):
+        """{vector_id: content hash} for the ids that have been embedded"""
+        if not vector_ids:
+            return {}
+        collection = mongo.get_collection('embedding_sync_state')
+        keys = [f"{namespace}|doc|{vector_id}" for vector_id in vector_ids]
+        return {doc['vector_id']: doc['hash'] for doc in collection.find({'_id': {'$in': keys}}, {'vector_id': 1, 'hash': 1})}
+
+    @staticmethod
+    def save_hashes(namespace, hashes):
+        if not hashes:
+            return
+        now = datetime.utcnow()
+        collection = mongo.get_collection('embedding_sync_state')
+        collection.bulk_write([
+            UpdateOne(
+                {'_id': f"{namespace}|doc|{vector_id}"},
+                {'$set': {'namespace': namespace, 'kind': 'doc', 'vector_id': vector_id, 'hash': digest, 'updated_at': now}},
+                upsert=True
+            )
+            for vector_id, digest in hashes.items()
+        ], ordered=False)
+
+    @staticmethod
+    def forget(namespace, vector_ids):
+        if not vector_ids:
+            return
+        collection = mongo.get_collection('embedding_sync_state')
+        collection.delete_many({'_id': {'$in': [f"{namespace}|doc|{vector_id}" for vector_id in vector_ids]}})
+
+    @staticmethod
+    def reset(namespace):
+        """Drop all progress for `namespace`, so the next sync re-embeds everything"""
+        collection = mongo.get_collection('embedding_sync_state')
+        return collection.delete_many({'namespace': namespace}).deleted_count
+
+
+class MongoRevokedToken:
+    """Revoked access/refresh tokens, mirrored in memory by access_tokens.
+
+    Two kinds of entry: a single token by its id (`jti`), and every token of
+    a user issued before `not_before`. Entries are only needed until the
+    tokens they cover would have expired anyway, then the TTL monitor drops them.
+    """
+    COLLECTION = 'revoked_tokens'
+    INDEXES = [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl'),
+        IndexModel([('updated_at', ASCENDING)], name='updated_at'),
+    ]
+
+    @staticmethod
+    def revoke_token(jti, expires_at):
+        collection = mongo.get_collection('revoked_tokens')
+        collection.update_one(
+            {'_id': f"jti:{jti}"},
+            {'$set': {'jti': jti, 'expires_at': expires_at, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def revoke_user(user_id, not_before, expires_at):
+        collection = mongo.get_collection('revoked_tokens')
+        collection.update_one(
+            {'_id': f"user:{user_id}"},
+            {'$set': {'user_id': str(user_id), 'not_before': not_before, 'expires_at': expires_at,
+                      'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def changed_since(since=None):
+        """Live entries written at or after `since` (all of them if None)"""
+        query = {'expires_at': {'$gt': datetime.utcnow()}}
+        if since is not None:
+            query['updated_at'] = {'$gte': since}
+        collection = mongo.get_collection('revoked_tokens')
+        return list(collection.find(query, {'jti': 1, 'user_id': 1, 'not_before': 1, 'expires_at': 1}))
+
+
+class MongoUploadSession:
+    """Chunked uploads in progress (see chunked_uploads.py).
+
+    `offset` is how many bytes of the file are safely on disk; it only moves
+    forward through advance()'s compare-and-set, so two writers of the same
+    range cannot both commit it. Sessions expire UPLOAD_SESSION_TTL after
+    their last chunk.
+    """
+    COLLECTION = 'upload_sessions'
+    INDEXES = [
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl'),
+    ]
+
+    @staticmethod
+    def create(upload_id, user_id, original_filename, extension, mime_type, size, sha256, expires_at):
+        now = datetime.utcnow()
+        doc = {
+            '_id': upload_id,
+            'user_id': str(user_id) if user_id else None,
+            'original_filename': original_filename,
+            'extension': extension,
+            'mime_type': mime_type,
+            'size': size,
+            'sha256': sha256,
+            'offset': 0,
+            'status': 'uploading',
+            'created_at': now,
+            'updated_at': now,
+            'expires_at': expires_at,
+        }
+        mongo.get_collection('upload_sessions').insert_one(doc)
+        return doc
+
+    @staticmethod
+    def find(upload_id):
+        return mongo.get_collection('upload_sessions').find_one({'_id': upload_id})
+
+    @staticmethod
+    def advance(upload_id, from_offset, to_offset, expires_at):
+        """Move the offset from `from_offset` to `to_offset`; False if it was not at `from_offset`"""
+        result = mongo.get_collection('upload_sessions').update_one(
+            {'_id': upload_id, 'status': 'uploading', 'offset': from_offset},
+            {'$set': {'offset': to_offset, 'updated_at': datetime.utcnow(), 'expires_at': expires_at}}
+        )
+        return result.modified_count == 1
+
+    @staticmethod
+    def complete(upload_id, filename, sha256, expires_at):
+        """Record the stored file; False if the session was already completed"""
+        result = mongo.get_collection('upload_sessions').update_one(
+            {'_id': upload_id, 'status': 'uploading'},
+            {'$set': {'status': 'complete', 'filename': filename, 'sha256': sha256,
+                      'updated_at': datetime.utcnow(), 'expires_at': expires_at}}
+        )
+        return result.modified_count == 1
+
+    @staticmethod
+    def delete(upload_id):
+        return mongo.get_collection('upload_sessions').delete_one({'_id': upload_id}).deleted_count > 0
+
+
+class MongoSchemaVersion:
+    """Version markers for one-off data setup such as seed.py, one document per component"""
+    COLLECTION = 'schema_versions'
+    INDEXES = []
+
+    @staticmethod
+    def get(component):
+        collection = mongo.get_collection('schema_versions')
+        marker = collection.find_one({'_id': component})
+        return marker['version'] if marker else 0
+
+    @staticmethod
+    def set(component, version):
+        collection = mongo.get_collection('schema_versions')
+        collection.update_one(
+            {'_id': component},
+            {'$set': {'version': version, 'applied_at': datetime.utcnow()}},
+            upsert=True
+        )
+
+
+# Every model whose INDEXES are applied by MongoDB.ensure_indexes on connect
+INDEXED_MODELS = [
+    MongoUser,
+    MongoClientModel,
+    MongoProject,
+    MongoTask,
+    MongoChannel,
+    MongoMessage,
+    MongoChannelRead,
+    MongoMeeting,
+    MongoContentCalendar,
+    MongoChatConversation,
+    MongoChatMessageBucket,
+    MongoResponseCache,
+    MongoEmbeddingSyncState,
+    MongoRevokedToken,
+    MongoUploadSession,
+]
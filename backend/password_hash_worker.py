@@ -0,0 +1,16 @@
+"""
+Tasks run in password_hashing's worker processes
+
+The workers are forked from a fork server that has imported only this
+module, so they inherit none of the app's threads, locks or connections.
+Keep it that way: import nothing here but bcrypt.
+"""
+import bcrypt
+
+
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def check_password(password, hashed):
+    return bcrypt.checkpw(password, hashed)
@@ -0,0 +1,201 @@
+"""
+bcrypt hashing and verification off the request threads
+
+bcrypt is deliberately slow (~100-250 ms of CPU per call at our cost), so
+hashes are computed in a small process pool rather than on the worker
+thread that serves the request. At most PASSWORD_HASH_WORKERS calls run at
+once and PASSWORD_HASH_QUEUE more may wait; a request that cannot be
+admitted within PASSWORD_HASH_QUEUE_TIMEOUT seconds fails fast with
+PasswordHashBusy, which routes turn into 429 + Retry-After.
+
+Raising BCRYPT_ROUNDS takes effect without password resets: a successful
+login with a hash of a lower cost stores a fresh hash (see
+MongoUser.verify_password).
+
+    BCRYPT_ROUNDS=12                # cost factor for new hashes
+    PASSWORD_HASH_WORKERS=2         # processes; 0 hashes inline (scripts, tests)
+    PASSWORD_HASH_QUEUE=16          # calls that may wait for a free process
+    PASSWORD_HASH_QUEUE_TIMEOUT=0.5 # seconds to wait for admission
+
+Workers start from a fork server (see password_hash_worker), never by
+forking the app: a fork of a process running pymongo monitors, the chat
+flusher and sync threads can inherit a lock one of them held and deadlock.
+Hashing stays inline under eventlet/gevent (SOCKETIO_ASYNC_MODE), and when
+the app was started as a script from this directory (python app.py), which
+every worker would otherwise import again.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app_logging import get_logger
+from password_hash_worker import check_password as _check, hash_password as _hash
+
+log = get_logger('auth.hashing')
+
+ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(2, os.cpu_count() or 1))))
+QUEUE_DEPTH = int(os.getenv('PASSWORD_HASH_QUEUE', '16'))
+QUEUE_TIMEOUT = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT', '0.5'))
+# Upper bound on one call, queueing included; a healthy pool answers in well under a second
+RESULT_TIMEOUT = 30
+
+
+class PasswordHashBusy(Exception):
+    """The hashing pool is saturated; the caller should retry later"""
+
+    retry_after = 2
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_admission = threading.BoundedSemaphore(max(WORKERS, 1) + QUEUE_DEPTH)
+_inline = None
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ─── Pool ─────────────────────────────────────────────────────────────────────
+
+def _inline_reason():
+    """Why this process must hash inline, or None when it can use the pool"""
+    if WORKERS <= 0:
+        return 'PASSWORD_HASH_WORKERS=0'
+    async_mode = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+    if async_mode != 'threading':
+        return f"the {async_mode} async mode cannot host a process pool"
+    # Workers import the parent's main module again unless it was run with -m
+    main = sys.modules.get('__main__')
+    main_path = getattr(main, '__file__', None)
+    if main_path and getattr(main, '__spec__', None) is None \
+            and os.path.dirname(os.path.abspath(main_path)) == BACKEND_DIR:
+        return f"{os.path.basename(main_path)} was run as a script"
+    return None
+
+
+def _hash_inline():
+    global _inline
+    if _inline is None:
+        reason = _inline_reason()
+        if reason and WORKERS > 0:
+            log.warning("Hashing passwords on the request threads: %s", reason)
+        _inline = reason is not None
+    return _inline
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                if context.get_start_method() == 'forkserver':
+                    # The fork server loads bcrypt once; workers fork from it, not from the app
+                    context.set_forkserver_preload(['password_hash_worker'])
+                _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=context)
+                log.info("Password hashing pool ready (workers=%d, queue=%d, rounds=%d)",
+                         WORKERS, QUEUE_DEPTH, ROUNDS)
+    return _pool
+
+
+def _run(fn, *args):
+    if _hash_inline():
+        return fn(*args)
+    if not _admission.acquire(timeout=QUEUE_TIMEOUT):
+        log.warning("Password hashing pool saturated, rejecting request")
+        raise PasswordHashBusy("Too many sign-in attempts in progress, try again shortly")
+    try:
+        future = _get_pool().submit(fn, *args)
+    except BrokenProcessPool:
+        _admission.release()
+        _reset_pool()
+        raise
+    except BaseException:
+        _admission.release()
+        raise
+    future.add_done_callback(lambda _: _admission.release())
+    try:
+        return future.result(timeout=RESULT_TIMEOUT)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool for the next call
+        _reset_pool()
+        raise
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        log.error("Password hashing pool broke; restarting it")
+        pool.shutdown(wait=False)
+
+
+def _encode(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+def hash_password(password, rounds=None):
+    """bcrypt hash (bytes) of `password` at `rounds` (default BCRYPT_ROUNDS)"""
+    return _run(_hash, _encode(password), rounds or ROUNDS)
+
+
+def verify_password(password, hashed):
+    """Whether `password` matches the bcrypt hash `hashed` (bytes or str)"""
+    if not password or not hashed:
+        return False
+    return _run(_check, _encode(password), _encode(hashed))
+
+
+def hash_rounds(hashed):
+    """Cost factor a bcrypt hash was made with, or None if it is not one"""
+    parts = _encode(hashed).split(b'$')
+    # b'$2b$12$<salt+digest>' -> [b'', b'2b', b'12', b'...']
+    if len(parts) != 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed):
+    """Whether `hashed` was made with a lower cost than BCRYPT_ROUNDS"""
+    rounds = hash_rounds(hashed)
+    return rounds is not None and rounds < ROUNDS
+
+
+def rehash_async(password, callback):
+    """Hash `password` at the current cost in the background, then call callback(new_hash).
+
+    Best effort: skipped when the pool is busy, since the next login retries.
+    """
+    if _hash_inline():
+        callback(_hash(_encode(password), ROUNDS))
+        return True
+    if not _admission.acquire(blocking=False):
+        return False
+    try:
+        future = _get_pool().submit(_hash, _encode(password), ROUNDS)
+    except BaseException:
+        _admission.release()
+        raise
+
+    def done(future):
+        _admission.release()
+        try:
+            callback(future.result())
+        except Exception:
+            log.exception("Password rehash failed")
+    future.add_done_callback(done)
+    return True
+
+
+def error_response(e):
+    """(body, status, headers) for PasswordHashBusy, else None"""
+    if isinstance(e, PasswordHashBusy):
+        return {'error': str(e)}, 429, {'Retry-After': str(e.retry_after)}
+    return None
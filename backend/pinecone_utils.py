@@ -1,53 +1,54 @@
 import os
+from functools import lru_cache
+
 from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
+from langchain_openai import ChatOpenAI
+from langchain.chains import RetrievalQA
 from langchain_core.documents import Document
 
-def store_text_in_pinecone(texts, metadata_list):
-    # Initialize embeddings
-    embeddings = OpenAIEmbeddings(api_key=os.environ["OPENAI_API_KEY"])
+# The LangChain objects below hold HTTP clients and are safe to share, so each
+# is built once per process instead of on every call.
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    return OpenAIEmbeddings(api_key=os.environ["OPENAI_API_KEY"])
+
+
+@lru_cache(maxsize=None)
+def get_vector_store():
+    return PineconeVectorStore(
+        index_name=os.environ["PINECONE_INDEX_NAME"],
+        embedding=get_embeddings()
+    )
+
+
+@lru_cache(maxsize=None)
+def get_qa_chain():
+    llm = ChatOpenAI(model="gpt-4", api_key=os.environ["OPENAI_API_KEY"])
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=get_vector_store().as_retriever(search_kwargs={"k": 3})
+    )
+
 
+def store_text_in_pinecone(texts, metadata_list):
     # Create documents
     documents = [
         Document(page_content=text, metadata=meta)
         for text, meta in zip(texts, metadata_list)
     ]
 
-    # Initialize Pinecone vector store
-    vector_store = PineconeVectorStore(
-        index_name=os.environ["PINECONE_INDEX_NAME"],
-        embedding=embeddings
-    )
-
     # Add documents to Pinecone
-    vector_store.add_documents(documents)
+    get_vector_store().add_documents(documents)
     print("Data stored in Pinecone successfully!")
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import ChatOpenAI
-from langchain.chains import RetrievalQA
 
 def query_pinecone(question):
-    # Initialize embeddings and LLM
-    embeddings = OpenAIEmbeddings(api_key=os.environ["OPENAI_API_KEY"])
-    llm = ChatOpenAI(model="gpt-4", api_key=os.environ["OPENAI_API_KEY"])
-
-    # Initialize Pinecone vector store
-    vector_store = PineconeVectorStore(
-        index_name=os.environ["PINECONE_INDEX_NAME"],
-        embedding=embeddings
-    )
-
-    # Create RAG pipeline
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=vector_store.as_retriever(search_kwargs={"k": 3})
-    )
-
-    # Run query
-    result = qa_chain.run(question)
-    return result
+    # Run query against the shared RAG pipeline
+    return get_qa_chain().run(question)
 
 # Pinecone utility logic has been moved to plugins/pinecone/pinecone_plugin.py for plugin-based architecture.
+# For answers over the app's own data, prefer retrieval_service.py (served at /api/ai/ask).
@@ -0,0 +1,450 @@
+# IVF (inverted file) approximate nearest-neighbour index for the local vector store
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from app_logging import get_logger
+from plugins.interfaces.vector_db import VectorDBPlugin
+
+log = get_logger('plugins.ivf')
+
+
+class IVFVectorIndex(VectorDBPlugin):
+    """Approximate top-k cosine search that scans only the closest clusters.
+
+    Vectors are partitioned into `nlist` clusters by spherical k-means; a
+    query ranks the centroids and scans the `nprobe` closest lists, so cost
+    grows with n * nprobe / nlist instead of n. Raising nprobe trades speed
+    for recall (nprobe == nlist is exact); see vector_index_benchmark.py.
+
+    Until there are MIN_POINTS_PER_LIST * nlist vectors the index is
+    untrained and every query is an exact scan. Once that many have been
+    inserted it trains itself on a background thread (unless auto_train is
+    False), and train() can be called again as the corpus drifts. Training
+    runs k-means on a snapshot without holding the index lock, so queries
+    and inserts carry on meanwhile; only the swap to the new centroids and
+    lists is done under it. Inserts are incremental: new vectors go to their
+    nearest list.
+    Deletes and overwrites leave tombstones, which queries skip and
+    compact() reclaims.
+
+    On disk, directory `path` holds CURRENT, naming the generation directory
+    in use, which holds:
+        vectors.f32     append-only (capacity, dimension) memmap, one row per slot
+        lists.i32       cluster of each slot (-1 until trained)
+        centroids.npy   (nlist, dimension), present once trained
+        records.jsonl   append-only log of {"slot", "id", "metadata"} and {"delete"}
+    compact() writes a new generation and switches CURRENT to it with one
+    rename; generations it no longer names are removed on load. Indexes
+    written before generations keep their files in `path` until compacted.
+    """
+
+    MIN_POINTS_PER_LIST = 39
+    INITIAL_CAPACITY = 4096
+    KMEANS_ITERATIONS = 20
+    # Points per list used to fit the centroids, capped to bound training memory
+    TRAIN_SAMPLE_PER_LIST = 64
+    MAX_TRAIN_SAMPLE = 65536
+    # Rows scored against the centroids at a time
+    ASSIGN_CHUNK = 8192
+    CURRENT_FILE = 'CURRENT'
+    GENERATION_PREFIX = 'gen-'
+    DATA_FILES = ('vectors.f32', 'lists.i32', 'centroids.npy', 'records.jsonl')
+
+    def __init__(self, path, dimension=1536, nlist=1024, nprobe=16, seed=0, auto_train=True):
+        self.path = path
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.auto_train = auto_train
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        # Serializes train() and compact(), which renumber or reassign slots
+        self._maintenance_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ─── VectorDBPlugin ───────────────────────────────────────────────────────
+
+    def upsert(self, vectors):
+        """Insert or replace (id, values, metadata) tuples or {'id', 'values', 'metadata'} dicts"""
+        items = [self._normalize_item(item) for item in vectors]
+        if not items:
+            return {'upserted_count': 0}
+        with self._lock:
+            first = self._count
+            self._ensure_capacity(first + len(items))
+            block = np.stack([values for _, values, _ in items])
+            self._vectors[first:first + len(items)] = block
+            self._vectors.flush()
+            if self.trained:
+                assignments = self._assign(block)
+            else:
+                assignments = np.full(len(items), -1, dtype=np.int32)
+            self._lists_file[first:first + len(items)] = assignments
+            self._lists_file.flush()
+
+            records = []
+            for offset, (item_id, _, metadata) in enumerate(items):
+                slot = first + offset
+                self._add_slot(slot, item_id, metadata, int(assignments[offset]))
+                records.append({'slot': slot, 'id': item_id, 'metadata': metadata})
+            self._count = first + len(items)
+            # The log is written last: slots it does not mention are ignored on load
+            self._append_records(records)
+            ready = not self.trained and self.live_count >= self.nlist * self.MIN_POINTS_PER_LIST
+
+        if ready and self.auto_train and self._maintenance_lock.acquire(blocking=False):
+            # The trainer thread releases the lock; meanwhile other upserts skip this
+            threading.Thread(target=self._auto_train, name='ivf-train', daemon=True).start()
+        return {'upserted_count': len(items)}
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None, nprobe=None):
+        """Approximate top `top_k` rows by cosine similarity.
+
+        `nprobe` overrides the index default for this query. `filter` is a
+        dict of metadata fields that must be equal, or a predicate over
+        each candidate's metadata.
+        """
+        q = self._unit(vector)
+        if isinstance(filter, dict):
+            expected = filter
+            filter = lambda meta: all(meta.get(key) == value for key, value in expected.items())
+        with self._lock:
+            if self.trained:
+                probe = min(nprobe or self.nprobe, self.nlist)
+                centroid_scores = self._centroids @ q
+                lists = np.argpartition(-centroid_scores, probe - 1)[:probe]
+                candidates = np.concatenate([self._list_slots[l][:self._list_sizes[l]] for l in lists])
+                candidates = candidates[self._live[candidates]]
+            else:
+                candidates = np.flatnonzero(self._live[:self._count])
+            if filter is not None and len(candidates):
+                keep = np.fromiter((filter(self._metadata[slot]) for slot in candidates), dtype=bool, count=len(candidates))
+                candidates = candidates[keep]
+            if not len(candidates):
+                return {'matches': []}
+            candidates.sort()  # sequential reads from the memmap
+            scores = self._vectors[candidates] @ q
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = []
+            for i in top:
+                slot = candidates[i]
+                match = {'id': self._slot_ids[slot], 'score': float(scores[i])}
+                if include_metadata:
+                    match['metadata'] = self._metadata[slot]
+                matches.append(match)
+        return {'matches': matches}
+
+    def delete(self, ids):
+        """Tombstone `ids`; their rows stay on disk until compact()"""
+        deleted = []
+        with self._lock:
+            for item_id in ids:
+                slot = self._rows.pop(str(item_id), None)
+                if slot is None:
+                    continue
+                self._tombstone(slot)
+                deleted.append({'delete': str(item_id)})
+            self._append_records(deleted)
+        return {'deleted_count': len(deleted)}
+
+    # ─── Index maintenance ────────────────────────────────────────────────────
+
+    @property
+    def trained(self):
+        return self._centroids is not None
+
+    @property
+    def live_count(self):
+        return len(self._rows)
+
+    @property
+    def tombstone_count(self):
+        return self._count - len(self._rows)
+
+    def __len__(self):
+        return self.live_count
+
+    def train(self, sample_size=None):
+        """Fit the centroids on a sample of live vectors and reassign every slot"""
+        with self._maintenance_lock:
+            self._train(sample_size)
+
+    def compact(self):
+        """Rewrite the index without tombstoned rows"""
+        with self._maintenance_lock, self._lock:
+            live = np.flatnonzero(self._live[:self._count])
+            records = [{'slot': new_slot, 'id': self._slot_ids[slot], 'metadata': self._metadata[slot]}
+                       for new_slot, slot in enumerate(live)]
+            generation = self._next_generation()
+            new_dir = os.path.join(self.path, generation)
+            os.makedirs(new_dir)
+            capacity = max(self.INITIAL_CAPACITY, len(live))
+            vectors = self._open_array(new_dir, 'vectors.f32', np.float32, (capacity, self.dimension))
+            lists = self._open_array(new_dir, 'lists.i32', np.int32, (capacity,))
+            for start in range(0, len(live), self.ASSIGN_CHUNK):
+                chunk = live[start:start + self.ASSIGN_CHUNK]
+                vectors[start:start + len(chunk)] = self._vectors[chunk]
+                lists[start:start + len(chunk)] = self._lists_file[chunk]
+            vectors.flush()
+            lists.flush()
+            del vectors, lists
+            if self.trained:
+                np.save(os.path.join(new_dir, 'centroids.npy'), self._centroids)
+            with open(os.path.join(new_dir, 'records.jsonl'), 'w') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            # The new generation is complete on disk before CURRENT names it
+            self._write_current(generation)
+            del self._vectors, self._lists_file
+            reclaimed = self._count - len(live)
+            self._load()
+            log.info("Compacted IVF index %s: reclaimed %d rows", self.path, reclaimed)
+
+    # ─── Internals ────────────────────────────────────────────────────────────
+
+    def _auto_train(self):
+        try:
+            if not self.trained:
+                self._train()
+        except Exception:
+            log.exception("Training IVF index %s failed", self.path)
+        finally:
+            self._maintenance_lock.release()
+
+    def _train(self, sample_size=None):
+        # Snapshot under the lock. Rows are never rewritten in place and the
+        # maintenance lock keeps compact() from renumbering them, so slots
+        # below `count` can be read from this memmap after the lock is released.
+        with self._lock:
+            count = self._count
+            vectors = self._vectors
+            live = np.flatnonzero(self._live[:count])
+            if len(live) < self.nlist:
+                raise ValueError(f"Need at least nlist={self.nlist} vectors to train, have {len(live)}")
+            sample_size = min(len(live), sample_size or min(self.nlist * self.TRAIN_SAMPLE_PER_LIST, self.MAX_TRAIN_SAMPLE))
+            sample = np.sort(self._rng.choice(live, size=sample_size, replace=False))
+            points = np.asarray(vectors[sample])
+
+        centroids = self._kmeans(points)
+        assignments = np.empty(count, dtype=np.int32)
+        for start in range(0, count, self.ASSIGN_CHUNK):
+            end = min(start + self.ASSIGN_CHUNK, count)
+            assignments[start:end] = self._assign(np.asarray(vectors[start:end]), centroids)
+
+        with self._lock:
+            self._centroids = centroids
+            np.save(os.path.join(self._dir, 'centroids.npy'), centroids)
+            self._lists_file[:count] = assignments
+            if self._count > count:
+                # Rows upserted while training went unassigned or to the old lists
+                self._lists_file[count:self._count] = self._assign(np.asarray(self._vectors[count:self._count]))
+            self._lists_file.flush()
+            self._rebuild_lists()
+        log.info("Trained IVF index %s: %d lists over %d vectors (sample %d)",
+                 self.path, self.nlist, len(live), sample_size)
+
+    def _normalize_item(self, item):
+        if isinstance(item, dict):
+            item_id, values, metadata = item['id'], item['values'], item.get('metadata')
+        else:
+            item_id, values = item[0], item[1]
+            metadata = item[2] if len(item) > 2 else None
+        return str(item_id), self._unit(values), metadata or {}
+
+    def _unit(self, values):
+        vector = np.asarray(values, dtype=np.float32)
+        if vector.shape != (self.dimension,):
+            raise ValueError(f"Expected a vector of dimension {self.dimension}, got shape {vector.shape}")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _kmeans(self, points):
+        """Spherical k-means: unit centroids maximizing cosine similarity"""
+        centroids = points[self._rng.choice(len(points), size=self.nlist, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            labels = self._assign(points, centroids)
+            counts = np.bincount(labels, minlength=self.nlist)
+            # Per-cluster sums via one sort and reduceat (np.add.at is far slower)
+            order = np.argsort(labels, kind='stable')
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            nonempty = np.flatnonzero(counts)
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(points[order], starts[nonempty], axis=0)
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                # Restart empty clusters on random points
+                sums[empty] = points[self._rng.choice(len(points), size=len(empty), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        return centroids.astype(np.float32)
+
+    def _assign(self, block, centroids=None):
+        centroids = self._centroids if centroids is None else centroids
+        labels = np.empty(len(block), dtype=np.int32)
+        for start in range(0, len(block), self.ASSIGN_CHUNK):
+            chunk = block[start:start + self.ASSIGN_CHUNK]
+            labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return labels
+
+    def _add_slot(self, slot, item_id, metadata, list_id):
+        previous = self._rows.get(item_id)
+        if previous is not None:
+            self._tombstone(previous)
+        self._rows[item_id] = slot
+        self._slot_ids[slot] = item_id
+        self._metadata[slot] = metadata
+        self._live[slot] = True
+        if list_id >= 0:
+            self._list_append(list_id, slot)
+
+    def _tombstone(self, slot):
+        self._live[slot] = False
+        self._slot_ids[slot] = None
+        self._metadata[slot] = None
+
+    def _list_append(self, list_id, slot):
+        size = self._list_sizes[list_id]
+        buffer = self._list_slots[list_id]
+        if size == len(buffer):
+            grown = np.empty(max(16, 2 * len(buffer)), dtype=np.int64)
+            grown[:size] = buffer[:size]
+            self._list_slots[list_id] = buffer = grown
+        buffer[size] = slot
+        self._list_sizes[list_id] = size + 1
+
+    def _rebuild_lists(self):
+        assignments = np.asarray(self._lists_file[:self._count])
+        live = np.flatnonzero(self._live[:self._count])
+        order = live[np.argsort(assignments[live], kind='stable')]
+        counts = np.bincount(assignments[live], minlength=self.nlist) if len(live) else np.zeros(self.nlist, dtype=np.int64)
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        self._list_slots = [order[bounds[l]:bounds[l + 1]].copy() for l in range(self.nlist)]
+        self._list_sizes = [int(count) for count in counts]
+
+    def _open_array(self, directory, name, dtype, shape):
+        array_path = os.path.join(directory, name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        # Grow (or create) the file first; memmap cannot extend it itself
+        with open(array_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(array_path, dtype=dtype, mode='r+', shape=shape)
+
+    def _ensure_capacity(self, needed):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._vectors.flush()
+        self._lists_file.flush()
+        del self._vectors, self._lists_file
+        self._vectors = self._open_array(self._dir, 'vectors.f32', np.float32, (capacity, self.dimension))
+        self._lists_file = self._open_array(self._dir, 'lists.i32', np.int32, (capacity,))
+        live = np.zeros(capacity, dtype=bool)
+        live[:self._capacity] = self._live
+        self._live = live
+        self._slot_ids.extend([None] * (capacity - self._capacity))
+        self._metadata.extend([None] * (capacity - self._capacity))
+        self._capacity = capacity
+
+    def _append_records(self, records):
+        if not records:
+            return
+        with open(os.path.join(self._dir, 'records.jsonl'), 'a') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _next_generation(self):
+        numbers = [int(name[len(self.GENERATION_PREFIX):]) for name in os.listdir(self.path)
+                   if name.startswith(self.GENERATION_PREFIX) and name[len(self.GENERATION_PREFIX):].isdigit()]
+        return f"{self.GENERATION_PREFIX}{max(numbers, default=0) + 1:06d}"
+
+    def _write_current(self, generation):
+        current_path = os.path.join(self.path, self.CURRENT_FILE)
+        with open(current_path + '.tmp', 'w') as f:
+            f.write(generation + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_path + '.tmp', current_path)
+
+    def _open_generation(self):
+        """Directory of the generation CURRENT names, after removing the others"""
+        current_path = os.path.join(self.path, self.CURRENT_FILE)
+        if os.path.exists(current_path):
+            with open(current_path) as f:
+                generation = f.read().strip()
+        elif any(os.path.exists(os.path.join(self.path, name)) for name in self.DATA_FILES):
+            # Written before generations: the files live in `path` itself
+            return self.path
+        else:
+            generation = self._next_generation()
+            os.makedirs(os.path.join(self.path, generation), exist_ok=True)
+            self._write_current(generation)
+        # Left over from a compaction that was interrupted, or replaced by one
+        for name in os.listdir(self.path):
+            if name.startswith(self.GENERATION_PREFIX) and name != generation:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        for name in self.DATA_FILES:
+            if os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        return os.path.join(self.path, generation)
+
+    def _load(self):
+        self._dir = self._open_generation()
+        records = []
+        records_path = os.path.join(self._dir, 'records.jsonl')
+        if os.path.exists(records_path):
+            with open(records_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        records.append(json.loads(line))
+        count = max((record['slot'] + 1 for record in records if 'slot' in record), default=0)
+
+        vectors_path = os.path.join(self._dir, 'vectors.f32')
+        on_disk = os.path.getsize(vectors_path) // (4 * self.dimension) if os.path.exists(vectors_path) else 0
+        self._capacity = max(self.INITIAL_CAPACITY, count, on_disk)
+        self._vectors = self._open_array(self._dir, 'vectors.f32', np.float32, (self._capacity, self.dimension))
+        self._lists_file = self._open_array(self._dir, 'lists.i32', np.int32, (self._capacity,))
+
+        centroids_path = os.path.join(self._dir, 'centroids.npy')
+        self._centroids = np.load(centroids_path) if os.path.exists(centroids_path) else None
+        if self._centroids is not None:
+            self.nlist = len(self._centroids)
+
+        self._count = count
+        self._rows = {}
+        self._live = np.zeros(self._capacity, dtype=bool)
+        self._slot_ids = [None] * self._capacity
+        self._metadata = [None] * self._capacity
+        self._list_slots = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+        self._list_sizes = [0] * self.nlist
+        for record in records:
+            if 'slot' in record:
+                self._add_slot(record['slot'], record['id'], record['metadata'], -1)
+            else:
+                slot = self._rows.pop(record['delete'], None)
+                if slot is not None:
+                    self._tombstone(slot)
+
+        if self.trained:
+            # Slots written while untrained, or by a crashed train(), have no list yet
+            assignments = np.asarray(self._lists_file[:count])
+            unassigned = np.flatnonzero((assignments < 0) & self._live[:count])
+            if len(unassigned):
+                self._lists_file[unassigned] = self._assign(np.asarray(self._vectors[unassigned]))
+                self._lists_file.flush()
+            self._rebuild_lists()
+        log.info("Opened IVF index %s (%d vectors, %d tombstones, %s)", self.path, self.live_count,
+                 self.tombstone_count, f"{self.nlist} lists" if self.trained else "untrained")
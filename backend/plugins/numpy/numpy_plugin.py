@@ -0,0 +1,264 @@
+# NumPy vector index plugin: in-process, memory-mapped alternative to Pinecone
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from app_logging import get_logger
+from plugins.interfaces.vector_db import VectorDBPlugin
+
+log = get_logger('plugins.numpy')
+
+
+class NumpyVectorIndex(VectorDBPlugin):
+    """Exact top-k cosine search over float32 vectors kept in a memory-mapped file.
+
+    The index is a directory holding `vectors.f32`, a (capacity, dimension)
+    array of unit-length rows, and `index.json` with the ids, metadata and
+    row count. Rows 0..count-1 are live; deletes move the last row into the
+    gap so a query is a single matrix-vector product over a contiguous slice.
+    Every upsert/delete is flushed to disk before it returns, or when the
+    enclosing bulk() block ends.
+
+    index.json is only replaced (write-then-rename) after the vectors it
+    points at are flushed, and a row it still names is never overwritten:
+    an overwritten or deleted id first becomes a hole (a null id), which is
+    committed before the last row is moved into it. After a crash the
+    files always agree; holes left behind are filled on load.
+
+    Matches are returned Pinecone-style, {'matches': [{'id', 'score',
+    'metadata'}]}, so OpenAIPlugin.search works against either backend.
+    """
+
+    INITIAL_CAPACITY = 1024
+    VECTORS_FILE = 'vectors.f32'
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, path, dimension=1536):
+        self.path = path
+        self.dimension = dimension
+        self._lock = threading.RLock()
+        self._bulk_depth = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ─── VectorDBPlugin ───────────────────────────────────────────────────────
+
+    def upsert(self, vectors):
+        """Insert or replace (id, values, metadata) tuples or {'id', 'values', 'metadata'} dicts"""
+        items = [self._normalize_item(item) for item in vectors]
+        if not items:
+            return {'upserted_count': 0}
+        with self._lock:
+            self._ensure_capacity(self._count + len(items))
+            for item_id, values, metadata in items:
+                # Replaced rows become holes: the committed index may still name them
+                previous = self._rows.get(item_id)
+                if previous is not None:
+                    self._make_hole(previous)
+                row = self._count
+                self._count += 1
+                self._rows[item_id] = row
+                self._ids.append(item_id)
+                self._metadata.append(metadata)
+                self._vectors[row] = values
+            self._commit()
+        return {'upserted_count': len(items)}
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        """Top `top_k` rows by cosine similarity.
+
+        `filter` restricts the candidates: a dict of metadata fields that must
+        be equal, or a predicate called with each row's metadata.
+        """
+        q = self._unit(vector)
+        if isinstance(filter, dict):
+            expected = filter
+            filter = lambda meta: all(meta.get(key) == value for key, value in expected.items())
+        with self._lock:
+            count = self._count
+            if count == 0:
+                return {'matches': []}
+            scores = self._vectors[:count] @ q
+            if filter is not None:
+                mask = np.fromiter(
+                    (meta is not None and filter(meta) for meta in self._metadata), dtype=bool, count=count
+                )
+                scores = np.where(mask, scores, -np.inf)
+            elif self._holes:
+                scores[sorted(self._holes)] = -np.inf
+            k = min(top_k, count)
+            # argpartition is O(n); only the k winners get sorted
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = []
+            for row in top:
+                if scores[row] == -np.inf:
+                    break
+                match = {'id': self._ids[row], 'score': float(scores[row])}
+                if include_metadata:
+                    match['metadata'] = self._metadata[row]
+                matches.append(match)
+        return {'matches': matches}
+
+    def delete(self, ids):
+        deleted = 0
+        with self._lock:
+            for item_id in ids:
+                row = self._rows.get(item_id)
+                if row is None:
+                    continue
+                self._make_hole(row)
+                deleted += 1
+            if deleted:
+                self._commit()
+        return {'deleted_count': deleted}
+
+    # ─── Helpers ──────────────────────────────────────────────────────────────
+
+    def __len__(self):
+        return len(self._rows)
+
+    @contextmanager
+    def bulk(self):
+        """Write index.json once when the block ends instead of after every upsert/delete.
+
+        Rewriting the metadata of the whole index per call makes loading in
+        batches quadratic; inside the block, writes are only durable once it
+        exits (normally or not). Blocks nest.
+        """
+        with self._lock:
+            self._bulk_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._bulk_depth -= 1
+                if not self._bulk_depth:
+                    self._commit()
+
+    def fetch(self, ids):
+        """{id: {'values', 'metadata'}} for the ids that exist"""
+        with self._lock:
+            return {
+                item_id: {'values': self._vectors[row].tolist(), 'metadata': self._metadata[row]}
+                for item_id, row in ((item_id, self._rows.get(item_id)) for item_id in ids)
+                if row is not None
+            }
+
+    def _normalize_item(self, item):
+        if isinstance(item, dict):
+            item_id, values, metadata = item['id'], item['values'], item.get('metadata')
+        else:
+            item_id, values = item[0], item[1]
+            metadata = item[2] if len(item) > 2 else None
+        return str(item_id), self._unit(values), metadata or {}
+
+    def _unit(self, values):
+        vector = np.asarray(values, dtype=np.float32)
+        if vector.shape != (self.dimension,):
+            raise ValueError(f"Expected a vector of dimension {self.dimension}, got shape {vector.shape}")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open_vectors(self, capacity):
+        vectors_path = self._file(self.VECTORS_FILE)
+        size = capacity * self.dimension * 4
+        # Grow (or create) the file first; memmap cannot extend it itself
+        with open(vectors_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(vectors_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+
+    def _make_hole(self, row):
+        del self._rows[self._ids[row]]
+        self._ids[row] = None
+        self._metadata[row] = None
+        self._holes.add(row)
+
+    def _commit(self):
+        """Persist the vectors, then the index; fill holes once they are committed"""
+        if self._bulk_depth:
+            return
+        self._flush()
+        if self._holes:
+            self._fill_holes()
+            self._flush()
+
+    def _fill_holes(self):
+        # Keep rows contiguous: move the last rows into the holes, lowest first
+        holes = sorted(self._holes)
+        self._holes = set()
+        lowest = 0
+        while lowest < len(holes):
+            last = self._count - 1
+            if holes[-1] == last:
+                holes.pop()
+            else:
+                row = holes[lowest]
+                lowest += 1
+                moved_id = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved_id
+                self._metadata[row] = self._metadata[last]
+                self._rows[moved_id] = row
+            self._ids.pop()
+            self._metadata.pop()
+            self._count -= 1
+
+    def _load(self):
+        index_path = self._file(self.INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                state = json.load(f)
+            if state['dimension'] != self.dimension:
+                raise ValueError(
+                    f"Index at {self.path} has dimension {state['dimension']}, not {self.dimension}"
+                )
+            self._ids = state['ids']
+            self._metadata = state['metadata']
+            capacity = state['capacity']
+        else:
+            self._ids, self._metadata = [], []
+            capacity = self.INITIAL_CAPACITY
+        self._count = len(self._ids)
+        self._rows = {item_id: row for row, item_id in enumerate(self._ids) if item_id is not None}
+        self._holes = {row for row, item_id in enumerate(self._ids) if item_id is None}
+        self._capacity = capacity
+        self._vectors = self._open_vectors(capacity)
+        if self._holes:
+            # Left by a crash between committing holes and filling them
+            self._fill_holes()
+            self._flush()
+        log.info("Opened vector index %s (%d vectors)", self.path, self._count)
+
+    def _ensure_capacity(self, needed):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        self._vectors.flush()
+        del self._vectors
+        self._vectors = self._open_vectors(capacity)
+        self._capacity = capacity
+
+    def _flush(self):
+        # Vectors first: the index must never name a row that is not on disk
+        self._vectors.flush()
+        state = {
+            'dimension': self.dimension,
+            'capacity': self._capacity,
+            'ids': self._ids,
+            'metadata': self._metadata,
+        }
+        # Write-then-rename so a crash never leaves a half-written index.json
+        tmp_path = self._file(self.INDEX_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._file(self.INDEX_FILE))
@@ -1,24 +1,156 @@
 # OpenAI plugin for embedding and search (plugin-based architecture)
-import openai
+import hashlib
+import os
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import llm_client
+from app_logging import get_logger
+from cache_utils import TTLCache
+
+log = get_logger('plugins.openai')
+
+
+def _pack(vector):
+    # float32 bytes: 6 KB for 1536 dimensions, against ~49 KB as a list of Python floats
+    return array('f', vector).tobytes()
+
+
+def _unpack(packed):
+    vector = array('f')
+    vector.frombytes(packed)
+    return vector.tolist()
+
 
 class OpenAIPlugin:
-    def __init__(self, api_key):
-        self.client = openai.OpenAI(api_key=api_key)
+    """Embeddings through OpenAI, batched for bulk indexing.
+
+    get_embeddings() sends as few requests as possible: texts whose vectors
+    are cached (by content hash) are skipped, duplicates are embedded once,
+    and the rest are packed into requests of at most MAX_BATCH_INPUTS texts
+    and MAX_BATCH_TOKENS tokens, up to `max_workers` of them in flight, each
+    holding an llm_client slot.
+    The cache holds `cache_size` vectors (EMBEDDING_CACHE_SIZE, default
+    5000, about 30 MB per process) packed as float32.
+    """
+    EMBEDDING_MODEL = llm_client.EMBEDDING_MODEL
+    # text-embedding-ada-002 accepts 8191 tokens per input and 2048 inputs per request
+    MAX_INPUT_TOKENS = 8191
+    MAX_BATCH_INPUTS = 2048
+    MAX_BATCH_TOKENS = 100_000
+    UPSERT_BATCH_SIZE = 100
+
+    def __init__(self, api_key=None, client=None, max_workers=4, cache_size=None):
+        # Without an explicit key or client, share the app's pooled client
+        if client is None:
+            if api_key:
+                from openai import OpenAI
+                client = OpenAI(api_key=api_key)
+            else:
+                client = llm_client.get_client()
+        self.client = client
+        self.max_workers = max_workers
+        if cache_size is None:
+            cache_size = int(os.getenv('EMBEDDING_CACHE_SIZE', '5000'))
+        # Vectors never change for a given text and model, so only size bounds the cache
+        self.cache = TTLCache(maxsize=cache_size, ttl=30 * 24 * 3600)
+
+    def content_hash(self, text):
+        return hashlib.sha256(f"{self.EMBEDDING_MODEL}\n{text}".encode('utf-8')).hexdigest()
 
     def get_embedding(self, text: str) -> list[float]:
-        response = self.client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return response.data[0].embedding
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts):
+        """One vector per text, in order"""
+        hashes = [self.content_hash(text) for text in texts]
+        vectors = {digest: _unpack(packed) for digest, packed in self.cache.get_many(hashes).items()}
+        pending = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in vectors:
+                pending.setdefault(digest, text)
+
+        if pending:
+            batches = self._batches(list(pending.items()))
+            log.debug("Embedding %d texts (%d cached) in %d request(s)",
+                      len(pending), len(texts) - len(pending), len(batches))
+            if len(batches) == 1:
+                results = [self._embed_batch(batches[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='embed') as pool:
+                    results = list(pool.map(self._embed_batch, batches))
+            for batch_vectors in results:
+                for digest, vector in batch_vectors:
+                    self.cache.set(digest, _pack(vector))
+                    vectors[digest] = vector
+
+        return [vectors[digest] for digest in hashes]
+
+    def _batches(self, items):
+        """Split (hash, text) pairs into requests within the input and token limits"""
+        batches, batch, batch_tokens = [], [], 0
+        for digest, text in items:
+            tokens = llm_client.estimate_tokens(text)
+            # Without tiktoken the estimate can be low, so every text is cut to a safe length
+            if tokens > self.MAX_INPUT_TOKENS or llm_client.get_encoding() is None:
+                # Keep the start of oversized documents rather than failing the batch
+                text = llm_client.truncate_tokens(text, self.MAX_INPUT_TOKENS)
+                tokens = min(tokens, self.MAX_INPUT_TOKENS)
+            if batch and (len(batch) >= self.MAX_BATCH_INPUTS or batch_tokens + tokens > self.MAX_BATCH_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append((digest, text))
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_batch(self, batch):
+        # Each request holds an LLM slot, so the pool stays within LLM_MAX_CONCURRENCY
+        with llm_client.llm_slot():
+            # Empty strings are rejected by the API
+            response = self.client.embeddings.create(
+                model=self.EMBEDDING_MODEL,
+                input=[text or ' ' for _, text in batch]
+            )
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [(digest, item.embedding) for (digest, _), item in zip(batch, ordered)]
 
     def search(self, pinecone_index, query: str, top_k=5):
         q_vec = self.get_embedding(query)
         results = pinecone_index.query(vector=q_vec, top_k=top_k)
         return results['matches']
 
-    def store_data(self, pinecone_index, texts, metadata):
-        embeddings = [self.get_embedding(t) for t in texts]
-        vectors = [(f"id_{i}", embeddings[i], metadata[i]) for i in range(len(texts))]
-        pinecone_index.upsert(vectors=vectors)
-        return {'status': 'success'}
+    def store_data(self, pinecone_index, texts, metadata, ids=None, batch_size=None):
+        """Embed `texts` and upsert them in fixed-size batches.
+
+        `ids` default to the texts' content hashes, so storing the same text
+        again overwrites its vector instead of adding a duplicate.
+        """
+        embeddings = self.get_embeddings(texts)
+        if ids is None:
+            ids = [self.content_hash(text)[:32] for text in texts]
+        vectors = list(zip(ids, embeddings, metadata))
+        batch_size = batch_size or self.UPSERT_BATCH_SIZE
+        # Local indexes write their metadata once for all the batches
+        bulk = getattr(pinecone_index, 'bulk', None)
+        with bulk() if bulk else nullcontext():
+            for start in range(0, len(vectors), batch_size):
+                pinecone_index.upsert(vectors=vectors[start:start + batch_size])
+        return {'status': 'success', 'upserted': len(vectors)}
+
+
+_shared_plugin = None
+_shared_plugin_lock = threading.Lock()
+
+
+def shared_plugin():
+    """Process-wide OpenAIPlugin on the pooled client, so its vector cache is shared"""
+    global _shared_plugin
+    if _shared_plugin is None:
+        with _shared_plugin_lock:
+            if _shared_plugin is None:
+                _shared_plugin = OpenAIPlugin()
+    return _shared_plugin
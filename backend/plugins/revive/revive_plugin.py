@@ -1,4 +1,3 @@
-import mysql.connector
 import os
 from functools import wraps
 import logging
@@ -21,6 +20,8 @@ def get_db_connection():
         logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
         raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
         
+    # Imported on first use so loading the plugin does not pull in the MySQL driver
+    import mysql.connector
     try:
         conn = mysql.connector.connect(
             host=os.environ.get('REVIVE_DB_HOST'),
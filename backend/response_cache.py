@@ -0,0 +1,135 @@
+"""
+Response cache for deterministic LLM prompts
+
+Answers are keyed by a hash of the normalized prompt (whitespace collapsed,
+case folded) and kept in two tiers: an in-process LRU for repeats on the
+same worker, and the ai_response_cache collection, shared by every worker
+and expired by a TTL index. A lookup may name a `scope` (e.g. a client id)
+that partitions the cache, so answers never cross scopes. With semantic
+lookups enabled, a scoped miss on the exact key embeds the prompt (or just
+its variable part, `similarity_text`) and serves the answer of the most
+similar cached prompt in the scope if it is close enough; the embedding is
+stored with the new answer so later near-duplicates can find it. Unscoped
+lookups are exact-match only.
+
+    AI_CACHE_TTL=604800          # seconds an answer is reused (7 days)
+    AI_CACHE_MEMORY_SIZE=256     # answers kept in process
+    AI_CACHE_SEMANTIC=0          # 1 to also serve near-duplicate prompts
+    AI_CACHE_SIMILARITY=0.97     # cosine similarity a near-duplicate needs
+    AI_CACHE_SEMANTIC_SCAN=500   # newest cached prompts compared per lookup
+"""
+import hashlib
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from app_logging import get_logger
+from cache_utils import TTLCache
+from mongo_db import MongoResponseCache
+import llm_client
+import metrics
+
+log = get_logger('ai.cache')
+
+# What lookup() learned about a prompt, handed back to store() on a miss
+Probe = namedtuple('Probe', 'key namespace embedding')
+
+
+def normalize_prompt(prompt):
+    return ' '.join(prompt.split()).casefold()
+
+
+class ResponseCache:
+    """Exact-match (and optionally near-match) cache for one kind of prompt"""
+
+    def __init__(self, namespace, ttl=604800, maxsize=256, semantic=False, similarity=0.97, scan=500):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.semantic = semantic
+        self.similarity = similarity
+        self.scan = scan
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def scoped_namespace(self, scope=None):
+        return self.namespace if scope is None else f"{self.namespace}|{scope}"
+
+    def key_for(self, prompt, scope=None):
+        namespace = self.scoped_namespace(scope)
+        return hashlib.sha256(f"{namespace}\n{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt, scope=None, similarity_text=None):
+        """(value, tier, probe); value is None on a miss, tier is memory/mongo/similar"""
+        namespace = self.scoped_namespace(scope)
+        key = self.key_for(prompt, scope)
+        value = self.memory.get(key)
+        if value is not None:
+            return self._hit(value, 'memory', Probe(key, namespace, None))
+
+        try:
+            entry = MongoResponseCache.get(key)
+        except Exception as e:
+            log.warning("Response cache read failed: %s", e)
+            entry = None
+        if entry is not None:
+            self._remember(key, entry)
+            return self._hit(entry['value'], 'mongo', Probe(key, namespace, None))
+
+        embedding = None
+        # Near matches only within a scope: a fixed prompt template makes unrelated
+        # requests look alike, so similar prompts from different scopes must not match
+        if self.semantic and scope is not None:
+            try:
+                embedding = llm_client.embed([normalize_prompt(similarity_text or prompt)])[0]
+                entry, score = self._nearest(namespace, embedding)
+                if entry is not None:
+                    log.debug("Near-duplicate prompt served from cache (similarity %.4f)", score)
+                    self._remember(key, entry)
+                    return self._hit(entry['value'], 'similar', Probe(key, namespace, embedding))
+            except Exception as e:
+                log.warning("Similarity lookup skipped: %s", e)
+
+        metrics.ai_response_cache_lookups.inc(self.namespace, 'miss')
+        return None, None, Probe(key, namespace, embedding)
+
+    def store(self, probe, value):
+        """Cache `value` as the answer to the prompt `probe` came from"""
+        self.memory.set(probe.key, value)
+        try:
+            MongoResponseCache.put(probe.key, probe.namespace, value, self.ttl, embedding=probe.embedding)
+        except Exception as e:
+            log.warning("Response cache write failed: %s", e)
+
+    def _hit(self, value, tier, probe):
+        metrics.ai_response_cache_lookups.inc(self.namespace, tier)
+        return value, tier, probe
+
+    def _remember(self, key, entry):
+        remaining = (entry['expires_at'] - datetime.utcnow()).total_seconds()
+        if remaining > 0:
+            self.memory.set(key, entry['value'], ttl=min(remaining, self.ttl))
+
+    def _nearest(self, namespace, embedding):
+        """(entry, similarity) of the closest cached prompt above the threshold, else (None, score)"""
+        entries = MongoResponseCache.recent_embeddings(namespace, self.scan)
+        if not entries:
+            return None, 0.0
+        import numpy as np
+        matrix = np.asarray([entry['embedding'] for entry in entries], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        scores = (matrix @ query) / np.maximum(norms, 1e-12)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        return (entries[best], score) if score >= self.similarity else (None, score)
+
+
+def from_env(namespace):
+    """ResponseCache for `namespace` configured from the AI_CACHE_* variables"""
+    return ResponseCache(
+        namespace,
+        ttl=int(os.getenv('AI_CACHE_TTL', '604800')),
+        maxsize=int(os.getenv('AI_CACHE_MEMORY_SIZE', '256')),
+        semantic=os.getenv('AI_CACHE_SEMANTIC', '').lower() in ('1', 'true', 'yes'),
+        similarity=float(os.getenv('AI_CACHE_SIMILARITY', '0.97')),
+        scan=int(os.getenv('AI_CACHE_SEMANTIC_SCAN', '500')),
+    )
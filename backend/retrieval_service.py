@@ -0,0 +1,189 @@
+"""
+Retrieval-augmented answers over the agency's own data
+
+One RetrievalService per process holds everything a question needs: the
+vector index (opened once), the shared embedding plugin with its cache of
+question embeddings, a short-lived cache of retrieved contexts, and the
+pooled LLM client. Per question, the work left is one index lookup (often
+cached) and one completion.
+
+Indexed documents carry metadata {'source', 'ref_id', 'title', 'text'} plus
+the owning 'client_id' (clients, calendar) or 'user_id' (chat history);
+embedding_sync.py keeps them fresh. Chat history is only ever retrieved for
+the user who owns it, and a caller limited to one client (client-role users)
+only sees that client's documents.
+
+    VECTOR_BACKEND=local           # or pinecone (see pinecone_setup.py)
+    VECTOR_INDEX_PATH=data/vector_index
+    VECTOR_INDEX_KIND=flat         # flat (exact) or ivf (approximate)
+    VECTOR_INDEX_DIMENSION=1536
+    RAG_TOP_K=5
+    RAG_CONTEXT_TTL=60             # seconds a question's retrieved context is reused
+"""
+import hashlib
+import os
+import threading
+
+from app_logging import get_logger
+from cache_utils import TTLCache
+from plugins.openai.openai_plugin import shared_plugin
+import llm_client
+
+log = get_logger('ai.retrieval')
+
+SOURCES = ('clients', 'content_calendar', 'chat')
+ANSWER_MODEL = "gpt-4"
+ANSWER_MAX_TOKENS = 800
+# Characters of each retrieved document placed in the prompt
+CONTEXT_CHARS = 1500
+
+SYSTEM_PROMPT = (
+    "You are the Genius Project assistant for a marketing agency. Answer the question using only "
+    "the numbered context below, citing the numbers you used like [1]. If the context does not "
+    "contain the answer, say so plainly."
+)
+
+
+def open_vector_index():
+    """The vector index configured by VECTOR_BACKEND / VECTOR_INDEX_*"""
+    backend = os.getenv('VECTOR_BACKEND', 'local').lower()
+    if backend == 'pinecone':
+        from pinecone_setup import initialize_pinecone
+        return PineconeIndex(initialize_pinecone())
+    path = os.getenv('VECTOR_INDEX_PATH', os.path.join('data', 'vector_index'))
+    dimension = int(os.getenv('VECTOR_INDEX_DIMENSION', '1536'))
+    if os.getenv('VECTOR_INDEX_KIND', 'flat').lower() == 'ivf':
+        from plugins.numpy.ivf_plugin import IVFVectorIndex
+        return IVFVectorIndex(path, dimension=dimension)
+    from plugins.numpy.numpy_plugin import NumpyVectorIndex
+    return NumpyVectorIndex(path, dimension=dimension)
+
+
+class PineconeIndex:
+    """Adapts a Pinecone Index to the local indexes' query/upsert/delete calls"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, vectors):
+        return self.index.upsert(vectors=vectors)
+
+    def delete(self, ids):
+        return self.index.delete(ids=list(ids))
+
+    def query(self, vector, top_k=5, include_metadata=True, filter=None):
+        if callable(filter):
+            raise ValueError("Pinecone filters must be metadata dicts")
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, filter=filter)
+
+
+class RetrievalService:
+    def __init__(self, index, embedder, context_ttl=60, top_k=5):
+        self.index = index
+        self.embedder = embedder
+        self.top_k = top_k
+        self.contexts = TTLCache(maxsize=2048, ttl=context_ttl)
+
+    @staticmethod
+    def normalize_question(question):
+        return ' '.join(question.split()).casefold()
+
+    def _filter(self, sources, user_id, client_id):
+        """Metadata filter limiting matches to `sources`, chat to `user_id`'s own and,
+        if `client_id` is given, everything else to that client's documents"""
+        sources = list(sources)
+        if isinstance(self.index, PineconeIndex):
+            shared = [source for source in sources if source != 'chat']
+            clauses = []
+            if shared:
+                clause = {'source': {'$in': shared}}
+                if client_id is not None:
+                    clause['client_id'] = str(client_id)
+                clauses.append(clause)
+            if 'chat' in sources and user_id:
+                clauses.append({'source': 'chat', 'user_id': str(user_id)})
+            return {'$or': clauses} if len(clauses) > 1 else (clauses[0] if clauses else {'source': '-'})
+
+        def allowed(meta):
+            source = meta.get('source')
+            if source not in sources:
+                return False
+            if source == 'chat':
+                return user_id is not None and meta.get('user_id') == str(user_id)
+            return client_id is None or meta.get('client_id') == str(client_id)
+        return allowed
+
+    def retrieve(self, question, sources=SOURCES, user_id=None, client_id=None, top_k=None):
+        """The top matches for `question`, cached briefly per (question, scope)"""
+        top_k = top_k or self.top_k
+        normalized = self.normalize_question(question)
+        key = hashlib.sha256(
+            f"{normalized}\n{sorted(sources)}\n{user_id}\n{client_id}\n{top_k}".encode('utf-8')
+        ).hexdigest()
+        matches = self.contexts.get(key)
+        if matches is not None:
+            return matches
+        # The plugin caches vectors by content hash, so a repeated question is not re-embedded
+        vector = self.embedder.get_embedding(normalized)
+        result = self.index.query(vector, top_k=top_k, include_metadata=True,
+                                  filter=self._filter(sources, user_id, client_id))
+        matches = [
+            {'id': match['id'], 'score': float(match['score']), 'metadata': dict(match.get('metadata') or {})}
+            for match in result['matches']
+        ]
+        self.contexts.set(key, matches)
+        return matches
+
+    def ask(self, question, sources=SOURCES, user_id=None, client_id=None, top_k=None):
+        """{'answer', 'sources'} for `question`, grounded in the retrieved documents"""
+        matches = self.retrieve(question, sources=sources, user_id=user_id, client_id=client_id, top_k=top_k)
+        if not matches:
+            return {'answer': "I couldn't find anything relevant to that in our data.", 'sources': []}
+
+        context = '\n\n'.join(
+            f"[{number}] ({match['metadata'].get('source')}: {match['metadata'].get('title', '')})\n"
+            f"{match['metadata'].get('text', '')[:CONTEXT_CHARS]}"
+            for number, match in enumerate(matches, start=1)
+        )
+        response = llm_client.chat_completion(
+            [
+                {"role": "system", "content": f"{SYSTEM_PROMPT}\n\nContext:\n{context}"},
+                {"role": "user", "content": question},
+            ],
+            model=ANSWER_MODEL,
+            max_tokens=ANSWER_MAX_TOKENS,
+            temperature=0.2
+        )
+        return {
+            'answer': response.choices[0].message.content,
+            'sources': [
+                {
+                    'number': number,
+                    'source': match['metadata'].get('source'),
+                    'ref_id': match['metadata'].get('ref_id'),
+                    'title': match['metadata'].get('title'),
+                    'score': round(match['score'], 4),
+                }
+                for number, match in enumerate(matches, start=1)
+            ]
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """The process-wide RetrievalService, built on first use"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RetrievalService(
+                    open_vector_index(),
+                    shared_plugin(),
+                    context_ttl=int(os.getenv('RAG_CONTEXT_TTL', '60')),
+                    top_k=int(os.getenv('RAG_TOP_K', '5')),
+                )
+                log.info("Retrieval service ready (%s)", type(_service.index).__name__)
+    return _service
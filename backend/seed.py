@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Seed MongoDB with the sample clients and login users
+
+Usage:
+    python seed.py [--force] [--reset-passwords] [--dry-run]
+
+Run once per database (e.g. after deploying to a fresh cluster); the app
+itself no longer seeds anything on startup. Seeding is idempotent: records
+are upserted by name / email and existing ones are never modified, and a
+`seed` marker in schema_versions makes later runs exit without writing
+until SEED_VERSION is bumped. --force re-applies the current version and
+--reset-passwords also resets the sample users' passwords.
+
+Passwords come from SEED_ADMIN_PASSWORD / SEED_TEST_PASSWORD, falling back
+to the documented development defaults.
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from app_logging import configure_logging
+from mongo_db import mongo, MongoClientModel, MongoSchemaVersion, MongoUser
+
+# Bump when the sample data below changes, so existing databases pick it up
+SEED_VERSION = 1
+
+SAMPLE_CLIENTS = [
+    {
+        'name': 'Action Labs',
+        'email': 'contact@action-labs.ai',
+        'phone': '+1-555-0123',
+        'website': 'https://action-labs.ai',
+        'industry': 'Technology',
+        'contact': None,
+        'description': 'AI-powered development agency',
+        'status': 'active',
+    },
+    {
+        'name': 'Sample Client',
+        'email': 'client@example.com',
+        'phone': '+1-555-0456',
+        'website': 'https://example.com',
+        'industry': 'Business',
+        'contact': None,
+        'description': 'Sample client for testing',
+        'status': 'active',
+    },
+]
+
+
+def sample_users():
+    return [
+        {'name': 'Admin', 'email': 'admin@example.com',
+         'password': os.getenv('SEED_ADMIN_PASSWORD', 'admin123'), 'role': 'admin', 'is_admin': True},
+        {'name': 'Test User', 'email': 'testuser@example.com',
+         'password': os.getenv('SEED_TEST_PASSWORD', 'testpass'), 'role': 'user', 'is_admin': False},
+    ]
+
+
+def seed(force=False, reset_passwords=False):
+    """Apply the sample data; returns the number of records created (None if already seeded)"""
+    current = MongoSchemaVersion.get('seed')
+    if current >= SEED_VERSION and not (force or reset_passwords):
+        return None
+
+    created = 0
+    for client_doc in SAMPLE_CLIENTS:
+        if MongoClientModel.ensure_client(client_doc):
+            created += 1
+            print(f"Created client {client_doc['name']}")
+    for user in sample_users():
+        _, was_created = MongoUser.ensure_user(
+            user['name'], user['email'], user['password'],
+            role=user['role'], is_admin=user['is_admin'], reset_password=reset_passwords
+        )
+        if was_created:
+            created += 1
+            print(f"Created user {user['email']}")
+        elif reset_passwords:
+            print(f"Reset password of {user['email']}")
+    MongoSchemaVersion.set('seed', SEED_VERSION)
+    return created
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help='re-apply even if this seed version is recorded')
+    parser.add_argument('--reset-passwords', action='store_true', help="reset the sample users' passwords")
+    parser.add_argument('--dry-run', action='store_true', help='only report the recorded seed version')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    configure_logging()
+    if not mongo.connect(os.getenv('MONGODB_URI')):
+        return 2
+
+    current = MongoSchemaVersion.get('seed')
+    print(f"Seed version: database {current}, code {SEED_VERSION}")
+    if args.dry_run:
+        return 0
+    created = seed(force=args.force, reset_passwords=args.reset_passwords)
+    if created is None:
+        print("Already seeded; nothing to do (use --force to re-apply)")
+    else:
+        print(f"Seeded: {created} record(s) created")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
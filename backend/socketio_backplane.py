@@ -0,0 +1,84 @@
+"""
+Socket.IO deployment options and the in-process pub/sub backplane
+
+By default the chat server runs as a single threading-mode process, as before.
+Setting SOCKETIO_MESSAGE_QUEUE puts every worker on a shared pub/sub channel so
+that emit(..., room=f'channel_{id}') reaches clients connected to any worker:
+
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0   # Redis pub/sub
+    SOCKETIO_MESSAGE_QUEUE=amqp://guest@localhost//   # RabbitMQ via kombu
+    SOCKETIO_MESSAGE_QUEUE=local://                   # in-process, for tests
+
+    SOCKETIO_ASYNC_MODE=eventlet                      # threading | eventlet | gevent
+
+Running N workers (eventlet shown; gevent works the same with -k gevent):
+
+    SOCKETIO_ASYNC_MODE=eventlet SOCKETIO_MESSAGE_QUEUE=redis://... \
+        gunicorn -k eventlet -w 1 --bind 0.0.0.0:5002 app:app   # repeat per port
+
+Socket.IO's long-polling transport needs every request of a session to hit the
+same worker, so put the per-port workers behind a load balancer with sticky
+sessions (e.g. nginx ip_hash). Clients that connect with
+transports: ['websocket'] have no such requirement, and can be served by a
+single `gunicorn -k eventlet -w N` instead.
+"""
+import json
+import os
+import queue
+import threading
+from collections import defaultdict
+
+import socketio
+
+LOCAL_QUEUE_URL = 'local://'
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Pub/sub backplane whose "network" is a set of queues in this process.
+
+    Every manager created on the same channel receives what the others publish,
+    so tests can run several SocketIO servers side by side and check that room
+    broadcasts cross between them. Messages are JSON round-tripped, as they
+    would be on a real queue.
+    """
+    name = 'local'
+
+    _subscribers = defaultdict(list)
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, url=LOCAL_QUEUE_URL, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._inbox = queue.Queue()
+        if not write_only:
+            with self._subscribers_lock:
+                self._subscribers[channel].append(self._inbox)
+
+    def _publish(self, data):
+        payload = json.dumps(data)
+        with self._subscribers_lock:
+            inboxes = list(self._subscribers[self.channel])
+        for inbox in inboxes:
+            inbox.put(payload)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+    @classmethod
+    def reset(cls):
+        """Forget every subscriber (between tests)"""
+        with cls._subscribers_lock:
+            cls._subscribers.clear()
+
+
+def socketio_options():
+    """Keyword arguments for SocketIO() taken from the environment"""
+    options = {'async_mode': os.getenv('SOCKETIO_ASYNC_MODE', 'threading')}
+    url = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    channel = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    if url == LOCAL_QUEUE_URL:
+        options['client_manager'] = LocalPubSubManager(channel=channel)
+    elif url:
+        options['message_queue'] = url
+        options['channel'] = channel
+    return options
@@ -0,0 +1,80 @@
+"""
+access_tokens: login, refresh rotation and revocation
+
+    cd backend && python -m pytest test_access_tokens.py
+"""
+import uuid
+
+import pytest
+
+pytest.importorskip('mongomock')
+
+# Answers 400 for an empty question once past require_auth, 401 before it
+PROTECTED = '/api/ai/ask'
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app as app_module
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def tokens(client):
+    from mongo_db import MongoUser
+    email = f"{uuid.uuid4().hex}@example.com"
+    MongoUser.create_user('Token Test', email, 'secret-pw', role='employee')
+    response = client.post('/login', json={'email': email, 'password': 'secret-pw'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _bearer(token):
+    return {'Authorization': f"Bearer {token}"}
+
+
+def test_access_token_authenticates(client, tokens):
+    assert client.post(PROTECTED, json={}).status_code == 401
+    assert client.post(PROTECTED, json={}, headers=_bearer(tokens['access_token'])).status_code == 400
+    assert client.post(PROTECTED, json={}, headers=_bearer('not-a-token')).status_code == 401
+
+
+def test_refresh_token_is_not_an_access_token(client, tokens):
+    assert client.post(PROTECTED, json={}, headers=_bearer(tokens['refresh_token'])).status_code == 401
+
+
+def test_refresh_rotates_and_revokes_the_old_refresh_token(client, tokens):
+    response = client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert client.post(PROTECTED, json={}, headers=_bearer(rotated['access_token'])).status_code == 400
+    # A replayed refresh token is refused
+    replay = client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert replay.status_code == 401
+
+
+def test_logout_revokes_both_tokens(client, tokens):
+    headers = _bearer(tokens['access_token'])
+    assert client.post('/api/auth/logout', json={'refresh_token': tokens['refresh_token']}, headers=headers).status_code == 200
+    assert client.post(PROTECTED, json={}, headers=headers).status_code == 401
+    assert client.post('/api/auth/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 401
+
+
+def test_revocations_reach_other_processes(client, tokens):
+    import access_tokens
+    user = access_tokens.verify(tokens['access_token'])
+    access_tokens.revoke(user)
+    # Another worker's list only learns of it from MongoDB
+    other = access_tokens.RevocationList(sync_interval=0)
+    assert other.is_revoked(user)
+
+
+def test_revoke_user_covers_every_token_issued_so_far(client, tokens):
+    import access_tokens
+    user = access_tokens.verify(tokens['access_token'])
+    access_tokens.revoke_user(user.id)
+    with pytest.raises(access_tokens.InvalidToken):
+        access_tokens.verify(tokens['access_token'])
+    with pytest.raises(access_tokens.InvalidToken):
+        access_tokens.verify(tokens['refresh_token'], refresh=True)
+    assert access_tokens.RevocationList(sync_interval=0).is_revoked(user)
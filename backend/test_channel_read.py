@@ -0,0 +1,54 @@
+"""
+POST /api/channels/<id>/read, called the way ChatPage.js calls it
+
+Runs the app against an in-memory MongoDB (mongomock, see conftest.py):
+
+    cd backend && python -m pytest test_channel_read.py
+"""
+import pytest
+
+pytest.importorskip('mongomock')
+
+
+@pytest.fixture(scope='module')
+def client():
+    # conftest.py points the app at mongomock
+    import app as app_module
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def channel(client):
+    from mongo_db import MongoChannel, MongoMessage
+    channel = MongoChannel.create_channel('general', False, ['u1', 'u2'], 'u1')
+    channel_id = str(channel['_id'])
+    first = MongoMessage.create_message(channel_id, 'u2', 'hello')
+    second = MongoMessage.create_message(channel_id, 'u2', 'again')
+    return channel_id, first, second
+
+
+def _read_at(user_id, channel_id):
+    from mongo_db import MongoChannelRead
+    return MongoChannelRead.find_for_user(user_id, [channel_id]).get(channel_id)
+
+
+def test_frontend_payload_marks_read_up_to_message(client, channel):
+    channel_id, first, _ = channel
+    # Exactly what ChatPage.js sends: a JSON body, no query string
+    response = client.post(f'/api/channels/{channel_id}/read', json={'user_id': 'u1', 'message_id': str(first['_id'])})
+    assert response.status_code == 200
+    # BSON dates keep milliseconds
+    assert _read_at('u1', channel_id) == first['created_at'].replace(microsecond=first['created_at'].microsecond // 1000 * 1000)
+
+
+def test_unknown_message_reads_up_to_now(client, channel):
+    channel_id, _, second = channel
+    response = client.post(f'/api/channels/{channel_id}/read', json={'user_id': 'u3', 'message_id': 'not-stored-yet'})
+    assert response.status_code == 200
+    assert _read_at('u3', channel_id) >= second['created_at'].replace(microsecond=0)
+
+
+def test_user_id_is_required(client, channel):
+    channel_id, first, _ = channel
+    response = client.post(f'/api/channels/{channel_id}/read', json={'message_id': str(first['_id'])})
+    assert response.status_code == 400
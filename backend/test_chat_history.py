@@ -0,0 +1,78 @@
+"""
+chat_history.build_prompt: the token budget and the rolling summary
+
+    cd backend && python -m pytest test_chat_history.py
+"""
+import pytest
+
+import chat_history
+from llm_client import estimate_tokens
+
+
+def _text(tokens):
+    """Text of at least `tokens` tokens, whatever the tokenizer"""
+    words = []
+    while estimate_tokens(' '.join(words)) < tokens:
+        words.append('word')
+    return ' '.join(words)
+
+
+def _history(count, tokens_each):
+    content = _text(tokens_each)
+    return [
+        {'seq': seq, 'role': 'user' if seq % 2 == 0 else 'assistant', 'content': f"{seq} {content}"}
+        for seq in range(count)
+    ]
+
+
+def _prompt_tokens(messages):
+    return sum(chat_history.message_tokens(message) for message in messages)
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    """Stub the summarizer and record what it folds and what gets saved"""
+    folded, saved = [], []
+
+    def summarize(previous, messages):
+        folded.append([message['seq'] for message in messages])
+        # As long as a summary may get
+        return _text(chat_history.SUMMARY_MAX_TOKENS)
+
+    monkeypatch.setattr(chat_history, '_summarize', summarize)
+    monkeypatch.setattr(chat_history.MongoChatConversation, 'save_summary',
+                        staticmethod(lambda conversation_id, text, upto: saved.append(upto)))
+    return folded, saved
+
+
+def test_short_thread_is_sent_verbatim(summaries):
+    folded, _ = summaries
+    history = _history(4, 20)
+    messages = chat_history.build_prompt({'_id': 'c1'}, 'next question', history=history)
+    assert [message['content'] for message in messages[1:-1]] == [message['content'] for message in history]
+    assert folded == []
+
+
+def test_long_thread_fits_the_budget_and_folds_older_turns(summaries):
+    folded, saved = summaries
+    history = _history(60, 150)
+    messages = chat_history.build_prompt({'_id': 'c1'}, 'next question', history=history)
+
+    assert _prompt_tokens(messages) <= chat_history.HISTORY_TOKEN_BUDGET
+    assert messages[1]['content'].startswith(chat_history.SUMMARY_PREFIX)
+    # Everything before the verbatim window went into the summary, newest turns kept
+    kept = [int(message['content'].split()[0]) for message in messages[2:-1]]
+    assert kept == list(range(kept[0], 60))
+    assert folded == [list(range(kept[0]))]
+    assert saved == [kept[0]]
+    assert messages[-1] == {'role': 'user', 'content': 'next question'}
+
+
+def test_stored_summary_is_reused_while_the_window_fits(summaries):
+    folded, _ = summaries
+    history = _history(4, 20)
+    conversation = {'_id': 'c1', 'summary': {'text': 'They discussed the launch plan.', 'upto': 40}}
+    messages = chat_history.build_prompt(conversation, 'next question', history=history)
+    assert messages[1]['content'] == chat_history.SUMMARY_PREFIX + 'They discussed the launch plan.'
+    assert len(messages) == len(history) + 3
+    assert folded == []
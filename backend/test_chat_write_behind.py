@@ -0,0 +1,85 @@
+"""
+chat_write_behind.MessageWriteBehind: batching, retries and flush on exit
+
+    cd backend && python -m pytest test_chat_write_behind.py
+"""
+import uuid
+
+import pytest
+
+pytest.importorskip('mongomock')
+
+from chat_write_behind import MessageWriteBehind
+from mongo_db import MongoMessage, mongo
+
+
+@pytest.fixture
+def channel_id():
+    return f"channel-{uuid.uuid4().hex}"
+
+
+@pytest.fixture
+def callbacks():
+    committed, failed = [], []
+    return committed, failed, {
+        'on_commit': lambda entries: committed.extend(entries),
+        'on_error': lambda entries, exc: failed.extend(entries),
+    }
+
+
+def _stored(channel_id):
+    return [doc['content'] for doc in mongo.get_collection('messages').find({'channel_id': channel_id}).sort('_id', 1)]
+
+
+def test_stop_flushes_pending_messages(channel_id, callbacks):
+    committed, failed, hooks = callbacks
+    # A long interval: nothing would be written before stop() without the flush
+    writer = MessageWriteBehind(interval=60, max_batch=1000, **hooks).start()
+    for index in range(5):
+        writer.submit(MongoMessage.build_message(channel_id, 'u1', f"m{index}"), context=index)
+    writer.stop()
+
+    assert _stored(channel_id) == [f"m{index}" for index in range(5)]
+    assert [context for _, context in committed] == list(range(5))
+    assert failed == []
+    with pytest.raises(RuntimeError):
+        writer.submit(MongoMessage.build_message(channel_id, 'u1', 'late'))
+
+
+def test_retry_after_a_partial_insert_stores_each_message_once(channel_id, callbacks, monkeypatch):
+    committed, failed, hooks = callbacks
+    insert_batch = MongoMessage.insert_batch
+    attempts = []
+
+    def flaky(docs):
+        attempts.append(len(docs))
+        insert_batch(docs)
+        if len(attempts) == 1:
+            # The write went through but the reply was lost
+            raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(MongoMessage, 'insert_batch', staticmethod(flaky))
+    writer = MessageWriteBehind(interval=60, **hooks).start()
+    for index in range(3):
+        writer.submit(MongoMessage.build_message(channel_id, 'u1', f"m{index}"))
+    assert writer.flush(timeout=5)
+    writer.stop()
+
+    assert attempts == [3, 3]
+    assert _stored(channel_id) == ['m0', 'm1', 'm2']
+    assert len(committed) == 3 and failed == []
+
+
+def test_batch_is_reported_failed_after_the_last_retry(channel_id, callbacks, monkeypatch):
+    committed, failed, hooks = callbacks
+
+    def down(docs):
+        raise ConnectionError("no primary")
+
+    monkeypatch.setattr(MongoMessage, 'insert_batch', staticmethod(down))
+    writer = MessageWriteBehind(interval=60, max_retries=1, **hooks).start()
+    writer.submit(MongoMessage.build_message(channel_id, 'u1', 'lost'), context='sid-1')
+    writer.stop()
+
+    assert committed == []
+    assert [context for _, context in failed] == ['sid-1']
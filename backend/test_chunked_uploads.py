@@ -0,0 +1,94 @@
+"""
+chunked_uploads: offset checks and repeated finalize
+
+    cd backend && python -m pytest test_chunked_uploads.py
+"""
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip('mongomock')
+
+DATA = os.urandom(3000)
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app as app_module
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def upload_folder(client, tmp_path, monkeypatch):
+    import app as app_module
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    return tmp_path
+
+
+def _open(client):
+    response = client.post('/api/uploads', json={
+        'filename': 'clip.mp4', 'size': len(DATA), 'sha256': hashlib.sha256(DATA).hexdigest()
+    })
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def _put(client, upload_id, start, end):
+    return client.put(f"/api/uploads/{upload_id}", data=DATA[start:end],
+                      headers={'Content-Range': f"bytes {start}-{end - 1}/{len(DATA)}"})
+
+
+def test_chunk_at_the_wrong_offset_is_refused(client, upload_folder):
+    upload_id = _open(client)
+    assert _put(client, upload_id, 0, 1000).get_json()['offset'] == 1000
+
+    # Resent first chunk, then a gap
+    for start in (0, 2000):
+        response = _put(client, upload_id, start, start + 1000)
+        assert response.status_code == 409
+        assert response.get_json()['offset'] == 1000
+
+    assert _put(client, upload_id, 1000, 3000).get_json()['offset'] == len(DATA)
+    assert client.get(f"/api/uploads/{upload_id}").get_json()['offset'] == len(DATA)
+
+
+def test_retried_complete_gets_the_same_answer(client, upload_folder):
+    upload_id = _open(client)
+    _put(client, upload_id, 0, len(DATA))
+
+    first = client.post(f"/api/uploads/{upload_id}/complete")
+    assert first.status_code == 200
+    again = client.post(f"/api/uploads/{upload_id}/complete")
+    assert again.status_code == 200
+    assert again.get_json() == first.get_json()
+    assert first.get_json()['sha256'] == hashlib.sha256(DATA).hexdigest()
+    with open(upload_folder / first.get_json()['filename'], 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_complete_after_a_finalize_that_died_after_the_move(client, upload_folder):
+    import chunked_uploads
+    from mongo_db import MongoUploadSession
+    upload_id = _open(client)
+    _put(client, upload_id, 0, len(DATA))
+
+    # The part file was moved into place but the session never marked complete
+    session = MongoUploadSession.find(upload_id)
+    filename = chunked_uploads._stored_filename(session)
+    os.replace(upload_folder / chunked_uploads.PARTIAL_DIR / f"{upload_id}.part", upload_folder / filename)
+
+    response = client.post(f"/api/uploads/{upload_id}/complete")
+    assert response.status_code == 200
+    assert response.get_json()['filename'] == filename
+    assert MongoUploadSession.find(upload_id)['status'] == 'complete'
+
+
+def test_complete_with_the_data_gone(client, upload_folder):
+    import chunked_uploads
+    upload_id = _open(client)
+    _put(client, upload_id, 0, len(DATA))
+    os.remove(upload_folder / chunked_uploads.PARTIAL_DIR / f"{upload_id}.part")
+
+    assert client.post(f"/api/uploads/{upload_id}/complete").status_code == 410
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
@@ -0,0 +1,66 @@
+"""
+MongoMessage.find_page: keyset cursors over (created_at, _id)
+
+    cd backend && python -m pytest test_message_pages.py
+"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('mongomock')
+
+from mongo_db import MongoMessage, mongo
+
+
+@pytest.fixture
+def channel():
+    """A channel of 7 messages, three of them sent in the same millisecond"""
+    channel_id = f"channel-{uuid.uuid4().hex}"
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    offsets = [0, 1, 2, 2, 2, 3, 4]
+    docs = []
+    for index, offset in enumerate(offsets):
+        doc = MongoMessage.build_message(channel_id, 'u1', f"message {index}")
+        doc['created_at'] = start + timedelta(seconds=offset)
+        docs.append(doc)
+    mongo.get_collection('messages').insert_many(docs)
+    return channel_id, [doc['_id'] for doc in sorted(docs, key=lambda doc: (doc['created_at'], doc['_id']))]
+
+
+def _ids(messages):
+    return [message['_id'] for message in messages]
+
+
+def test_latest_page_then_older_pages(channel):
+    channel_id, expected = channel
+    page, has_more = MongoMessage.find_page(channel_id, limit=3)
+    pages = [_ids(page)]
+    while has_more:
+        page, has_more = MongoMessage.find_page(channel_id, before=MongoMessage.encode_cursor(page[0]), limit=3)
+        pages.insert(0, _ids(page))
+    assert pages[-1] == expected[-3:]
+    # Ties on created_at are split by _id: nothing skipped or repeated
+    assert sum(pages, []) == expected
+
+
+def test_newer_pages_from_a_cursor(channel):
+    channel_id, expected = channel
+    first = mongo.get_collection('messages').find_one({'_id': expected[0]})
+    page, has_more = MongoMessage.find_page(channel_id, after=MongoMessage.encode_cursor(first), limit=4)
+    assert _ids(page) == expected[1:5] and has_more
+    page, has_more = MongoMessage.find_page(channel_id, after=MongoMessage.encode_cursor(page[-1]), limit=4)
+    assert _ids(page) == expected[5:] and not has_more
+
+
+def test_cursor_round_trip():
+    doc = MongoMessage.build_message('c', 'u1', 'hi')
+    created_at, oid = MongoMessage.decode_cursor(MongoMessage.encode_cursor(doc))
+    assert oid == doc['_id']
+    # Cursors carry milliseconds, which is all BSON stores
+    assert created_at == doc['created_at'].replace(microsecond=doc['created_at'].microsecond // 1000 * 1000)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        MongoMessage.decode_cursor('123_not-an-object-id')
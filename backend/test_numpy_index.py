@@ -0,0 +1,80 @@
+"""
+plugins.numpy.numpy_plugin.NumpyVectorIndex: persistence, holes and bulk()
+
+    cd backend && python -m pytest test_numpy_index.py
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from plugins.numpy.numpy_plugin import NumpyVectorIndex
+
+DIMENSION = 8
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    rows = rng.standard_normal((20, DIMENSION)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def _assert_rows_match(index, vectors, ids):
+    stored = index.fetch([str(i) for i in ids])
+    for i in ids:
+        assert np.allclose(stored[str(i)]['values'], vectors[i], atol=1e-6)
+        assert stored[str(i)]['metadata'] == {'n': i}
+
+
+def test_reload_fills_holes_left_by_a_crash(tmp_path, vectors):
+    index = NumpyVectorIndex(str(tmp_path), dimension=DIMENSION)
+    index.upsert([(str(i), vectors[i], {'n': i}) for i in range(10)])
+
+    # A crash after the holes were committed but before the last rows moved into them
+    index_path = os.path.join(str(tmp_path), NumpyVectorIndex.INDEX_FILE)
+    with open(index_path) as f:
+        state = json.load(f)
+    for row in (2, 9):
+        state['ids'][row] = None
+        state['metadata'][row] = None
+    with open(index_path, 'w') as f:
+        json.dump(state, f)
+
+    reopened = NumpyVectorIndex(str(tmp_path), dimension=DIMENSION)
+    live = [0, 1, 3, 4, 5, 6, 7, 8]
+    assert len(reopened) == len(live)
+    _assert_rows_match(reopened, vectors, live)
+    with open(index_path) as f:
+        assert None not in json.load(f)['ids']
+    assert reopened.query(vectors[8], top_k=1)['matches'][0]['id'] == '8'
+
+
+def test_deletes_and_overwrites_survive_a_reload(tmp_path, vectors):
+    index = NumpyVectorIndex(str(tmp_path), dimension=DIMENSION)
+    index.upsert([(str(i), vectors[i], {'n': i}) for i in range(10)])
+    index.delete(['0', '4'])
+    index.upsert([('5', vectors[15], {'n': 15})])
+
+    reopened = NumpyVectorIndex(str(tmp_path), dimension=DIMENSION)
+    assert len(reopened) == 8
+    _assert_rows_match(reopened, vectors, [1, 2, 3, 6, 7, 8, 9])
+    assert np.allclose(reopened.fetch(['5'])['5']['values'], vectors[15], atol=1e-6)
+
+
+def test_bulk_writes_the_index_once(tmp_path, vectors, monkeypatch):
+    index = NumpyVectorIndex(str(tmp_path), dimension=DIMENSION)
+    writes = []
+    flush = index._flush
+    monkeypatch.setattr(index, '_flush', lambda: (writes.append(1), flush()))
+    with index.bulk():
+        for start in range(0, 20, 5):
+            index.upsert([(str(i), vectors[i], {'n': i}) for i in range(start, start + 5)])
+        index.delete(['3'])
+        # Deleted rows are holes until the block ends, and never match
+        assert all(match['id'] != '3' for match in index.query(vectors[3], top_k=20)['matches'])
+    assert len(writes) == 2  # the holes are committed, then filled
+    reopened = NumpyVectorIndex(str(tmp_path), dimension=DIMENSION)
+    assert len(reopened) == 19
+    _assert_rows_match(reopened, vectors, [i for i in range(20) if i != 3])
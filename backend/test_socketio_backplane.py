@@ -0,0 +1,84 @@
+"""
+Room broadcasts crossing workers through socketio_backplane.LocalPubSubManager
+
+Two Flask-SocketIO servers share the in-process channel, as workers share
+Redis in production; a real Socket.IO client connects to one of them
+(Flask-SocketIO's test client refuses pub/sub managers).
+
+    cd backend && python -m pytest test_socketio_backplane.py
+"""
+import threading
+import time
+
+import pytest
+import socketio
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from werkzeug.serving import make_server
+
+from socketio_backplane import LocalPubSubManager
+
+
+@pytest.fixture
+def workers():
+    LocalPubSubManager.reset()
+    started = []
+
+    def start():
+        """(socketio, url) of a new worker subscribed to the shared channel"""
+        app = Flask(__name__)
+        server = SocketIO(app, async_mode='threading', client_manager=LocalPubSubManager())
+
+        @server.on('join')
+        def on_join(data):
+            join_room(data['room'])
+            return True
+
+        http = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=http.serve_forever, daemon=True).start()
+        started.append(http)
+        return server, f"http://127.0.0.1:{http.server_port}"
+
+    yield start
+    for http in started:
+        http.shutdown()
+    LocalPubSubManager.reset()
+
+
+def _listen(url, room):
+    """A client connected to `url` that has joined `room`, and its received events"""
+    received = []
+    client = socketio.Client()
+    client.on('new_message', received.append)
+    client.connect(url, transports=['polling'])
+    assert client.call('join', {'room': room}, timeout=5)
+    return client, received
+
+
+def _wait_for(received, timeout):
+    deadline = time.monotonic() + timeout
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return received
+
+
+def test_room_emit_reaches_a_client_of_another_worker(workers):
+    worker_a, _ = workers()
+    _, url_b = workers()
+    client, received = _listen(url_b, 'channel_1')
+    try:
+        worker_a.emit('new_message', {'content': 'hello'}, room='channel_1')
+        assert _wait_for(received, timeout=5) == [{'content': 'hello'}]
+    finally:
+        client.disconnect()
+
+
+def test_other_rooms_do_not_receive_it(workers):
+    worker_a, _ = workers()
+    _, url_b = workers()
+    client, received = _listen(url_b, 'channel_2')
+    try:
+        worker_a.emit('new_message', {'content': 'hello'}, room='channel_1')
+        assert _wait_for(received, timeout=0.5) == []
+    finally:
+        client.disconnect()
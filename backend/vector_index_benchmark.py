@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Recall vs latency of the IVF vector index against exact search
+
+Builds an IVFVectorIndex over a corpus, then for each nprobe setting reports
+recall@k (the share of the exact top-k that the index returns) and query
+latency, next to an exact brute-force scan of the same corpus.
+
+Usage:
+    python vector_index_benchmark.py                      # synthetic clustered corpus
+    python vector_index_benchmark.py --from-index PATH    # vectors of a NumpyVectorIndex
+    python vector_index_benchmark.py --n 200000 --nlist 1024 --nprobe 4,8,16,32,64 --k 10
+
+Synthetic vectors are drawn around random topic centres so that, like
+ada-002 embeddings of real content, they cluster; uniform random vectors
+would understate what IVF achieves.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from plugins.numpy.ivf_plugin import IVFVectorIndex
+from plugins.numpy.numpy_plugin import NumpyVectorIndex
+
+
+def synthetic_corpus(n, dimension, topics, rng):
+    centres = rng.standard_normal((topics, dimension)).astype(np.float32)
+    labels = rng.integers(0, topics, size=n)
+    vectors = centres[labels] + rng.standard_normal((n, dimension)).astype(np.float32)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def stored_corpus(path):
+    with open(os.path.join(path, NumpyVectorIndex.INDEX_FILE)) as f:
+        state = json.load(f)
+    # Null ids are holes left by an interrupted delete
+    rows = [row for row, item_id in enumerate(state['ids']) if item_id is not None]
+    vectors = np.memmap(os.path.join(path, NumpyVectorIndex.VECTORS_FILE), dtype=np.float32, mode='r',
+                        shape=(state['capacity'], state['dimension']))
+    return np.asarray(vectors[rows])
+
+
+def percentile_ms(samples, q):
+    return 1000 * float(np.percentile(samples, q))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--from-index', help='directory of a NumpyVectorIndex to take the corpus from')
+    parser.add_argument('--n', type=int, default=100000, help='synthetic corpus size')
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--topics', type=int, default=500, help='synthetic topic centres')
+    parser.add_argument('--nlist', type=int, default=None, help='IVF lists (default ~4*sqrt(n))')
+    parser.add_argument('--nprobe', default='1,2,4,8,16,32,64', help='comma-separated settings to try')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    if args.from_index:
+        corpus = stored_corpus(args.from_index)
+    else:
+        corpus = synthetic_corpus(args.n, args.dimension, args.topics, rng)
+    n, dimension = corpus.shape
+    nlist = args.nlist or max(1, int(4 * np.sqrt(n)))
+    print(f"Corpus: {n} vectors x {dimension} dims; nlist={nlist}, k={args.k}, {args.queries} queries")
+
+    # Queries are perturbed corpus vectors, as real questions land near stored content
+    picks = rng.choice(n, size=args.queries, replace=False)
+    noise = rng.standard_normal((args.queries, dimension)) * (0.3 / np.sqrt(dimension))
+    queries = (corpus[picks] + noise).astype(np.float32)
+
+    workdir = tempfile.mkdtemp(prefix='ivf-bench-')
+    try:
+        index = IVFVectorIndex(workdir, dimension=dimension, nlist=nlist, auto_train=False)
+        started = time.perf_counter()
+        batch = 10000
+        for start in range(0, n, batch):
+            index.upsert([(str(i), corpus[i]) for i in range(start, min(start + batch, n))])
+        index.train()
+        print(f"Build: {time.perf_counter() - started:.1f}s (insert + train)\n")
+
+        exact_ids, exact_times = [], []
+        for q in queries:
+            t = time.perf_counter()
+            scores = corpus @ (q / np.linalg.norm(q))
+            top = np.argpartition(-scores, args.k - 1)[:args.k]
+            exact_times.append(time.perf_counter() - t)
+            exact_ids.append({str(i) for i in top})
+
+        print(f"{'nprobe':>8} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9}")
+        print(f"{'exact':>8} {1.0:>10.3f} {percentile_ms(exact_times, 50):>9.2f} {percentile_ms(exact_times, 95):>9.2f}")
+        for nprobe in (int(value) for value in args.nprobe.split(',')):
+            if nprobe > nlist:
+                continue
+            hits, times = 0, []
+            for q, truth in zip(queries, exact_ids):
+                t = time.perf_counter()
+                matches = index.query(q, top_k=args.k, include_metadata=False, nprobe=nprobe)['matches']
+                times.append(time.perf_counter() - t)
+                hits += len(truth & {match['id'] for match in matches})
+            recall = hits / (args.k * len(queries))
+            print(f"{nprobe:>8} {recall:>10.3f} {percentile_ms(times, 50):>9.2f} {percentile_ms(times, 95):>9.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
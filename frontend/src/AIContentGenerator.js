@@ -259,7 +259,7 @@ export default function AIContentGenerator({ user, client, onBack }) {
 			const res = await fetch(`${API_BASE_URL}/api/ai/generate-content`, {
 				method: 'POST',
 				headers: { 'Content-Type': 'application/json' },
-				body: JSON.stringify({ answers: existingClientAnswers }),
+				body: JSON.stringify({ answers: existingClientAnswers, client_id: selectedClient.id }),
 			});
 
 			const data = await res.json();
@@ -6,6 +6,7 @@ import ClientDetailPage from './ClientDetailPage';
 import Dashboard from './Dashboard';
 import Settings from './Settings';
 import AuthenticationComponent from './AuthenticationComponent';
+import { api } from './config/api';
 import SetPasswordPage from './SetPasswordPage';
 import ChatPage from './ChatPage';
 import AIContentGenerator from './AIContentGenerator';
@@ -51,6 +52,8 @@ export default function App() {
 
   // Logout
   const handleLogout = () => {
+    // Revoke the session's tokens server-side; the UI logs out regardless
+    api.logout().catch(() => {});
     setUser(null);
     setView('login');
     setSelectedClient(null);
@@ -1,7 +1,7 @@
 import React, { useEffect, useState, useRef } from 'react';
 import { io } from 'socket.io-client';
 
-import { API_ENDPOINTS, API_BASE_URL } from './config/api';
+import { API_ENDPOINTS, API_BASE_URL, authHeaders } from './config/api';
 
 const SOCKET_URL = process.env.REACT_APP_SOCKET_URL || API_ENDPOINTS.SOCKET_URL;
 const EMOJIS = ['😀','😂','😍','😎','👍','🎉','🔥','🙏','😅','😢','😡','🤔','🙌','🥳','💡','🚀','❤️','👏','😇','😬'];
@@ -33,8 +33,13 @@ export default function ChatPage({ user, navigationContext }) {
   const [replyTo, setReplyTo] = useState(null);
   const [parentCache, setParentCache] = useState({}); // {msgId: msg}
   const [popup, setPopup] = useState(null); // {channel, count}
+  // Messages are paged newest first; older pages load on request
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [hasOlder, setHasOlder] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const socketRef = useRef(null);
   const messagesEndRef = useRef(null);
+  const keepScrollRef = useRef(false);
 
   // Track which channel is currently viewed for divider logic
   const [viewedChannelId, setViewedChannelId] = useState(null);
@@ -111,8 +116,14 @@ export default function ChatPage({ user, navigationContext }) {
     if (!currentChannel || !socketRef.current) return;
     console.log('[DEBUG] currentChannel set:', currentChannel);
     socketRef.current.emit('join', { channel_id: currentChannel.id });
+    setOlderCursor(null);
+    setHasOlder(false);
     fetch(`${API_BASE_URL}/api/channels/${currentChannel.id}/messages`)
-      .then(res => res.json())
+      .then(res => {
+        setOlderCursor(res.headers.get('X-Before-Cursor'));
+        setHasOlder(res.headers.get('X-Has-More') === 'true');
+        return res.json();
+      })
       .then(msgs => {
         console.log('[DEBUG] Loaded messages for channel', currentChannel.id, msgs);
         setMessages(msgs);
@@ -136,11 +147,31 @@ export default function ChatPage({ user, navigationContext }) {
     };
   }, [currentChannel, user.id]);
 
-  // Scroll to bottom
+  // Scroll to bottom (but not when older history was prepended)
   useEffect(() => {
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
+  const loadOlderMessages = async () => {
+    if (!currentChannel || !olderCursor || loadingOlder) return;
+    setLoadingOlder(true);
+    try {
+      const res = await fetch(`${API_BASE_URL}/api/channels/${currentChannel.id}/messages?before=${encodeURIComponent(olderCursor)}`);
+      if (!res.ok) return;
+      const older = await res.json();
+      setOlderCursor(res.headers.get('X-Before-Cursor'));
+      setHasOlder(res.headers.get('X-Has-More') === 'true');
+      keepScrollRef.current = true;
+      setMessages(m => [...older, ...m]);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   // Sort DMs and channels by most recent message
   const getLastMessageTime = (chan) => {
     if (!chan.last_message) return 0;
@@ -348,7 +379,7 @@ export default function ChatPage({ user, navigationContext }) {
     const lastMsg = messages[messages.length - 1];
     fetch(`${API_BASE_URL}/api/channels/${currentChannel.id}/read`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...authHeaders() },
       body: JSON.stringify({ user_id: user.id, message_id: lastMsg.id })
     });
     // Set unread_count to 0 in state immediately
@@ -457,6 +488,17 @@ export default function ChatPage({ user, navigationContext }) {
           </div>
         )}
         <div style={{ flex: 1, overflowY: 'auto', padding: 24, background: '#18191c' }}>
+          {currentChannel && hasOlder && (
+            <div style={{ textAlign: 'center', marginBottom: 16 }}>
+              <button
+                onClick={loadOlderMessages}
+                disabled={loadingOlder}
+                style={{ background: '#2f3136', color: '#bbb', border: 'none', borderRadius: 4, padding: '6px 14px', cursor: 'pointer' }}
+              >
+                {loadingOlder ? 'Loading…' : 'Load older messages'}
+              </button>
+            </div>
+          )}
           {messages.map((msg, i) => {
             // Find parent message if this is a reply
             let parentMsg = null;
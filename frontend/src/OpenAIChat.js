@@ -9,7 +9,11 @@ const OpenAIChat = ({ userId }) => {
   const [inputMessage, setInputMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [isLoadingConversations, setIsLoadingConversations] = useState(false);
+  // Conversations load their newest page; older turns are fetched on request
+  const [hasOlder, setHasOlder] = useState(false);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const keepScrollRef = useRef(false);
 
   // Scroll to bottom when new messages are added
   const scrollToBottom = () => {
@@ -17,6 +21,11 @@ const OpenAIChat = ({ userId }) => {
   };
 
   useEffect(() => {
+    // Not when older turns were prepended
+    if (keepScrollRef.current) {
+      keepScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -60,6 +69,7 @@ const OpenAIChat = ({ userId }) => {
         setConversations(prev => [newConversation, ...prev]);
         setCurrentConversation(newConversation);
         setMessages(newConversation.messages || []);
+        setHasOlder(false);
       }
     } catch (error) {
       console.error('Error creating conversation:', error);
@@ -68,6 +78,7 @@ const OpenAIChat = ({ userId }) => {
 
   const selectConversation = async (conversation) => {
     setCurrentConversation(conversation);
+    setHasOlder(false);
     
     // Load full conversation details
     try {
@@ -75,12 +86,34 @@ const OpenAIChat = ({ userId }) => {
       if (response.ok) {
         const fullConversation = await response.json();
         setMessages(fullConversation.messages || []);
+        setHasOlder(Boolean(fullConversation.has_more));
       }
     } catch (error) {
       console.error('Error loading conversation:', error);
     }
   };
 
+  const loadOlderMessages = async () => {
+    const oldest = messages[0];
+    if (!currentConversation || !oldest || oldest.seq === undefined || isLoadingOlder) return;
+    setIsLoadingOlder(true);
+    try {
+      const response = await fetch(
+        `${API_BASE_URL}/api/chat/conversations/${currentConversation.id}/messages?before=${oldest.seq}`
+      );
+      if (response.ok) {
+        const older = await response.json();
+        setHasOlder(response.headers.get('X-Has-More') === 'true');
+        keepScrollRef.current = true;
+        setMessages(prev => [...older, ...prev]);
+      }
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   const sendMessage = async () => {
     if (!inputMessage.trim() || !currentConversation || isLoading) return;
 
@@ -103,24 +136,60 @@ const OpenAIChat = ({ userId }) => {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          message: userMessage
+          message: userMessage,
+          stream: true
         }),
       });
 
       if (response.ok) {
-        const data = await response.json();
-        
-        // Update messages with the full conversation
-        setMessages(data.conversation.messages || []);
-        
-        // Update the conversation in the list
-        setConversations(prev => 
-          prev.map(conv => 
-            conv.id === currentConversation.id 
-              ? { ...conv, messages: data.conversation.messages, updated_at: data.conversation.updated_at }
-              : conv
-          )
-        );
+        // Show the reply as its tokens arrive
+        setMessages(prev => [...prev, { role: 'assistant', content: '', timestamp: new Date().toISOString() }]);
+        const appendToReply = (delta) => {
+          setMessages(prev => {
+            const next = prev.slice();
+            const last = next[next.length - 1];
+            next[next.length - 1] = { ...last, content: last.content + delta };
+            return next;
+          });
+        };
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamError = null;
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const rawEvents = buffer.split('\n\n');
+          buffer = rawEvents.pop();
+          for (const rawEvent of rawEvents) {
+            let eventName = 'message';
+            let payload = '';
+            for (const line of rawEvent.split('\n')) {
+              if (line.startsWith('event: ')) eventName = line.slice(7);
+              else if (line.startsWith('data: ')) payload += line.slice(6);
+            }
+            const data = payload ? JSON.parse(payload) : {};
+            if (eventName === 'token') {
+              appendToReply(data.delta);
+            } else if (eventName === 'done') {
+              // Update the conversation in the list
+              setConversations(prev =>
+                prev.map(conv =>
+                  conv.id === currentConversation.id
+                    ? { ...conv, updated_at: data.updated_at || conv.updated_at }
+                    : conv
+                )
+              );
+            } else if (eventName === 'error') {
+              streamError = data.error;
+            }
+          }
+        }
+        if (streamError) {
+          alert('The reply was interrupted. Please try again.');
+        }
       } else {
         // Remove the user message if the API call failed
         setMessages(prev => prev.slice(0, -1));
@@ -221,6 +290,11 @@ const OpenAIChat = ({ userId }) => {
             </div>
             
             <div className="messages-container">
+              {hasOlder && (
+                <button className="load-older-btn" onClick={loadOlderMessages} disabled={isLoadingOlder}>
+                  {isLoadingOlder ? 'Loading…' : 'Load older messages'}
+                </button>
+              )}
               {messages.length === 0 ? (
                 <div className="empty-chat">
                   <h4>Start a conversation</h4>
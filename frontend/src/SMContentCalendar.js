@@ -1,4 +1,5 @@
 import React, { useState } from 'react';
+import { api } from './config/api';
 
 const dayNames = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'];
 
@@ -244,25 +245,14 @@ export default function SMContentCalendar({ clientId, user, onNavigate }) {
       const uploadedFiles = [];
       for (const file of formData.files) {
         try {
-          const uploadFormData = new FormData();
-          uploadFormData.append('file', file);
-          const uploadRes = await fetch('/api/upload-file', {
-            method: 'POST',
-            body: uploadFormData
+          // Large files (e.g. video) upload in resumable chunks
+          const fileData = await api.uploadFile(file);
+          uploadedFiles.push({
+            filename: fileData.filename,
+            original_filename: fileData.original_filename,
+            file_size: fileData.file_size,
+            mime_type: fileData.mime_type
           });
-          if (uploadRes.ok) {
-            const fileData = await uploadRes.json();
-            uploadedFiles.push({
-              filename: fileData.filename,
-              original_filename: fileData.original_filename,
-              file_size: fileData.file_size,
-              mime_type: fileData.mime_type
-            });
-          } else {
-            showAlert('Failed to upload file: ' + file.name, '❌ File Upload Error');
-            setLoading(false);
-            return;
-          }
         } catch (err) {
           showAlert('Failed to upload file: ' + file.name, '❌ File Upload Error');
           setLoading(false);
@@ -521,7 +511,7 @@ export default function SMContentCalendar({ clientId, user, onNavigate }) {
         headers: {
           'Content-Type': 'application/json'
         },
-        body: JSON.stringify({ answers })
+        body: JSON.stringify({ answers, client_id: clientId })
       });
 
       if (!response.ok) {
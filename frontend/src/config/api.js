@@ -19,7 +19,8 @@ export const API_BASE_URL = getApiBaseUrl();
 export const API_ENDPOINTS = {
   // Authentication
   LOGIN: `${API_BASE_URL}/login`,
-  LOGOUT: `${API_BASE_URL}/logout`,
+  LOGOUT: `${API_BASE_URL}/api/auth/logout`,
+  REFRESH_TOKEN: `${API_BASE_URL}/api/auth/refresh`,
   FORGOT_PASSWORD: `${API_BASE_URL}/forgot-password`,
   SET_PASSWORD: `${API_BASE_URL}/set-password`,
   REQUEST_ACCESS: `${API_BASE_URL}/request-access`,
@@ -58,6 +59,10 @@ export const API_ENDPOINTS = {
   
   // File uploads
   UPLOAD: `${API_BASE_URL}/upload`,
+  UPLOAD_FILE: `${API_BASE_URL}/api/upload-file`,
+  UPLOADS: `${API_BASE_URL}/api/uploads`,
+  UPLOAD_BY_ID: (id) => `${API_BASE_URL}/api/uploads/${id}`,
+  UPLOAD_COMPLETE: (id) => `${API_BASE_URL}/api/uploads/${id}/complete`,
   
   // Socket.IO
   SOCKET_URL: API_BASE_URL
@@ -70,17 +75,67 @@ export const DEFAULT_FETCH_OPTIONS = {
   }
 };
 
+// Signed access/refresh tokens from /login, kept for the browser session
+const TOKEN_STORAGE_KEY = 'genius_auth_tokens';
+
+export const setAuthTokens = (tokens) => {
+  if (tokens && tokens.access_token) {
+    sessionStorage.setItem(TOKEN_STORAGE_KEY, JSON.stringify({
+      access_token: tokens.access_token,
+      refresh_token: tokens.refresh_token
+    }));
+  } else {
+    sessionStorage.removeItem(TOKEN_STORAGE_KEY);
+  }
+};
+
+const getAuthTokens = () => {
+  try {
+    return JSON.parse(sessionStorage.getItem(TOKEN_STORAGE_KEY)) || {};
+  } catch (e) {
+    return {};
+  }
+};
+
+// Authorization header for fetch calls made outside apiCall
+export const authHeaders = () => {
+  const { access_token } = getAuthTokens();
+  return access_token ? { Authorization: `Bearer ${access_token}` } : {};
+};
+
+// Access tokens are short-lived; trade the refresh token for a new pair once
+const refreshAuthTokens = async () => {
+  const { refresh_token } = getAuthTokens();
+  if (!refresh_token) return false;
+  const response = await fetch(API_ENDPOINTS.REFRESH_TOKEN, {
+    method: 'POST',
+    headers: DEFAULT_FETCH_OPTIONS.headers,
+    body: JSON.stringify({ refresh_token })
+  });
+  if (!response.ok) {
+    setAuthTokens(null);
+    return false;
+  }
+  setAuthTokens(await response.json());
+  return true;
+};
+
 // API utility functions
-export const apiCall = async (url, options = {}) => {
+export const apiCall = async (url, options = {}, retried = false) => {
   try {
     const response = await fetch(url, {
       ...DEFAULT_FETCH_OPTIONS,
       ...options,
       headers: {
         ...DEFAULT_FETCH_OPTIONS.headers,
+        ...authHeaders(),
         ...options.headers
       }
     });
+
+    if (response.status === 401 && !retried && url !== API_ENDPOINTS.LOGIN && await refreshAuthTokens()) {
+      return apiCall(url, options, true);
+    }
     
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
@@ -98,13 +153,66 @@ export const apiCall = async (url, options = {}) => {
   }
 };
 
+// Files up to this size go to /api/upload-file in one request; larger ones in chunks
+const SINGLE_UPLOAD_LIMIT = 8 * 1024 * 1024;
+const CHUNK_RETRIES = 5;
+
+// Resumable upload through /api/uploads: after a failed chunk, ask the server
+// how much it kept and continue from there
+const uploadInChunks = async (file, onProgress) => {
+  const session = await apiCall(API_ENDPOINTS.UPLOADS, {
+    method: 'POST',
+    body: JSON.stringify({ filename: file.name, size: file.size, mime_type: file.type })
+  });
+  let offset = session.offset;
+  let failures = 0;
+  while (offset < file.size) {
+    const end = Math.min(offset + session.chunk_size, file.size);
+    try {
+      const response = await fetch(API_ENDPOINTS.UPLOAD_BY_ID(session.upload_id), {
+        method: 'PUT',
+        headers: { ...authHeaders(), 'Content-Range': `bytes ${offset}-${end - 1}/${file.size}` },
+        body: file.slice(offset, end)
+      });
+      if (!response.ok && response.status !== 409) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      // 409 carries the server's offset too, e.g. after a retried chunk already landed
+      offset = (await response.json()).offset;
+      failures = 0;
+    } catch (error) {
+      if (++failures > CHUNK_RETRIES) throw error;
+      await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+      offset = (await apiCall(API_ENDPOINTS.UPLOAD_BY_ID(session.upload_id))).offset;
+    }
+    if (onProgress) onProgress(offset / file.size);
+  }
+  return apiCall(API_ENDPOINTS.UPLOAD_COMPLETE(session.upload_id), { method: 'POST' });
+};
+
 // Specific API methods
 export const api = {
   // Authentication
-  login: (credentials) => apiCall(API_ENDPOINTS.LOGIN, {
-    method: 'POST',
-    body: JSON.stringify(credentials)
-  }),
+  login: async (credentials) => {
+    const data = await apiCall(API_ENDPOINTS.LOGIN, {
+      method: 'POST',
+      body: JSON.stringify(credentials)
+    });
+    setAuthTokens(data);
+    return data;
+  },
+
+  logout: async () => {
+    const { refresh_token } = getAuthTokens();
+    try {
+      await apiCall(API_ENDPOINTS.LOGOUT, {
+        method: 'POST',
+        body: JSON.stringify({ refresh_token })
+      });
+    } finally {
+      setAuthTokens(null);
+    }
+  },
   
   forgotPassword: (email) => apiCall(API_ENDPOINTS.FORGOT_PASSWORD, {
     method: 'POST',
@@ -195,7 +303,26 @@ export const api = {
   createTask: (taskData) => apiCall(API_ENDPOINTS.TASKS, {
     method: 'POST',
     body: JSON.stringify(taskData)
-  })
+  }),
+
+  // Files: resolves to {filename, original_filename, file_size, mime_type, ...}
+  uploadFile: async (file, onProgress) => {
+    if (file.size > SINGLE_UPLOAD_LIMIT) {
+      return uploadInChunks(file, onProgress);
+    }
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await fetch(API_ENDPOINTS.UPLOAD_FILE, {
+      method: 'POST',
+      headers: authHeaders(),
+      body: formData
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    if (onProgress) onProgress(1);
+    return response.json();
+  }
 };
 
 export default api;